@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""
+
+    Compares the JSON codecs available to vralib.Session on pages shaped like vRA responses.
+
+    Usage (from the repository root):
+
+        PYTHONPATH=. python benchmarks/bench_codec.py -r 20
+
+"""
+
+import argparse
+import json
+import time
+
+from vralib.codec import available_codecs, get_codec
+
+from bench_memory import make_page
+
+
+def getargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--repeat',
+                        type=int,
+                        default=20,
+                        help='Number of times each page is decoded and encoded')
+    parser.add_argument('-s', '--size',
+                        type=int,
+                        default=500,
+                        help='Number of items per page')
+    args = parser.parse_args()
+    return args
+
+
+def make_views_page(n):
+    """Returns the JSON text of a resourceViews page with extended data (withExtendedData=true)."""
+
+    content = []
+    for i in range(n):
+        resource_id = '9c1e8a52-%04x-4f0b-8d7e-%012x' % (i % 0xffff, i)
+        base = 'https://vra.example.com/catalog-service/api/consumer/resources/%s/actions' % resource_id
+        data = dict(('VirtualMachine.Property%d' % k, 'value %d of machine %d' % (k, i)) for k in range(40))
+        data.update({
+            'MachineName': 'vm-%06d' % i,
+            'MachineCPU': 2,
+            'MachineMemory': 4096,
+            'MachineStorage': 60,
+            'MachineGuestOperatingSystem': 'CentOS 7 (64-bit)',
+            'ip_address': '10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255),
+            'DISK_VOLUMES': [{'componentTypeId': 'com.vmware.csp.component.iaas.proxy.provider',
+                              'classId': 'dynamicops.api.model.DiskInputModel',
+                              'data': {'DISK_CAPACITY': 20 * (d + 1), 'DISK_LABEL': 'Hard disk %d' % (d + 1),
+                                       'DISK_INPUT_ID': 'DISK_INPUT_ID%d' % (d + 1)}} for d in range(3)],
+            'NETWORK_LIST': [{'componentTypeId': 'com.vmware.csp.component.iaas.proxy.provider',
+                              'classId': 'dynamicops.api.model.NetworkViewModel',
+                              'data': {'NETWORK_ADDRESS': '10.0.%d.%d' % (i >> 8 & 255, i & 255),
+                                       'NETWORK_MAC_ADDRESS': '00:50:56:%02x:%02x:%02x' % (
+                                           i >> 16 & 255, i >> 8 & 255, i & 255),
+                                       'NETWORK_NAME': 'VM Network'}}],
+        })
+        label = '{com.vmware.csp.iaas.blueprint.service@resource.action.name.machine.%s}'
+        content.append({
+            '@type': 'CatalogResourceView',
+            'links': [{'@type': 'link', 'rel': '%s: %s' % (rel, label % action),
+                       'href': '%s/%s-%d/requests%s' % (base, action, i, suffix)}
+                      for action in ('PowerOff', 'Reboot', 'Destroy', 'Reconfigure')
+                      for rel, suffix in (('GET Template', '/template'), ('POST', ''))],
+            'resourceId': resource_id,
+            'iconId': 'cafe_default_icon_genericCatalogItem',
+            'name': 'vm-%06d' % i,
+            'description': None,
+            'status': 'On',
+            'catalogItemId': '0ebbcf20-abdf-4663-a40c-1e50e7340190',
+            'catalogItemLabel': 'CentOS 7',
+            'requestId': '7aaf9baf-aa4e-47c4-997b-%012x' % i,
+            'businessGroupId': 'b1d3e6f4-7c1a-4f6e-8c2b-%012x' % (i % 40),
+            'tenantId': 'vsphere.local',
+            'owners': ['user%d@vsphere.local' % (i % 500)],
+            'resourceType': 'Infrastructure.Virtual',
+            'parentResourceId': '1d5e2b3c-4f6a-4b7c-8d9e-%012x' % (i // 10),
+            'hasChildren': False,
+            'dateCreated': '2019-03-01T10:00:00.000Z',
+            'lastUpdated': '2019-03-02T10:00:00.000Z',
+            'data': data,
+        })
+
+    return json.dumps({'links': [], 'content': content,
+                       'metadata': {'size': n, 'totalElements': n * 20, 'totalPages': 20, 'number': 1, 'offset': 0}})
+
+
+def best_of(function, argument, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    args = getargs()
+
+    fixtures = [
+        ('resourceViews', make_views_page(args.size).encode('utf-8')),
+        ('consumer/resources', ('{"links": [], "content": %s, "metadata": {}}' % make_page(args.size)).encode('utf-8')),
+    ]
+
+    print('%-20s %-8s %10s %12s %12s %12s' % ('page', 'codec', 'size', 'loads', 'dumps', 'loads MB/s'))
+    for name, page in fixtures:
+        decoded = json.loads(page)
+        for codec_name in available_codecs():
+            codec = get_codec(codec_name)
+            loads = best_of(codec.loads, page, args.repeat)
+            dumps = best_of(codec.dumps, decoded, args.repeat)
+            print('%-20s %-8s %8.1fMB %10.2fms %10.2fms %12.1f' % (
+                name, codec_name, len(page) / 1048576.0, loads * 1000, dumps * 1000, len(page) / 1048576.0 / loads))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""
+
+    Compares the memory held by Deployment and CompactDeployment objects for a synthetic inventory.
+
+    Usage (from the repository root):
+
+        PYTHONPATH=. python benchmarks/bench_memory.py -n 100000
+
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+import vralib
+
+
+def getargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--resources',
+                        type=int,
+                        default=100000,
+                        help='Number of resources in the inventory')
+    args = parser.parse_args()
+    return args
+
+
+def make_page(n):
+    """Returns the JSON text of n consumer resources shaped like the ones vRA 7 returns."""
+
+    resources = []
+    for i in range(n):
+        resource_id = '6f1c2f6a-%04x-4d1e-9a6b-%012x' % (i % 0xffff, i)
+        resources.append({
+            '@type': 'CatalogResource',
+            'id': resource_id,
+            'iconId': 'cafe_default_icon_genericCatalogItem',
+            'resourceTypeRef': {'id': 'Infrastructure.Virtual', 'label': 'Virtual Machine'},
+            'name': 'vm-%06d' % i,
+            'description': 'Synthetic machine %d' % i,
+            'status': 'ACTIVE',
+            'catalogItem': {'id': '0ebbcf20-abdf-4663-a40c-1e50e7340190', 'label': 'CentOS 7'},
+            'requestId': '7aaf9baf-aa4e-47c4-997b-%012x' % i,
+            'providerBinding': {'bindingId': 'b-%d' % i,
+                                'providerRef': {'id': '5a4f5b8f-3de4-41d6-a3c7-9b5d1a9b3a8e', 'label': 'Provider'}},
+            'owners': [{'tenantName': 'vsphere.local', 'ref': 'user%d@vsphere.local' % (i % 500),
+                        'type': 'USER', 'value': 'User %d' % (i % 500)}],
+            'organization': {'tenantRef': 'vsphere.local', 'tenantLabel': 'vsphere.local',
+                             'subtenantRef': 'b1d3e6f4-7c1a-4f6e-8c2b-%012x' % (i % 40),
+                             'subtenantLabel': 'Business group %d' % (i % 40)},
+            'dateCreated': '2019-03-01T10:%02d:%02d.000Z' % (i // 60 % 60, i % 60),
+            'lastUpdated': '2019-03-02T10:%02d:%02d.000Z' % (i // 60 % 60, i % 60),
+            'hasLease': True,
+            'lease': {'start': '2019-03-01T10:00:00.000Z', 'end': '2019-06-01T10:00:00.000Z'},
+            'leaseForDisplay': None,
+            'hasCosts': True,
+            'totalCost': None,
+            'hasChildren': False,
+            'operations': [{'name': name, 'description': name, 'iconId': 'machine_%s.png' % name.lower(),
+                            'type': 'ACTION', 'id': '%s-%d' % (name, i), 'extensionId': None,
+                            'providerTypeId': 'com.vmware.csp.iaas.blueprint.service', 'bindingId': name,
+                            'hasForm': False, 'formScale': None}
+                           for name in ('Power Off', 'Reboot', 'Destroy', 'Change Lease', 'Expire')],
+            'forms': {'catalogResourceInfoHidden': False, 'details': {'type': 'external.form', 'formId': 'f%d' % i}},
+            'resourceData': {'entries': [{'key': 'MachineName', 'value': {'type': 'string', 'value': 'vm-%06d' % i}},
+                                         {'key': 'MachineCPU', 'value': {'type': 'integer', 'value': 2}},
+                                         {'key': 'MachineMemory', 'value': {'type': 'integer', 'value': 4096}},
+                                         {'key': 'ip_address', 'value': {'type': 'string',
+                                                                         'value': '10.%d.%d.%d' % (
+                                                                             i >> 16 & 255, i >> 8 & 255, i & 255)}}]},
+        })
+    return json.dumps(resources)
+
+
+# The fields a lease report needs
+FIELDS = ('name', 'owners', 'business_group_id', 'lease')
+
+
+def old_model(session, resource):
+    operations = vralib.Deployment._get_operations(session, resource['id'], resource)
+    return vralib.VirtualMachine(session, resource, operations, [])
+
+
+def measure(label, text, build, count):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    objects = build(json.loads(text))
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    fields = sum(1 for o in objects if o.name and o.owners and o.business_group_id)
+    assert len(objects) == count and fields == count
+    print('%-34s %10.1f MB %10d B/resource %10.2f s' % (label, size / 1048576.0, size // count, elapsed))
+    del objects
+
+
+def main():
+    args = getargs()
+    n = args.resources
+    session = vralib.Session('bench@vsphere.local', 'vra.example.com', 'vsphere.local', 'Bearer stub', ssl_verify=False)
+    text = make_page(n)
+
+    print('%-34s %13s %21s %12s' % ('model', 'memory', 'per resource', 'decode+build'))
+    measure('Deployment', text, lambda payloads: [old_model(session, p) for p in payloads], n)
+    measure('CompactDeployment', text, lambda payloads: vralib.CompactDeployment.many(session, payloads), n)
+    measure('CompactDeployment keep_raw=False', text,
+            lambda payloads: vralib.CompactDeployment.many(session, payloads, keep_raw=False), n)
+    measure('CompactDeployment 4 fields', text,
+            lambda payloads: vralib.CompactDeployment.many(session, payloads, keep_raw=False, fields=FIELDS), n)
+
+    session.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+"""
+
+    Counts the round trips and wall-clock time of a full collection read for different page sizes.
+
+    Usage (from the repository root):
+
+        PYTHONPATH=. python benchmarks/bench_page_size.py -n 5000 -l 0.005
+
+"""
+
+import argparse
+import time
+import warnings
+
+import vralib
+
+from stubserver import PagedStubServer
+
+
+def getargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--items',
+                        type=int,
+                        default=5000,
+                        help='Number of items in the collection')
+    parser.add_argument('-l', '--latency',
+                        type=float,
+                        default=0.005,
+                        help='Seconds of latency injected by the server per request')
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = getargs()
+    warnings.simplefilter('ignore')
+
+    with PagedStubServer(items=args.items, latency=args.latency) as server:
+        vra = vralib.Session('bench@vsphere.local', server.cloudurl, 'vsphere.local', 'Bearer stub',
+                             ssl_verify=False)
+
+        print('%-16s %12s %12s' % ('page_size', 'round trips', 'seconds'))
+        for page_size in (None, 100, 1000, 'auto'):
+            server.reset()
+            start = time.perf_counter()
+            items = vra.get_consumer_resources(page_size=page_size)
+            elapsed = time.perf_counter() - start
+            assert len(items) == args.items
+            print('%-16s %12d %12.3f' % (page_size or 'server default', server.requests, elapsed))
+
+        vra.close()
+
+
+if __name__ == '__main__':
+    main()
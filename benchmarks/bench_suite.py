@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+
+"""
+
+    Runs end-to-end scenarios against a synthetic vRA appliance (see mockvra.py) and writes the results as JSON,
+    so that runs before and after a change can be compared.
+
+    Usage (from the repository root):
+
+        PYTHONPATH=. python benchmarks/bench_suite.py -l 0.005 -o before.json
+        PYTHONPATH=. python benchmarks/bench_suite.py -l 0.005 -o after.json --compare before.json
+        PYTHONPATH=. python benchmarks/bench_suite.py -s tree-fromid,tree-loader --tree-depth 5
+
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import time
+import warnings
+
+from collections import OrderedDict
+
+import vralib
+
+from vralib.codec import get_codec
+
+from mockvra import TENANT, MockVRA, uuid
+
+
+def getargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--scenarios',
+                        default=','.join(SCENARIOS),
+                        help='Comma separated scenarios to run, out of: %s' % ', '.join(SCENARIOS))
+    parser.add_argument('-r', '--repeat',
+                        type=int,
+                        default=5,
+                        help='Number of measured runs of each scenario, after one warm-up run')
+    parser.add_argument('-l', '--latency',
+                        type=float,
+                        default=0.002,
+                        help='Seconds of latency injected by the server per request')
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        default=4,
+                        help='page_workers of the session, and the workers of the bulk scenarios')
+    parser.add_argument('-p', '--page-size',
+                        default='auto',
+                        help="page_size of the session: a number, 'auto' or 'none' for the server default")
+    parser.add_argument('--no-odata',
+                        action='store_true',
+                        help='Make the server reject $filter and $orderby, which exercises the fallback paths')
+    parser.add_argument('--deployments', type=int, default=200, help='Number of flat deployments')
+    parser.add_argument('--machines', type=int, default=3, help='Virtual machines per flat deployment')
+    parser.add_argument('--tree-depth', type=int, default=4, help='Levels below the root of the deep deployment')
+    parser.add_argument('--tree-fanout', type=int, default=4, help='Children per resource of the deep deployment')
+    parser.add_argument('--catalog-items', type=int, default=300, help='Number of entitled catalog items')
+    parser.add_argument('--business-groups', type=int, default=20, help='Number of business groups')
+    parser.add_argument('--requests', type=int, default=1000, help='Number of catalog requests')
+    parser.add_argument('--events', type=int, default=2000, help='Number of Event Broker events')
+    parser.add_argument('--lookups', type=int, default=50, help='Number of catalog lookups')
+    parser.add_argument('--provision', type=int, default=100, help='Number of catalog requests submitted')
+    parser.add_argument('-o', '--output',
+                        help='Write the results to this JSON file')
+    parser.add_argument('--compare',
+                        help='A JSON file written by an earlier run to compare the results with')
+    args = parser.parse_args()
+    return args
+
+
+def count_tree(deployment):
+    return 1 + sum(count_tree(child) for child in deployment.deployment_children)
+
+
+def lookup_names(n):
+    """Catalog search strings, from broad ('centos') to a single item ('windows 2016 large 9')."""
+
+    names = ('centos', 'ubuntu 18', 'rhel 7 medium', 'windows 2016 large 9', 'sles', 'small 1')
+    return [names[i % len(names)] for i in range(n)]
+
+
+# Scenarios take the session, the server and the command line arguments and return the number of items read
+
+def crawl(vra, server, args):
+    """Reads the whole inventory: resources, requests, business groups, catalog, reservations and events."""
+
+    return (len(vra.get_consumer_resources()) +
+            len(vra.get_requests()) +
+            len(vra.get_business_groups()) +
+            len(vra.get_entitled_catalog_items()) +
+            len(vra.get_reservations()['content']) +
+            len(vra.get_eventbroker_events()))
+
+
+def crawl_stream(vra, server, args):
+    """The same crawl with the generators, parsing pages while they download."""
+
+    return sum(sum(1 for _ in items) for items in (vra.iter_consumer_resources(stream=True),
+                                                   vra.iter_requests(stream=True),
+                                                   vra.iter_business_groups(stream=True),
+                                                   vra.iter_entitled_catalog_items(stream=True),
+                                                   vra.iter_eventbroker_events(stream=True)))
+
+
+def crawl_async(vra, server, args):
+    """The same crawl with an AsyncSession, every collection and page in flight at once."""
+
+    async def main():
+        async with vralib.AsyncSession(vra.username, vra.cloudurl, vra.tenant, vra.token, ssl_verify=False,
+                                       page_size=vra.page_size) as avra:
+            collections = await asyncio.gather(avra.get_consumer_resources(),
+                                               avra.get_requests(),
+                                               avra.get_business_groups(),
+                                               avra.get_entitled_catalog_items(),
+                                               avra.get_reservations(),
+                                               avra.get_eventbroker_events())
+        return sum(len(c['content'] if isinstance(c, dict) else c) for c in collections)
+
+    return asyncio.run(main())
+
+
+def tree_fromid(vra, server, args):
+    """Loads the deep deployment with Deployment.fromid."""
+
+    return count_tree(vralib.Deployment.fromid(vra, server.tree_root))
+
+
+def tree_views(vra, server, args):
+    """Loads the deep deployment with Deployment.fromid(from_views=True)."""
+
+    return count_tree(vralib.Deployment.fromid(vra, server.tree_root, from_views=True))
+
+
+def tree_loader(vra, server, args):
+    """Loads the deep deployment breadth-first with DeploymentLoader."""
+
+    return count_tree(vralib.DeploymentLoader(vra, workers=args.workers).load(server.tree_root))
+
+
+def fromids(vra, server, args):
+    """Loads every flat deployment, with its machines, with Deployment.fromids."""
+
+    deployments = vralib.Deployment.fromids(vra, server.deployment_ids, workers=args.workers)
+    return sum(count_tree(d) for d in deployments)
+
+
+def catalog_byname(vra, server, args):
+    """Looks catalog items up with get_catalogitem_byname, one request (or crawl) per lookup."""
+
+    return sum(len(vra.get_catalogitem_byname(name)) for name in lookup_names(args.lookups))
+
+
+def catalog_index(vra, server, args):
+    """Builds a CatalogIndex and answers the same lookups from it."""
+
+    catalog = vralib.CatalogIndex(vra)
+    return sum(len(vra.get_catalogitem_byname(name, catalog=catalog)) for name in lookup_names(args.lookups))
+
+
+def provision(vra, server, args):
+    """Submits catalog requests with request_items and waits for them with a RequestWaiter."""
+
+    specs = [{'catalogitem': uuid(2, i % 5), 'overrides': {'description': 'bench-%d' % i}}
+             for i in range(args.provision)]
+    results = vra.request_items(specs, workers=args.workers)
+    waiter = vralib.RequestWaiter(vra, interval=0.01, max_interval=0.1)
+    completed = waiter.wait([r.request_id for r in results if r.request_id], timeout=60)
+    waiter.stop()
+    return len(completed)
+
+
+def events_tail(vra, server, args):
+    """Tails the Event Broker log from the start, then polls again after 100 more events."""
+
+    tail = vralib.EventTail(vra, start='earliest')
+    count = len(tail.poll())
+    server.add_events(100)
+    return count + len(tail.poll())
+
+
+SCENARIOS = OrderedDict([
+    ('crawl', crawl),
+    ('crawl-stream', crawl_stream),
+    ('crawl-async', crawl_async),
+    ('tree-fromid', tree_fromid),
+    ('tree-views', tree_views),
+    ('tree-loader', tree_loader),
+    ('fromids', fromids),
+    ('catalog-byname', catalog_byname),
+    ('catalog-index', catalog_index),
+    ('provision', provision),
+    ('events-tail', events_tail),
+])
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scenario, server, args, page_size):
+    """Runs a scenario once with a new session, on a server reset to its initial data.
+
+    :return: A tuple of (seconds, requests sent, items read)
+    """
+
+    server.reset()
+    vra = vralib.Session('bench@%s' % TENANT, server.cloudurl, TENANT, 'Bearer stub', ssl_verify=False,
+                         page_workers=args.workers, page_size=page_size, pool_maxsize=max(10, args.workers * 2))
+    try:
+        start = time.perf_counter()
+        items = scenario(vra, server, args)
+        return time.perf_counter() - start, server.requests, items
+    finally:
+        vra.close()
+
+
+def main():
+    args = getargs()
+    warnings.simplefilter('ignore')
+
+    names = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = [s for s in names if s not in SCENARIOS]
+    if unknown:
+        raise SystemExit('Unknown scenarios: %s' % ', '.join(unknown))
+
+    page_size = None if args.page_size == 'none' else args.page_size
+    if page_size not in (None, 'auto'):
+        page_size = int(page_size)
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)['results']
+
+    server = MockVRA(deployments=args.deployments, machines=args.machines, tree_depth=args.tree_depth,
+                     tree_fanout=args.tree_fanout, catalog_items=args.catalog_items,
+                     business_groups=args.business_groups, requests=args.requests, events=args.events,
+                     latency=args.latency, odata=not args.no_odata)
+
+    results = OrderedDict()
+    with server:
+        print('%-16s %10s %10s %10s %10s %10s %10s' % ('scenario', 'median s', 'min s', 'max s', 'requests',
+                                                        'items', 'vs before'))
+        for name in names:
+            run(SCENARIOS[name], server, args, page_size)
+            runs = [run(SCENARIOS[name], server, args, page_size) for _ in range(args.repeat)]
+            seconds = [r[0] for r in runs]
+            results[name] = OrderedDict([
+                ('median', statistics.median(seconds)),
+                ('min', min(seconds)),
+                ('max', max(seconds)),
+                ('stdev', statistics.stdev(seconds) if len(seconds) > 1 else 0.0),
+                ('requests', runs[-1][1]),
+                ('items', runs[-1][2]),
+                ('runs', seconds),
+            ])
+
+            change = ''
+            if name in previous and previous[name]['median']:
+                change = '%+.1f%%' % ((results[name]['median'] / previous[name]['median'] - 1) * 100)
+            print('%-16s %10.3f %10.3f %10.3f %10d %10d %10s' % (name, results[name]['median'], results[name]['min'],
+                                                                  results[name]['max'], results[name]['requests'],
+                                                                  results[name]['items'], change))
+
+    report = OrderedDict([
+        ('revision', git_revision()),
+        ('date', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('codec', get_codec().name),
+        ('config', OrderedDict((k, v) for k, v in sorted(vars(args).items()) if k not in ('output', 'compare'))),
+        ('results', results),
+    ])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
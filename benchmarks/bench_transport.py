@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""
+
+    Compares per-request latency of one-shot requests against the pooled keep-alive transport in vralib.Session.
+
+    Usage (from the repository root):
+
+        PYTHONPATH=. python benchmarks/bench_transport.py -n 500 -w 8
+
+"""
+
+import argparse
+import time
+import warnings
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import vralib
+
+from stubserver import StubServer
+
+
+def getargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--requests',
+                        type=int,
+                        default=300,
+                        help='Number of requests per run')
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        default=8,
+                        help='Number of threads for the concurrent runs')
+    args = parser.parse_args()
+    return args
+
+
+def timed(func, n, workers=1):
+    start = time.perf_counter()
+    if workers == 1:
+        for _ in range(n):
+            func()
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda _: func(), range(n)))
+    return (time.perf_counter() - start) / n * 1000
+
+
+def main():
+    args = getargs()
+    warnings.simplefilter('ignore')
+
+    with StubServer() as server:
+        url = 'https://%s/catalog-service/api/consumer/resources/stub' % server.cloudurl
+        vra = vralib.Session('bench@vsphere.local', server.cloudurl, 'vsphere.local', 'Bearer stub',
+                             ssl_verify=False, pool_maxsize=args.workers)
+
+        def one_shot():
+            requests.request('GET', url, headers=vra.headers, verify=False).json()
+
+        def pooled():
+            vra._request(url)
+
+        print('%-28s %10s' % ('transport', 'ms/request'))
+        for label, func, workers in (('one-shot, serial', one_shot, 1),
+                                     ('pooled, serial', pooled, 1),
+                                     ('one-shot, %d threads' % args.workers, one_shot, args.workers),
+                                     ('pooled, %d threads' % args.workers, pooled, args.workers)):
+            server.reset()
+            print('%-28s %10.3f' % (label, timed(func, args.requests, workers)))
+
+        vra.close()
+
+
+if __name__ == '__main__':
+    main()
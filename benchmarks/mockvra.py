@@ -0,0 +1,708 @@
+"""
+
+    A synthetic vRA appliance for the benchmark suite.
+
+    MockVRA serves generated identity, catalog-service, reservation-service and event-broker-service
+    payloads shaped like the ones vRA 7 returns, paginated the way vRA does it, with the subset of OData
+    $filter/$orderby that vralib sends. Every payload is generated from the sizes passed to it, so two
+    servers built with the same arguments serve the same data.
+
+"""
+
+import datetime
+import re
+import threading
+
+from urllib.parse import parse_qs, unquote, urlparse
+
+from stubserver import StubServer
+
+
+TENANT = 'vsphere.local'
+EPOCH = datetime.datetime(2019, 1, 1)
+DEPLOYMENT_TYPE = 'composition.resource.type.deployment'
+MACHINE_TYPE = 'Infrastructure.Virtual'
+OPERATIONS = ('Power Off', 'Reboot', 'Destroy', 'Change Lease', 'Expire', 'Reconfigure', 'Connect using RDP')
+SERVICES = ('Linux', 'Windows', 'Databases', 'Networking', 'Containers')
+OS_NAMES = ('CentOS 7', 'Ubuntu 18.04', 'RHEL 7', 'Windows 2016', 'Windows 2019', 'SLES 12')
+EVENT_TOPICS = ('com.vmware.csp.iaas.blueprint.service.machine.lifecycle.provision',
+                'com.vmware.csp.iaas.blueprint.service.machine.lifecycle.active',
+                'com.vmware.csp.iaas.blueprint.service.machine.lifecycle.dispose',
+                'com.vmware.csp.core.cafe.catalog.request')
+
+_COMPARISON = re.compile(r"^([\w/]+) (eq|ne|gt|ge|lt|le) ('(?:[^']|'')*'|[\w.+:-]+)$")
+_SUBSTRINGOF = re.compile(r"^substringof\('((?:[^']|'')*)',tolower\(([\w/]+)\)\)$")
+_STARTSWITH = re.compile(r"^startswith\(tolower\(([\w/]+)\),'((?:[^']|'')*)'\)$")
+_OPERATORS = {
+    'eq': lambda a, b: a == b,
+    'ne': lambda a, b: a != b,
+    'gt': lambda a, b: a is not None and a > b,
+    'ge': lambda a, b: a is not None and a >= b,
+    'lt': lambda a, b: a is not None and a < b,
+    'le': lambda a, b: a is not None and a <= b,
+}
+
+
+def uuid(kind, n):
+    """A stable, UUID-shaped id for the n-th object of a kind (a number below 0xffff)."""
+
+    return '%08x-%04x-4%03x-8%03x-%012x' % (0x5eed0000 + kind, n >> 48 & 0xffff, n >> 36 & 0xfff,
+                                            n >> 24 & 0xfff, n & 0xffffffffffff)
+
+
+def timestamp(seconds):
+    """Formats seconds after 2019-01-01 like vRA, e.g. 2019-01-01T00:00:42.000Z."""
+
+    return (EPOCH + datetime.timedelta(seconds=seconds)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+class ODataError(ValueError):
+    """A $filter or $orderby the mock doesn't understand, answered with 400 like vRA does."""
+
+
+def _split(text, separator):
+    """Splits text on separator outside of quotes and parentheses."""
+
+    parts, depth, quoted, start, i = [], 0, False, 0, 0
+    while i < len(text):
+        char = text[i]
+        if char == "'":
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and depth == 0 and text.startswith(separator, i):
+            parts.append(text[start:i])
+            start = i = i + len(separator)
+            continue
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def _literal(text):
+    if text.startswith("'"):
+        return text[1:-1].replace("''", "'")
+    if text == 'null':
+        return None
+    if text in ('true', 'false'):
+        return text == 'true'
+    try:
+        return float(text) if '.' in text else int(text)
+    except ValueError:
+        raise ODataError('Unsupported literal %s' % text)
+
+
+def parse_filter(expression):
+    """Parses the $filter expressions built by vralib.Query.
+
+    :return: A list of conjuncts, each a list of alternatives, each a tuple of (kind, field, operator, value)
+    """
+
+    conjuncts = []
+    for conjunct in _split(expression.strip(), ' and '):
+        conjunct = conjunct.strip()
+        if conjunct.startswith('(') and conjunct.endswith(')') and len(_split(conjunct[1:-1], ' or ')) > 1:
+            conjunct = conjunct[1:-1]
+
+        alternatives = []
+        for atom in _split(conjunct, ' or '):
+            atom = atom.strip()
+            match = _COMPARISON.match(atom)
+            if match:
+                alternatives.append(('compare', match.group(1), match.group(2), _literal(match.group(3))))
+                continue
+            match = _SUBSTRINGOF.match(atom)
+            if match:
+                alternatives.append(('contains', match.group(2), None, match.group(1).replace("''", "'")))
+                continue
+            match = _STARTSWITH.match(atom)
+            if match:
+                alternatives.append(('startswith', match.group(1), None, match.group(2).replace("''", "'")))
+                continue
+            raise ODataError('Unsupported $filter expression %s' % atom)
+        conjuncts.append(alternatives)
+    return conjuncts
+
+
+class Collection(object):
+    """A list of generated items served page by page, with $filter and $orderby.
+
+    :param items: The items, in the order the server returns them without $orderby
+    :param fields: Maps OData field names to the path of the value in an item, where they differ
+    :param indexed: Fields looked up through an index when a filter only asks for some of their values
+    :param native: Fields the endpoint filters on even when the server doesn't support OData otherwise
+    """
+
+    def __init__(self, items, fields=None, indexed=('id',), native=()):
+        self.items = items
+        self.fields = fields or {}
+        self.indexed = indexed
+        self.native = native
+        self._indexes = None
+        self._lock = threading.Lock()
+
+    def append(self, item):
+        with self._lock:
+            self.items.append(item)
+            self._indexes = None
+
+    def value(self, item, field):
+        for key in self.fields.get(field, field).split('/'):
+            if not isinstance(item, dict):
+                return None
+            item = item.get(key)
+        return item
+
+    def _index(self, field):
+        with self._lock:
+            if self._indexes is None:
+                self._indexes = {}
+            if field not in self._indexes:
+                index = {}
+                for item in self.items:
+                    index.setdefault(self.value(item, field), []).append(item)
+                self._indexes[field] = index
+            return self._indexes[field]
+
+    def _matches(self, item, alternatives):
+        for kind, field, operator, value in alternatives:
+            actual = self.value(item, field)
+            if kind == 'compare':
+                if _OPERATORS[operator](actual, value):
+                    return True
+            elif isinstance(actual, str):
+                if kind == 'contains' and value in actual.lower():
+                    return True
+                if kind == 'startswith' and actual.lower().startswith(value):
+                    return True
+        return False
+
+    def select(self, expression=None, orderby=None):
+        """
+        :return: The items matching the $filter expression, in the order of the $orderby expression
+        """
+
+        items = self.items
+        conjuncts = parse_filter(expression) if expression else []
+
+        for alternatives in conjuncts:
+            fields = set(field for _, field, _, _ in alternatives)
+            operators = set(operator for _, _, operator, _ in alternatives)
+            if len(fields) == 1 and operators == {'eq'} and fields.issubset(self.indexed):
+                index = self._index(fields.pop())
+                found = []
+                for _, _, _, value in alternatives:
+                    found.extend(index.get(value, []))
+                # an item is listed once even if several of the values match it
+                items = list(dict((id(i), i) for i in found).values())
+                conjuncts = [c for c in conjuncts if c is not alternatives]
+                break
+
+        if conjuncts:
+            items = [i for i in items if all(self._matches(i, alternatives) for alternatives in conjuncts)]
+
+        for order in reversed((orderby or '').split(',') if orderby else []):
+            field, _, direction = order.strip().partition(' ')
+            if direction not in ('', 'asc', 'desc'):
+                raise ODataError('Unsupported $orderby %s' % order)
+            items = sorted(items, key=lambda i: (self.value(i, field) is not None, self.value(i, field) or ''),
+                           reverse=direction == 'desc')
+        return items
+
+
+class MockVRA(StubServer):
+    """
+    A vRA appliance with a generated inventory.
+
+    The inventory has `deployments` deployments of `machines` virtual machines each, and one deep
+    deployment (tree_root) whose nested deployments go `tree_depth` levels down with `tree_fanout`
+    children each, with virtual machines as leaves. Catalog items, business groups, reservations,
+    requests and Event Broker events are generated in the numbers asked for.
+
+    Basic usage:
+
+    with MockVRA(deployments=500, latency=0.005) as server:
+        vra = vralib.Session('bench@vsphere.local', server.cloudurl, TENANT, 'Bearer stub', ssl_verify=False)
+        vra.get_consumer_resources()
+
+    odata=False answers every $filter and $orderby with 400, like appliances whose endpoints don't
+    support them, which sends vralib down its fallback paths.
+    """
+
+    def __init__(self, deployments=200, machines=3, tree_depth=4, tree_fanout=4, catalog_items=300,
+                 business_groups=20, reservations=40, requests=1000, events=2000, default_limit=20,
+                 max_limit=5000, latency=0, odata=True):
+        super(MockVRA, self).__init__(latency=latency)
+        self.default_limit = default_limit
+        self.max_limit = max_limit
+        self.odata = odata
+        self._sequence = 0
+        self._sequence_lock = threading.Lock()
+
+        self.business_groups = Collection([self.make_business_group(i) for i in range(business_groups)])
+        self.catalog_items = Collection([self.make_catalog_item(i, business_groups) for i in range(catalog_items)],
+                                        fields={'id': 'catalogItem/id'})
+        self.catalog_item_views = Collection([self.make_catalog_item_view(i) for i in self.catalog_items.items],
+                                             fields={'id': 'catalogItemId'})
+        self.reservations = Collection([self.make_reservation(i, business_groups) for i in range(reservations)])
+        self.catalog_requests = Collection([self.make_request(i, catalog_items, business_groups)
+                                            for i in range(requests)])
+        self.events = Collection([self.make_event(i) for i in range(events)])
+
+        self.resources = {}
+        self.parents = {}
+        self.deployment_ids = []
+        for i in range(deployments):
+            deployment_id = self._add_resource(DEPLOYMENT_TYPE, None, business_groups)
+            self.deployment_ids.append(deployment_id)
+            for _ in range(machines):
+                self._add_resource(MACHINE_TYPE, deployment_id, business_groups)
+
+        self.tree_root = self._add_resource(DEPLOYMENT_TYPE, None, business_groups)
+        level = [self.tree_root]
+        for depth in range(tree_depth):
+            kind = MACHINE_TYPE if depth == tree_depth - 1 else DEPLOYMENT_TYPE
+            level = [self._add_resource(kind, parent, business_groups) for parent in level
+                     for _ in range(tree_fanout)]
+
+        self.consumer_resources = Collection(list(self.resources.values()),
+                                             fields={'parentResource': 'parentResourceRef/id',
+                                                     'resourceType/id': 'resourceTypeRef/id'},
+                                             indexed=('id', 'parentResource'))
+        self.resource_views = Collection([self.make_resource_view(r) for r in self.resources.values()],
+                                         fields={'id': 'resourceId', 'parentResource': 'parentResourceId'},
+                                         indexed=('id', 'parentResource'), native=('parentResource',))
+        self.views_by_id = dict((v['resourceId'], v) for v in self.resource_views.items)
+        self.requests_by_id = dict((r['id'], r) for r in self.catalog_requests.items)
+        self._initial_requests = len(self.catalog_requests.items)
+        self._initial_events = len(self.events.items)
+
+        self._routes = [
+            (r'/identity/api/tenants/[^/]+/subtenants$', self.collection(self.business_groups)),
+            (r'/identity/api/tenants/[^/]+/subtenants/([^/]+)$', self.business_group),
+            # every user is a member of every business group
+            (r'/identity/api/tenants/[^/]+/principals/[^/]+/subtenants$', self.collection(self.business_groups)),
+            (r'/catalog-service/api/consumer/entitledCatalogItems$', self.collection(self.catalog_items)),
+            (r'/catalog-service/api/consumer/entitledCatalogItemViews$', self.collection(self.catalog_item_views)),
+            (r'/catalog-service/api/consumer/entitledCatalogItems/([^/]+)/requests/template$', self.template),
+            (r'/catalog-service/api/consumer/entitledCatalogItems/([^/]+)/requests$', self.submit),
+            (r'/catalog-service/api/consumer/resources$', self.collection(self.consumer_resources)),
+            (r'/catalog-service/api/consumer/resources/([^/]+)$', self.resource),
+            (r'/catalog-service/api/consumer/resources/([^/]+)/actions/([^/]+)/requests/template$',
+             self.action_template),
+            (r'/catalog-service/api/consumer/resources/([^/]+)/actions/([^/]+)/requests$', self.action),
+            (r'/catalog-service/api/consumer/resourceViews$', self.collection(self.resource_views)),
+            (r'/catalog-service/api/consumer/resourceViews/([^/]+)$', self.resource_view),
+            (r'/catalog-service/api/consumer/requests$', self.collection(self.catalog_requests)),
+            (r'/catalog-service/api/consumer/requests/([^/]+)$', self.request),
+            (r'/reservation-service/api/reservations$', self.collection(self.reservations)),
+            (r'/event-broker-service/api/events$', self.collection(self.events)),
+        ]
+        self._routes = [(re.compile(pattern), handler) for pattern, handler in self._routes]
+
+    def reset(self):
+        """Forgets the requests counted, the catalog requests submitted and the events added since the server
+        was created, so every run of a benchmark sees the same data."""
+
+        super(MockVRA, self).reset()
+        for collection, initial in ((self.catalog_requests, self._initial_requests),
+                                    (self.events, self._initial_events)):
+            with collection._lock:
+                del collection.items[initial:]
+                collection._indexes = None
+        self.requests_by_id = dict((r['id'], r) for r in self.catalog_requests.items)
+
+    def next_sequence(self):
+        with self._sequence_lock:
+            self._sequence += 1
+            return self._sequence
+
+    # Generated payloads
+
+    @staticmethod
+    def make_business_group(i):
+        return {
+            '@type': 'Subtenant',
+            'id': uuid(1, i),
+            'name': 'Business Group %d' % i,
+            'description': 'Synthetic business group %d' % i,
+            'subtenantRoles': None,
+            'extensionData': {'entries': [{'key': 'iaas-manager-emails',
+                                           'value': {'type': 'string', 'value': 'bg%d@corp.local' % i}}]},
+            'tenant': TENANT,
+        }
+
+    @staticmethod
+    def make_catalog_item(i, business_groups):
+        service = SERVICES[i % len(SERVICES)]
+        name = '%s %s %d' % (OS_NAMES[i % len(OS_NAMES)], ('Small', 'Medium', 'Large')[i % 3], i)
+        return {
+            '@type': 'ConsumerEntitledCatalogItem',
+            'catalogItem': {
+                'id': uuid(2, i),
+                'version': 1,
+                'name': name,
+                'description': 'Synthetic catalog item %d' % i,
+                'status': 'PUBLISHED',
+                'statusName': 'Published',
+                'organization': {'tenantRef': TENANT, 'tenantLabel': TENANT, 'subtenantRef': None,
+                                 'subtenantLabel': None},
+                'providerBinding': {'bindingId': uuid(3, i),
+                                    'providerRef': {'id': uuid(4, 0), 'label': 'Blueprint Service'}},
+                'forms': {'catalogItemDetails': {'type': 'external', 'formId': 'details-%d' % i},
+                          'submitRequestForm': {'type': 'extension', 'formId': 'submit-%d' % i}},
+                'callbacks': None,
+                'isNoteworthy': False,
+                'dateCreated': timestamp(i * 60),
+                'lastUpdatedDate': timestamp(i * 60 + 30),
+                'iconId': 'composition.blueprint.png',
+                'catalogItemTypeRef': {'id': 'com.vmware.csp.component.cafe.composition.blueprint',
+                                       'label': 'Composite Blueprint'},
+                'serviceRef': {'id': uuid(5, SERVICES.index(service)), 'label': service},
+                'outputResourceTypeRef': {'id': DEPLOYMENT_TYPE, 'label': 'Deployment'},
+            },
+            'entitledOrganizations': [{'tenantRef': TENANT, 'tenantLabel': TENANT,
+                                       'subtenantRef': uuid(1, g), 'subtenantLabel': 'Business Group %d' % g}
+                                      for g in sorted(set((i % business_groups, (i * 7 + 3) % business_groups)))]
+            if business_groups else [],
+        }
+
+    @staticmethod
+    def make_catalog_item_view(entitled):
+        item = entitled['catalogItem']
+        return {
+            '@type': 'ConsumerEntitledCatalogItemView',
+            'entitledOrganizations': entitled['entitledOrganizations'],
+            'catalogItemId': item['id'],
+            'name': item['name'],
+            'description': item['description'],
+            'isNoteworthy': False,
+            'dateCreated': item['dateCreated'],
+            'lastUpdatedDate': item['lastUpdatedDate'],
+            'links': [],
+            'iconId': item['iconId'],
+            'catalogItemTypeRef': item['catalogItemTypeRef'],
+            'serviceRef': item['serviceRef'],
+            'outputResourceTypeRef': item['outputResourceTypeRef'],
+        }
+
+    @staticmethod
+    def make_reservation(i, business_groups):
+        return {
+            'id': uuid(6, i),
+            'name': 'Reservation %d' % i,
+            'reservationTypeId': 'Infrastructure.Reservation.Virtual.vSphere',
+            'tenantId': TENANT,
+            'subTenantId': uuid(1, i % business_groups) if business_groups else None,
+            'enabled': True,
+            'priority': i % 10,
+            'reservationPolicyId': None,
+            'alertSettings': [],
+            'createdDate': timestamp(i * 3600),
+            'lastUpdated': timestamp(i * 3600 + 60),
+            'version': 1,
+            'extensionData': {'entries': [
+                {'key': 'computeResource', 'value': {'type': 'entityRef', 'classId': 'ComputeResource',
+                                                     'id': uuid(7, i % 8), 'label': 'Cluster %d' % (i % 8)}},
+                {'key': 'reservationMemory', 'value': {'type': 'complex', 'values': {'entries': [
+                    {'key': 'memoryReservedSizeMb', 'value': {'type': 'integer', 'value': 65536}}]}}},
+                {'key': 'reservationStorages', 'value': {'type': 'multiple', 'elementTypeId': 'COMPLEX',
+                                                         'items': [{'type': 'complex', 'values': {'entries': [
+                                                             {'key': 'storageReservedSizeGB',
+                                                              'value': {'type': 'integer', 'value': 2048}}]}}
+                                                                   for _ in range(3)]}},
+            ]},
+        }
+
+    @staticmethod
+    def make_request(i, catalog_items, business_groups):
+        return {
+            '@type': 'CatalogItemRequest',
+            'id': uuid(8, i),
+            'iconId': 'composition.blueprint.png',
+            'version': 6,
+            'requestNumber': i + 1,
+            'state': ('SUCCESSFUL', 'SUCCESSFUL', 'SUCCESSFUL', 'FAILED', 'IN_PROGRESS')[i % 5],
+            'description': 'Synthetic request %d' % i,
+            'reasons': None,
+            'requestedFor': 'user%d@%s' % (i % 50, TENANT),
+            'requestedBy': 'user%d@%s' % (i % 50, TENANT),
+            'organization': {'tenantRef': TENANT, 'tenantLabel': TENANT,
+                             'subtenantRef': uuid(1, i % business_groups) if business_groups else None,
+                             'subtenantLabel': 'Business Group %d' % (i % business_groups) if business_groups
+                             else None},
+            'requestorEntitlementId': uuid(9, i % 10),
+            'preApprovalId': None,
+            'postApprovalId': None,
+            'dateCreated': timestamp(i * 300),
+            'lastUpdated': timestamp(i * 300 + 120),
+            'dateSubmitted': timestamp(i * 300),
+            'dateApproved': None,
+            'dateCompleted': timestamp(i * 300 + 120),
+            'quote': {},
+            'requestData': {'entries': [{'key': 'provider-VirtualMachine.CPU.Count',
+                                         'value': {'type': 'integer', 'value': 2}}]},
+            'retriesRemaining': 3,
+            'requestedItemName': 'Catalog item %d' % (i % catalog_items if catalog_items else 0),
+            'requestedItemDescription': 'Synthetic catalog item',
+            'components': None,
+            'stateName': 'Successful',
+            'catalogItemRef': {'id': uuid(2, i % catalog_items if catalog_items else 0), 'label': 'Catalog item'},
+            'catalogItemProviderBinding': {'bindingId': uuid(3, i), 'providerRef': {'id': uuid(4, 0),
+                                                                                     'label': 'Blueprint Service'}},
+            'waitingStatus': 'NOT_WAITING',
+            'executionStatus': 'STOPPED',
+            'approvalStatus': 'POST_APPROVED',
+            'phase': 'SUCCESSFUL',
+        }
+
+    @staticmethod
+    def make_event(i):
+        return {
+            'id': uuid(10, i),
+            'eventTopicId': EVENT_TOPICS[i % len(EVENT_TOPICS)],
+            'timeStamp': timestamp(i * 5),
+            'sourceType': 'vco',
+            'sourceIdentity': 'vro-01a.corp.local',
+            'tenantId': TENANT,
+            'userName': 'user%d@%s' % (i % 50, TENANT),
+            'properties': {'machine': {'id': uuid(11, i), 'name': 'vm-%06d' % i,
+                                       'properties': {'VirtualMachine.CPU.Count': '2',
+                                                      'VirtualMachine.Memory.Size': '4096'}},
+                           'lifecycleState': {'state': 'VMPSMasterWorkflow32.MachineProvisioned',
+                                              'phase': 'POST'}},
+        }
+
+    def add_events(self, n):
+        """Appends n new events to the Event Broker log, newer than the existing ones."""
+
+        start = len(self.events.items)
+        for i in range(start, start + n):
+            self.events.append(self.make_event(i))
+
+    def _add_resource(self, kind, parent_id, business_groups):
+        i = len(self.resources)
+        resource_id = uuid(12, i)
+        name = ('deployment-%06d' if kind == DEPLOYMENT_TYPE else 'vm-%06d') % i
+        group = i % business_groups if business_groups else 0
+        resource = {
+            '@type': 'CatalogResource',
+            'id': resource_id,
+            'iconId': 'composition.blueprint.png' if kind == DEPLOYMENT_TYPE else 'machine.png',
+            'resourceTypeRef': {'id': kind, 'label': 'Deployment' if kind == DEPLOYMENT_TYPE else 'Virtual Machine'},
+            'name': name,
+            'description': 'Synthetic resource %d' % i,
+            'status': 'ACTIVE',
+            'catalogItem': {'id': uuid(2, 0), 'label': 'Catalog item 0'},
+            'requestId': uuid(8, i),
+            'requestState': 'SUCCESSFUL',
+            'providerBinding': {'bindingId': uuid(13, i), 'providerRef': {'id': uuid(4, 0), 'label': 'Provider'}},
+            'owners': [{'tenantName': TENANT, 'ref': 'user%d@%s' % (i % 50, TENANT), 'type': 'USER',
+                        'value': 'User %d' % (i % 50)}],
+            'organization': {'tenantRef': TENANT, 'tenantLabel': TENANT, 'subtenantRef': uuid(1, group),
+                             'subtenantLabel': 'Business Group %d' % group},
+            'dateCreated': timestamp(i * 90),
+            'lastUpdated': timestamp(i * 90 + 45),
+            'hasLease': True,
+            'lease': {'start': timestamp(i * 90), 'end': timestamp(i * 90 + 86400 * 90)},
+            'hasCosts': True,
+            'totalCost': None,
+            'hasChildren': False,
+            'operations': [{'name': op, 'description': op, 'iconId': 'machine_%s.png' % op.lower().replace(' ', ''),
+                            'type': 'ACTION', 'id': uuid(14, OPERATIONS.index(op)), 'extensionId': None,
+                            'providerTypeId': 'com.vmware.csp.iaas.blueprint.service', 'bindingId': op,
+                            'hasForm': False, 'formScale': None} for op in OPERATIONS],
+            'resourceData': {'entries': [
+                {'key': 'MachineName', 'value': {'type': 'string', 'value': name}},
+                {'key': 'MachineCPU', 'value': {'type': 'integer', 'value': 2}},
+                {'key': 'MachineMemory', 'value': {'type': 'integer', 'value': 4096}},
+                {'key': 'ip_address', 'value': {'type': 'string',
+                                                'value': '10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255)}},
+            ]},
+        }
+        if parent_id is not None:
+            resource['parentResourceRef'] = {'id': parent_id, 'label': self.resources[parent_id]['name']}
+            self.resources[parent_id]['hasChildren'] = True
+            self.parents[resource_id] = parent_id
+        self.resources[resource_id] = resource
+        return resource_id
+
+    def make_resource_view(self, resource):
+        resource_id = resource['id']
+        base = 'https://%s/catalog-service/api/consumer/resources/%s/actions' % (self.cloudurl, resource_id)
+        links = []
+        for op in resource['operations']:
+            label = '{com.vmware.csp.component.iaas.proxy.provider@resource.action.name.machine.%s}' % (
+                op['name'].replace(' ', ''))
+            links.append({'@type': 'link', 'rel': 'GET Template: %s' % label,
+                          'href': '%s/%s/requests/template' % (base, op['id'])})
+            links.append({'@type': 'link', 'rel': 'POST: %s' % label, 'href': '%s/%s/requests' % (base, op['id'])})
+        data = dict((e['key'], e['value'].get('value')) for e in resource['resourceData']['entries'])
+        data.update(('VirtualMachine.Property%d' % k, 'value %d' % k) for k in range(20))
+        return {
+            '@type': 'CatalogResourceView',
+            'links': links,
+            'resourceId': resource_id,
+            'iconId': resource['iconId'],
+            'name': resource['name'],
+            'description': resource['description'],
+            'status': resource['status'],
+            'catalogItemId': resource['catalogItem']['id'],
+            'catalogItemLabel': resource['catalogItem']['label'],
+            'requestId': resource['requestId'],
+            'requestState': 'SUCCESSFUL',
+            'resourceType': resource['resourceTypeRef']['id'],
+            'owners': [o['value'] for o in resource['owners']],
+            'businessGroupId': resource['organization']['subtenantRef'],
+            'businessGroupName': resource['organization']['subtenantLabel'],
+            'tenantId': TENANT,
+            'dateCreated': resource['dateCreated'],
+            'lastUpdated': resource['lastUpdated'],
+            'lease': resource['lease'],
+            'costs': None,
+            'costToDate': None,
+            'totalCost': None,
+            'parentResourceId': self.parents.get(resource_id),
+            'hasChildren': resource['hasChildren'],
+            'data': data,
+        }
+
+    def make_template(self, catalog_item_id):
+        return {
+            'type': 'com.vmware.vcac.catalog.domain.request.CatalogItemProvisioningRequest',
+            'catalogItemId': catalog_item_id,
+            'requestedFor': 'bench@%s' % TENANT,
+            'businessGroupId': uuid(1, 0),
+            'description': None,
+            'reasons': None,
+            'data': {
+                '_leaseDays': None,
+                '_number_of_instances': 1,
+                'vSphere_Machine_1': {
+                    'componentTypeId': 'com.vmware.csp.component.cafe.composition',
+                    'componentId': None,
+                    'classId': 'Blueprint.Component.Declaration',
+                    'typeFilter': 'machine*vSphere_Machine_1',
+                    'data': dict([('cpu', 2), ('memory', 4096), ('storage', 60), ('_cluster', 1),
+                                  ('guest_customization_specification', None), ('max_network_adapters', -1),
+                                  ('disks', [{'componentTypeId': 'com.vmware.csp.iaas.blueprint.service',
+                                              'classId': 'Infrastructure.Compute.Machine.MachineDisk',
+                                              'data': {'capacity': 60, 'id': 1, 'label': 'Hard disk 1',
+                                                       'is_clone': True, 'volumeId': 0}}])] +
+                                 [('VirtualMachine.Property%d' % k, 'value %d' % k) for k in range(20)]),
+                },
+            },
+        }
+
+    # Routes
+
+    def handle(self, method, path, body):
+        if path.startswith('/identity/api/tokens'):
+            return super(MockVRA, self).handle(method, path, body)
+
+        url = urlparse(path)
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        for pattern, handler in self._routes:
+            match = pattern.match(unquote(url.path))
+            if match:
+                try:
+                    return handler(method, query, body, *match.groups())
+                except ODataError as e:
+                    return 400, {'errors': [{'code': 10101, 'message': str(e)}]}, None
+        return 404, {'errors': [{'code': 20116, 'message': 'Not found: %s' % url.path}]}, None
+
+    @staticmethod
+    def not_found(kind, object_id):
+        return 404, {'errors': [{'code': 20116, 'message': '%s with id %s not found' % (kind, object_id)}]}, None
+
+    def collection(self, collection):
+        def handler(method, query, body):
+            if method != 'GET':
+                return 405, {}, None
+            if not self.odata and ('$orderby' in query or '$filter' in query and any(
+                    field not in collection.native
+                    for alternatives in parse_filter(query['$filter']) for _, field, _, _ in alternatives)):
+                raise ODataError('$filter and $orderby are not supported by this endpoint')
+
+            items = collection.select(query.get('$filter'), query.get('$orderby'))
+            page = int(query.get('page', 1))
+            limit = min(int(query.get('limit', self.default_limit)), self.max_limit)
+            total_pages = max(1, (len(items) + limit - 1) // limit)
+            return 200, {
+                'links': [],
+                'content': items[(page - 1) * limit:page * limit],
+                'metadata': {'size': limit,
+                             'totalElements': len(items),
+                             'totalPages': total_pages,
+                             'number': page,
+                             'offset': (page - 1) * limit},
+            }, None
+        return handler
+
+    def business_group(self, method, query, body, group_id):
+        for group in self.business_groups.items:
+            if group['id'] == group_id:
+                return 200, group, None
+        return self.not_found('Subtenant', group_id)
+
+    def template(self, method, query, body, catalog_item_id):
+        return 200, self.make_template(catalog_item_id), None
+
+    def _new_request(self, catalog_item_id, description=None):
+        n = self.next_sequence()
+        request_id = uuid(15, n)
+        request = {
+            '@type': 'CatalogItemRequest',
+            'id': request_id,
+            'requestNumber': 100000 + n,
+            'state': 'SUBMITTED',
+            'description': description,
+            'catalogItemRef': {'id': catalog_item_id},
+            'dateCreated': timestamp(n),
+            'lastUpdated': timestamp(n),
+        }
+        # requests complete as soon as they are submitted
+        completed = dict(request, state='SUCCESSFUL', phase='SUCCESSFUL')
+        self.requests_by_id[request_id] = completed
+        self.catalog_requests.append(completed)
+        return request
+
+    def submit(self, method, query, body, catalog_item_id):
+        if method != 'POST':
+            return 405, {}, None
+        request = self._new_request(catalog_item_id)
+        location = 'https://%s/catalog-service/api/consumer/requests/%s' % (self.cloudurl, request['id'])
+        return 201, request, {'Location': location}
+
+    def resource(self, method, query, body, resource_id):
+        if resource_id not in self.resources:
+            return self.not_found('Resource', resource_id)
+        return 200, self.resources[resource_id], None
+
+    def resource_view(self, method, query, body, resource_id):
+        if resource_id not in self.views_by_id:
+            return self.not_found('Resource', resource_id)
+        return 200, self.views_by_id[resource_id], None
+
+    def action_template(self, method, query, body, resource_id, action_id):
+        return 200, {
+            'type': 'com.vmware.vcac.catalog.domain.request.CatalogResourceRequest',
+            'resourceId': resource_id,
+            'actionId': action_id,
+            'description': None,
+            'data': {'reasons': None, 'ForceDestroy': False},
+        }, None
+
+    def action(self, method, query, body, resource_id, action_id):
+        if method != 'POST':
+            return 405, {}, None
+        request = self._new_request(None)
+        location = 'https://%s/catalog-service/api/consumer/requests/%s' % (self.cloudurl, request['id'])
+        return 201, b'', {'Location': location}
+
+    def request(self, method, query, body, request_id):
+        if request_id not in self.requests_by_id:
+            return self.not_found('Request', request_id)
+        return 200, self.requests_by_id[request_id], None
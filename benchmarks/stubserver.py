@@ -0,0 +1,181 @@
+"""
+
+    A small local HTTPS server that answers vRA-style JSON requests for the benchmarks.
+
+    The server speaks HTTP/1.1 with keep-alive so connection reuse in the client can be measured.
+    A throwaway self-signed certificate is generated with the openssl command line tool.
+
+"""
+
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+
+def make_certificate(directory):
+    """Creates a self-signed certificate and key in `directory`.
+
+    :return: A tuple of (certfile, keyfile)
+    """
+
+    certfile = os.path.join(directory, 'cert.pem')
+    keyfile = os.path.join(directory, 'key.pem')
+    subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+                           '-keyout', keyfile, '-out', certfile, '-days', '1',
+                           '-subj', '/CN=127.0.0.1'],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return certfile, keyfile
+
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # enough for an AsyncSession opening max_concurrency connections at once
+    request_queue_size = 256
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _dispatch(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        server = self.server.stub
+        server.count(self.command, self.path)
+        if server.latency:
+            time.sleep(server.latency)
+
+        status, payload, headers = server.handle(self.command, self.path, body)
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+
+class StubServer(object):
+    """A local HTTPS server for the benchmarks.
+
+    Basic usage:
+
+    with StubServer() as server:
+        vra = vralib.Session('user', server.cloudurl, 'vsphere.local', 'Bearer x', ssl_verify=False)
+        vra._request('https://%s/identity/api/tenants' % server.cloudurl)
+
+    Subclasses override handle() to serve something more interesting than an empty object.
+    """
+
+    def __init__(self, latency=0):
+        """
+        :param latency: Seconds to sleep before answering each request
+        """
+
+        self.latency = latency
+        self.requests = 0
+        self.paths = []
+        self._lock = threading.Lock()
+        self._tmpdir = tempfile.mkdtemp(prefix='vralib-bench-')
+
+        certfile, keyfile = make_certificate(self._tmpdir)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+
+        self._server = _ThreadingServer(('127.0.0.1', 0), _Handler)
+        # the handshake happens in the thread of the request, so a burst of connections doesn't queue up behind
+        # the accept loop
+        self._server.socket = context.wrap_socket(self._server.socket, server_side=True,
+                                                  do_handshake_on_connect=False)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def cloudurl(self):
+        return '127.0.0.1:%s' % self._server.server_address[1]
+
+    def count(self, method, path):
+        with self._lock:
+            self.requests += 1
+            self.paths.append((method, path))
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.paths = []
+
+    def handle(self, method, path, body):
+        """Answers a request.
+
+        :return: A tuple of (status, payload, headers). The payload is either bytes or JSON serializable.
+        """
+
+        if path.startswith('/identity/api/tokens'):
+            return 200, {'id': 'stub-token', 'expires': '2099-01-01T00:00:00.000Z'}, None
+        return 200, {}, None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class PagedStubServer(StubServer):
+    """Serves the same synthetic collection for every path, paginated the way vRA does it.
+
+    `page` and `limit` are honoured; without `limit` the server default of 20 items per page is used.
+    """
+
+    def __init__(self, items=1000, default_limit=20, max_limit=5000, latency=0):
+        super(PagedStubServer, self).__init__(latency=latency)
+        self.items = [{'id': 'resource-%06d' % i, 'name': 'resource %d' % i} for i in range(items)]
+        self.default_limit = default_limit
+        self.max_limit = max_limit
+
+    def handle(self, method, path, body):
+        if path.startswith('/identity/api/tokens'):
+            return super(PagedStubServer, self).handle(method, path, body)
+
+        query = parse_qs(urlparse(path).query)
+        page = int(query.get('page', [1])[0])
+        limit = min(int(query.get('limit', [self.default_limit])[0]), self.max_limit)
+        total_pages = (len(self.items) + limit - 1) // limit
+
+        return 200, {
+            'links': [],
+            'content': self.items[(page - 1) * limit:page * limit],
+            'metadata': {'size': limit,
+                         'totalElements': len(self.items),
+                         'totalPages': total_pages,
+                         'number': page,
+                         'offset': (page - 1) * limit}
+        }, None
@@ -20,16 +20,23 @@ setup(
     long_description=read('README.md'),
     long_description_content_type='text/markdown',
     license='Apache License, Version 2.0',
+    python_requires='>=3.6',
     install_requires=[
         'requests',
     ],
+    extras_require={
+        'async': ['aiohttp'],
+        'fast': ['orjson'],
+    },
     classifiers=[
         'Intended Audience :: Developers',
         'License :: OSI Approved :: Apache Software License',
         'Operating System :: OS Independent',
         'Topic :: Software Development',
-        'Programming Language :: Python :: 2.7',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
         'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
     ],
 )
@@ -3,4 +3,54 @@
 
 Script used to setup the environment to use the vRA API without resorting to punching in the password every time
 
-"""
\ No newline at end of file
+It logs in once and saves the bearer token to the vralib token store (~/.vralib/tokens.json by default).
+Scripts that log in with token_store=vralib.TokenStore() reuse that token until it expires.
+
+"""
+
+import argparse
+import getpass
+
+import vralib
+
+
+def getargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--server',
+                        required=True,
+                        action='store',
+                        help='FQDN of the Cloud Provider.')
+    parser.add_argument('-u', '--username',
+                        required=False,
+                        action='store',
+                        help='Username to access the cloud provider')
+    parser.add_argument('-t', '--tenant',
+                        required=False,
+                        default='vsphere.local',
+                        action='store',
+                        help='vRealize tenant')
+    parser.add_argument('-f', '--file',
+                        required=False,
+                        default=vralib.tokenstore.DEFAULT_TOKEN_FILE,
+                        action='store',
+                        help='The file to store the token in')
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = getargs()
+    username = args.username
+
+    if not username:
+        username = input('vRA Username (user@domain): ')
+
+    store = vralib.TokenStore(args.file)
+    vra = vralib.Session.login(username, lambda: getpass.getpass('vRA Password: '), args.server,
+                               args.tenant, ssl_verify=False, token_store=store)
+
+    print('Token for %s@%s on %s is stored in %s' % (vra.username, vra.tenant, vra.cloudurl, store.path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+
+    Fakes shared by the tests: a Session whose requests never leave the process.
+
+"""
+
+import json
+
+import requests
+
+import vralib
+
+
+CLOUDURL = 'vra.local'
+TENANT = 'tenant'
+
+
+def response(status=200, body=None, headers=None):
+    """Builds a requests.Response holding body encoded as JSON."""
+
+    r = requests.Response()
+    r.status_code = status
+    r._content = b'' if body is None else json.dumps(body).encode('utf-8')
+    r._content_consumed = True
+    r.headers.update(headers or {})
+    return r
+
+
+def url(path):
+    return 'https://%s%s' % (CLOUDURL, path)
+
+
+class FakeSession(vralib.Session):
+    """
+    A Session answering its requests with a handler instead of a server.
+
+    The handler takes (method, url, payload) and returns a response() or a JSON body. Every request is
+    recorded in `sent` as (method, url, Authorization header).
+    """
+
+    def __init__(self, handler, auth_header='Bearer x', **kwargs):
+        kwargs.setdefault('retry', False)
+        super(FakeSession, self).__init__('user@corp.local', CLOUDURL, TENANT, auth_header, False, **kwargs)
+        self.handler = handler
+        self.sent = []
+
+    def _send(self, request_method, url, payload=None, stream=False):
+        self.sent.append((request_method, url, self.headers['Authorization']))
+        answer = self.handler(request_method, url, payload)
+        return answer if isinstance(answer, requests.Response) else response(200, answer)
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import sys
+import warnings
+
+import pytest
+import requests
+
+import vralib
+
+pytest.importorskip('aiohttp')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from mockvra import TENANT, MockVRA  # noqa: E402
+
+
+class FaultyVRA(MockVRA):
+    """A MockVRA answering the first requests to some paths with error statuses."""
+
+    def __init__(self, **kwargs):
+        super(FaultyVRA, self).__init__(deployments=5, machines=2, tree_depth=2, tree_fanout=2, catalog_items=50,
+                                        business_groups=45, requests=30, events=10, **kwargs)
+        self.faults = []
+        self.logins = 0
+
+    def handle(self, method, path, body):
+        if path.startswith('/identity/api/tokens'):
+            self.logins += 1
+        for fault in self.faults:
+            prefix, statuses = fault
+            if path.startswith(prefix) and statuses:
+                return statuses.pop(0), {'errors': []}, {'Retry-After': '0'}
+        return super(FaultyVRA, self).handle(method, path, body)
+
+
+@pytest.fixture(scope='module')
+def server():
+    with FaultyVRA() as server:
+        yield server
+
+
+@pytest.fixture(scope='module')
+def odata_less_server():
+    with FaultyVRA(odata=False) as server:
+        yield server
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        yield
+
+
+def run(server, test, **kwargs):
+    """Runs test(vra) in a new event loop with a session logged into server."""
+
+    async def main():
+        vra = await vralib.AsyncSession.login('user@%s' % TENANT, 'secret', server.cloudurl, TENANT,
+                                              ssl_verify=False, **kwargs)
+        async with vra:
+            return await test(vra)
+
+    server.faults = []
+    return asyncio.run(main())
+
+
+async def collect(items):
+    return [item async for item in items]
+
+
+def test_collections_match_session(server):
+    vra = vralib.Session('user@%s' % TENANT, server.cloudurl, TENANT, 'Bearer x', ssl_verify=False)
+    try:
+        expected = (vra.get_business_groups(), vra.get_entitled_catalog_item_views(),
+                    vra.get_business_groups_byuser('user@%s' % TENANT))
+    finally:
+        vra.close()
+
+    async def crawl(vra):
+        return await asyncio.gather(vra.get_business_groups(page_size=10),
+                                    collect(vra.iter_entitled_catalog_item_views(prefetch=True, page_size=7)),
+                                    collect(vra.iter_business_groups_byuser('user@%s' % TENANT)))
+
+    assert run(server, crawl) == list(expected)
+
+
+def test_http_errors_carry_the_response(server):
+    async def missing(vra):
+        with pytest.raises(requests.exceptions.HTTPError) as e:
+            await vra.get_consumer_resource('missing')
+        return e.value
+
+    error = run(server, missing)
+    assert error.response.status_code == 404
+    assert error.args[1] == 404
+    assert error.response.json()['errors']
+
+
+def test_transient_errors_are_retried(server):
+    async def flaky(vra):
+        server.faults.append(('/identity/api/tenants/%s/subtenants' % TENANT, [503, 502]))
+        return await vra.get_business_groups()
+
+    retry = vralib.RetryPolicy(backoff=0.01)
+    assert len(run(server, flaky, retry=retry)) == 45
+    assert server.requests >= 3
+
+    async def post(vra):
+        server.faults.append(('/catalog-service/api/consumer/entitledCatalogItems/', [503]))
+        with pytest.raises(requests.exceptions.HTTPError) as e:
+            await vra.request_item('item', payload={'data': {}})
+        return e.value.response.status_code
+
+    # a POST isn't retried unless it is marked safe
+    assert run(server, post, retry=retry) == 503
+
+
+def test_rejected_token_is_replaced_once(server):
+    async def expired(vra):
+        server.faults.append(('/catalog-service/api/consumer/requests', [401]))
+        logins = server.logins
+        requests = await vra.get_requests()
+        return requests, server.logins - logins
+
+    found, logins = run(server, expired)
+    assert len(found) == 30
+    assert logins == 1
+
+    async def rejected(vra):
+        server.faults.append(('/catalog-service/api/consumer/requests', [401, 401]))
+        with pytest.raises(requests.exceptions.HTTPError) as e:
+            await vra.get_requests()
+        return e.value.response.status_code
+
+    assert run(server, rejected) == 401
+    assert run(server, rejected, relogin=False) == 401
+
+
+def test_find_falls_back_without_odata(odata_less_server):
+    async def lookup(vra):
+        first = await vra.get_businessgroup_byname('group 1')
+        assert vra._odata_unsupported
+        return first, await vra.get_businessgroup_byname('group 1')
+
+    first, second = run(odata_less_server, lookup)
+    assert first == second
+    assert first and all('group 1' in g['name'].lower() for g in first)
@@ -0,0 +1,170 @@
+import pytest
+
+from vralib import cache as cache_module
+from vralib.cache import ResponseCache
+
+from tests.fakes import FakeSession, url
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, 'monotonic', clock)
+    return clock
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = ResponseCache(ttls=(('/items', 10),))
+    cache.set('/items', b'[1]')
+    clock.now += 9.9
+    assert cache.get('/items') == b'[1]'
+    clock.now += 0.1
+    assert cache.get('/items') is None
+    assert len(cache) == 0
+
+
+def test_ttls_per_endpoint(clock):
+    cache = ResponseCache(ttls=(('/template', 100), ('/items', 10)), default_ttl=None)
+    assert cache.ttl_for('/items/1/template') == 100
+    assert cache.ttl_for('/items?page=2') == 10
+    assert cache.ttl_for('/other') is None
+
+    cache.set('/items/1/template', b'{}')
+    cache.set('/items', b'[]')
+    cache.set('/other', b'[]')
+    assert len(cache) == 2
+
+    clock.now += 50
+    assert cache.get('/items') is None
+    assert cache.get('/items/1/template') == b'{}'
+
+
+def test_default_ttl(clock):
+    cache = ResponseCache(ttls=(), default_ttl=5)
+    cache.set('/anything', b'1')
+    assert cache.get('/anything') == b'1'
+    clock.now += 5
+    assert cache.get('/anything') is None
+
+
+def test_least_recently_used_is_evicted_first(clock):
+    cache = ResponseCache(maxsize=3, ttls=(('/', 60),))
+    for n in range(3):
+        cache.set('/%d' % n, b'%d' % n)
+    # /0 becomes the most recently used, so /1 goes first
+    assert cache.get('/0') == b'0'
+    cache.set('/3', b'3')
+    assert cache.get('/1') is None
+    cache.set('/4', b'4')
+    assert cache.get('/2') is None
+    assert [cache.get('/%d' % n) for n in (0, 3, 4)] == [b'0', b'3', b'4']
+    assert cache.stats()['evictions'] == 2
+
+
+def test_invalidate(clock):
+    cache = ResponseCache(ttls=(('/', 60),))
+    for path in ('/items/1', '/items/2', '/groups/1'):
+        cache.set(path, b'{}')
+    assert cache.invalidate('/items/') == 2
+    assert len(cache) == 1
+    assert cache.invalidate() == 1
+    assert len(cache) == 0
+
+
+def test_invalidate_paths_ignores_the_query(clock):
+    cache = ResponseCache(ttls=(('/', 60),))
+    for path in ('/items?page=1', '/items?page=2', '/items/1', '/items/1/template'):
+        cache.set(path, b'{}')
+    assert cache.invalidate_paths(('/items', '/items/1')) == 3
+    assert cache.get('/items/1/template') == b'{}'
+
+
+def test_hit_and_miss_counters(clock):
+    cache = ResponseCache(ttls=(('/items', 60),))
+    assert cache.get('/items') is None
+    cache.set('/items', b'[]')
+    cache.get('/items')
+    cache.get('/items')
+    # URLs that are never cached don't count as misses
+    cache.get('/other')
+    assert cache.stats() == {'size': 1, 'maxsize': 256, 'hits': 2, 'misses': 1, 'evictions': 0}
+
+
+ITEMS = '/catalog-service/api/consumer/entitledCatalogItems'
+
+
+def catalog_session():
+    def handler(method, request_url, payload):
+        if request_url.endswith('/template'):
+            return {'description': None, 'data': {}}
+        if method == 'GET':
+            return {'id': request_url.rsplit('/', 1)[-1]}
+        return {'id': 'request-1'}
+    return FakeSession(handler, cache=ResponseCache())
+
+
+def test_session_serves_hits_from_the_cache():
+    vra = catalog_session()
+    first = vra._request(url(ITEMS + '/1'))
+    first['modified'] = True
+    assert vra._request(url(ITEMS + '/1')) == {'id': '1'}
+    assert len(vra.sent) == 1
+    assert vra.cache.stats()['hits'] == 1
+
+
+def test_request_item_invalidates_the_item_and_its_collection():
+    vra = catalog_session()
+    vra._request(url(ITEMS))
+    vra._request(url(ITEMS + '/1'))
+    vra._request(url(ITEMS + '/1/requests/template'))
+    vra._request(url(ITEMS + '/2'))
+
+    vra.request_item('1')
+    assert vra.sent[-1][0] == 'POST'
+    # the POST to .../1/requests makes .../1 stale, the template, .../2 and the collection are kept
+    assert sorted(vra.cache._entries) == sorted(url(ITEMS + path) for path in ('', '/1/requests/template', '/2'))
+
+
+def test_delete_invalidates_the_collection():
+    groups = '/identity/api/tenants/tenant/subtenants'
+    vra = FakeSession(lambda method, request_url, payload: {}, cache=ResponseCache())
+    vra._request(url(groups))
+    vra._request(url(groups + '/g1'))
+    vra._request(url(groups + '/g2'))
+    assert len(vra.cache) == 3
+
+    vra.delete_businessgroup_fromid('g1')
+    assert sorted(vra.cache._entries) == [url(groups + '/g2')]
+
+
+def test_hits_are_counted_in_the_metrics():
+    vra = FakeSession(lambda method, request_url, payload: {'content': []}, cache=ResponseCache(), metrics=True)
+    for _ in range(3):
+        vra._request(url(ITEMS))
+
+    metrics = vra.metrics.snapshot()['catalog-service/api/consumer/entitledCatalogItems']['GET']
+    assert metrics['requests'] == 1
+    assert metrics['cache_hits'] == 2
+    assert 'vralib_cache_hits_total{endpoint="catalog-service/api/consumer/entitledCatalogItems",method="GET"} 2' \
+        in vra.metrics.prometheus()
+
+
+def test_hits_fire_the_hooks():
+    vra = FakeSession(lambda method, request_url, payload: {'content': []}, cache=ResponseCache())
+    traces = []
+    for event in ('before_send', 'after_headers', 'after_body', 'after_decode'):
+        vra.add_hook(event, lambda trace, event=event: traces.append((event, trace.cached)))
+    vra._request(url(ITEMS))
+    vra._request(url(ITEMS))
+
+    assert traces == [('before_send', False), ('after_headers', False), ('after_body', False),
+                      ('after_decode', False), ('before_send', True), ('after_decode', True)]
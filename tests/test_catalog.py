@@ -0,0 +1,113 @@
+import random
+
+import pytest
+
+from vralib.catalog import CatalogIndex
+from vralib.classes import Session
+
+
+WORDS = ('centos', 'CentOS', 'ubuntu', 'rhel', 'windows', 'sles', 'small', 'medium', 'large', 'x', 'é', '7', '2016')
+
+
+class FakeSession(object):
+    """Returns a fixed catalog instead of reading it from vRA."""
+
+    def __init__(self, items):
+        self.items = items
+
+    def get_entitled_catalog_items(self, page_size=None):
+        return list(self.items)
+
+    def get_entitled_catalog_item_views(self, page_size=None):
+        return [dict(item['catalogItem'], catalogItemId=item['catalogItem']['id']) for item in self.items]
+
+
+def make_items(count, seed=0):
+    rng = random.Random(seed)
+    items = []
+    for n in range(count):
+        name = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+        items.append({
+            'catalogItem': {'id': 'item-%d' % n, 'name': name, 'serviceRef': {'id': 'service-%d' % (n % 3)},
+                            'version': 1},
+            'entitledOrganizations': [{'subtenantRef': 'group-%d' % (n % 4)}],
+        })
+    return items
+
+
+def brute_force(items, text=None, prefix=None, service=None, business_group=None):
+    found = []
+    for item in items:
+        catalog_item = item['catalogItem']
+        name = catalog_item['name'].lower()
+        if text and text.lower() not in name:
+            continue
+        if prefix and not name.startswith(prefix.lower()):
+            continue
+        if service is not None and catalog_item['serviceRef']['id'] != service:
+            continue
+        if business_group is not None and \
+                business_group not in [o['subtenantRef'] for o in item['entitledOrganizations']]:
+            continue
+        found.append(item)
+    return sorted(found, key=lambda i: (i['catalogItem']['name'].lower(), i['catalogItem']['id']))
+
+
+@pytest.fixture(scope='module')
+def items():
+    return make_items(400)
+
+
+@pytest.fixture(scope='module')
+def catalog(items):
+    return CatalogIndex(FakeSession(items))
+
+
+TEXTS = ['c', 'ce', 'cen', 'cent', 'centos', 'OS u', 'os ubuntu', 's', 'e', ' ', 'é', '16', 'windows 2016 large',
+         'missing', 'xx']
+
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_substring_matches_brute_force(catalog, items, text):
+    assert catalog.search(text) == brute_force(items, text=text)
+
+
+@pytest.mark.parametrize('prefix', TEXTS)
+def test_prefix_matches_brute_force(catalog, items, prefix):
+    assert catalog.search(prefix=prefix) == brute_force(items, prefix=prefix)
+
+
+def test_combined_criteria_and_limit(catalog, items):
+    for text, prefix in (('os', 'cent'), ('large', None), (None, 'w')):
+        for service in (None, 'service-1'):
+            for group in (None, 'group-2', 'group-9'):
+                expected = brute_force(items, text, prefix, service, group)
+                assert catalog.search(text, prefix, service, group) == expected
+                assert catalog.search(text, prefix, service, group, limit=3) == expected[:3]
+
+
+def test_get(catalog, items):
+    assert catalog.get('item-7') is items[7]
+    assert catalog.get('missing') is None
+    assert len(catalog) == len(items)
+
+
+def test_refresh_only_reindexes_changes(items):
+    changed = [dict(i) for i in items[:300]]
+    catalog = CatalogIndex(FakeSession(changed))
+    changed[0] = dict(changed[0], catalogItem=dict(changed[0]['catalogItem'], name='renamed', version=2))
+    changed.extend(items[300:310])
+
+    assert catalog.refresh(changed[:250] + changed[300:]) == {'added': 10, 'updated': 1, 'removed': 50}
+    remaining = changed[:250] + changed[300:]
+    for text in TEXTS + ['renamed']:
+        assert catalog.search(text) == brute_force(remaining, text=text)
+        assert catalog.search(prefix=text) == brute_force(remaining, prefix=text)
+
+
+def test_get_catalogitem_byname_rejects_view_indexes(items):
+    session = Session('user', 'vra', 'tenant', 'Bearer token', ssl_verify=False)
+    assert session.get_catalogitem_byname('cent', catalog=CatalogIndex(FakeSession(items))) == \
+        brute_force(items, text='cent')
+    with pytest.raises(ValueError):
+        session.get_catalogitem_byname('cent', catalog=CatalogIndex(FakeSession(items), views=True))
@@ -0,0 +1,109 @@
+import json
+import re
+
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from vralib.events import EventTail
+
+from tests.fakes import FakeSession, response
+
+
+class EventLog(object):
+    """The Event Broker log of a fake appliance, paginated and filtered like vRA does it."""
+
+    def __init__(self, odata=True):
+        self.odata = odata
+        self.events = []
+        self.filters = []
+
+    def add(self, *timestamps):
+        for timestamp in timestamps:
+            self.events.append({'id': 'event-%d' % len(self.events), 'timeStamp': '2019-05-01T12:00:%02d' % timestamp})
+
+    def __call__(self, method, url, payload):
+        query = dict((k, v[0]) for k, v in parse_qs(urlsplit(url).query).items())
+        events = list(self.events)
+        if '$filter' in query or '$orderby' in query:
+            if not self.odata:
+                return response(400, {'errors': []})
+            self.filters.append(query.get('$filter'))
+            since = re.findall(r"timeStamp ge '([^']+)'", query.get('$filter', ''))
+            events = [e for e in events if not since or e['timeStamp'] >= since[0]]
+            events.sort(key=lambda e: e['timeStamp'], reverse=query['$orderby'].endswith('desc'))
+
+        page, limit = int(query.get('page', 1)), int(query.get('limit', 20))
+        return {'content': events[(page - 1) * limit:page * limit],
+                'metadata': {'totalElements': len(events), 'totalPages': max(1, -(-len(events) // limit))}}
+
+
+@pytest.fixture(params=[True, False], ids=['odata', 'no-odata'])
+def log(request):
+    log = EventLog(odata=request.param)
+    log.add(1, 2, 2, 3)
+    return log
+
+
+def ids(events):
+    return [e['id'] for e in events]
+
+
+def test_start_at_latest_skips_the_past(log):
+    tail = EventTail(FakeSession(log))
+    assert tail.poll() == []
+    log.add(3, 4)
+    assert ids(tail.poll()) == ['event-4', 'event-5']
+    assert tail.poll() == []
+
+
+def test_start_at_earliest_returns_the_log_in_order(log):
+    log.add(0)
+    tail = EventTail(FakeSession(log), start='earliest')
+    assert ids(tail.poll()) == ['event-4', 'event-0', 'event-1', 'event-2', 'event-3']
+    assert tail.poll() == []
+
+
+def test_incremental_polls_ask_from_the_mark():
+    log = EventLog()
+    log.add(1, 2)
+    tail = EventTail(FakeSession(log), start='earliest')
+    tail.poll()
+    tail.poll()
+    assert log.filters == [None, "timeStamp ge '2019-05-01T12:00:02'"]
+
+
+def test_checkpoint_resumes_after_a_restart(log, tmp_path):
+    checkpoint = str(tmp_path / 'state' / 'events.json')
+    assert ids(EventTail(FakeSession(log), checkpoint, start='earliest').poll()) == \
+        ['event-0', 'event-1', 'event-2', 'event-3']
+
+    with open(checkpoint) as f:
+        assert json.load(f)['timestamp'] == '2019-05-01T12:00:03'
+
+    # an event sharing the timestamp of the mark is new as long as its id wasn't returned
+    log.add(3, 5)
+    restarted = EventTail(FakeSession(log), checkpoint, start='latest')
+    assert ids(restarted.poll()) == ['event-4', 'event-5']
+    assert EventTail(FakeSession(log), checkpoint).poll() == []
+
+
+def test_event_being_handled_is_returned_again_after_a_crash(log, tmp_path):
+    checkpoint = str(tmp_path / 'events.json')
+    events = EventTail(FakeSession(log), checkpoint, start='earliest').events()
+    assert next(events)['id'] == 'event-0'
+    assert next(events)['id'] == 'event-1'
+    # the process dies while handling event-1
+    events.close()
+
+    assert ids(EventTail(FakeSession(log), checkpoint).poll()) == ['event-1', 'event-2', 'event-3']
+
+
+def test_checkpoint_is_kept_per_user(log, tmp_path):
+    checkpoint = str(tmp_path / 'events.json')
+    EventTail(FakeSession(log), checkpoint).poll()
+
+    other = FakeSession(log)
+    other.username = 'other@corp.local'
+    with pytest.raises(ValueError):
+        EventTail(other, checkpoint)
@@ -0,0 +1,137 @@
+import re
+
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from vralib.inventory import Inventory
+
+from tests.fakes import FakeSession, response
+
+
+class Appliance(object):
+    """The consumer resources, requests and business groups of a fake appliance."""
+
+    def __init__(self, odata=True):
+        self.odata = odata
+        self.clock = 0
+        self.resources = {}
+        self.requests = {}
+        self.groups = [{'id': 'group-1', 'name': 'Engineering'}]
+        self.queries = []
+
+    def timestamp(self):
+        self.clock += 1
+        return '2019-05-01T12:00:%02d.000Z' % self.clock
+
+    def put_resource(self, n, **fields):
+        self.resources['resource-%d' % n] = dict({
+            'id': 'resource-%d' % n, 'name': 'vm-%d' % n, 'resourceTypeRef': {'id': 'Infrastructure.Virtual'},
+            'organization': {'subtenantRef': 'group-1'}, 'owners': [{'ref': 'user%d@corp.local' % n}],
+            'lastUpdated': self.timestamp()}, **fields)
+
+    def put_request(self, n, state):
+        self.requests['request-%d' % n] = {'id': 'request-%d' % n, 'state': state,
+                                           'dateCreated': '2019-05-01', 'lastUpdated': self.timestamp()}
+
+    def __call__(self, method, url, payload):
+        parts = urlsplit(url)
+        query = dict((k, v[0]) for k, v in parse_qs(parts.query).items())
+        collection = {'resources': self.resources, 'requests': self.requests}.get(parts.path.rsplit('/', 1)[-1])
+        items = list(collection.values()) if collection is not None else self.groups
+
+        self.queries.append(query.get('$filter'))
+        if '$filter' in query:
+            if not self.odata:
+                return response(400, {'errors': []})
+            since, = re.findall(r"lastUpdated ge '([^']+)'", query['$filter'])
+            items = sorted((i for i in items if i['lastUpdated'] >= since), key=lambda i: i['lastUpdated'])
+
+        return {'content': items, 'metadata': {'totalElements': len(items), 'totalPages': 1}}
+
+
+@pytest.fixture
+def appliance():
+    appliance = Appliance()
+    for n in range(3):
+        appliance.put_resource(n)
+        appliance.put_request(n, 'IN_PROGRESS')
+    return appliance
+
+
+def names(resources):
+    return sorted(r['name'] for r in resources)
+
+
+def test_first_sync_reads_everything(appliance):
+    with Inventory(FakeSession(appliance), ':memory:') as inventory:
+        assert inventory.sync() == {'resources': 3, 'requests': 3, 'business_groups': 1}
+        assert names(inventory.resources()) == ['vm-0', 'vm-1', 'vm-2']
+        assert inventory.high_water('resources') == '2019-05-01T12:00:05.000Z'
+        assert inventory.high_water('requests') == '2019-05-01T12:00:06.000Z'
+        assert [r['name'] for r in inventory.resources(owner='user1@corp.local')] == ['vm-1']
+        assert inventory.business_groups('engin')[0]['id'] == 'group-1'
+
+
+def test_later_syncs_only_read_the_rows_updated_since(appliance):
+    with Inventory(FakeSession(appliance), ':memory:') as inventory:
+        inventory.sync()
+        appliance.put_resource(1, name='renamed', owners=[{'ref': 'other@corp.local'}])
+        appliance.put_resource(3)
+        appliance.put_request(0, 'SUCCESSFUL')
+        del appliance.resources['resource-2']
+        del appliance.queries[:]
+
+        # the rows updated at the high water mark are read again, since others may share their timestamp
+        assert inventory.sync() == {'resources': 2, 'requests': 2, 'business_groups': 1}
+        assert appliance.queries[:2] == ["lastUpdated ge '2019-05-01T12:00:05.000Z'",
+                                         "lastUpdated ge '2019-05-01T12:00:06.000Z'"]
+        # deleted rows are only dropped by a full sync
+        assert names(inventory.resources()) == ['renamed', 'vm-0', 'vm-2', 'vm-3']
+        assert inventory.resources(owner='user1@corp.local') == []
+        assert [r['id'] for r in inventory.requests(state='SUCCESSFUL')] == ['request-0']
+        assert inventory.high_water('resources') == '2019-05-01T12:00:08.000Z'
+
+        assert inventory.sync(full=True)['resources'] == 3
+        assert names(inventory.resources()) == ['renamed', 'vm-0', 'vm-3']
+        assert inventory.query('SELECT COUNT(*) AS n FROM resource_owners')[0]['n'] == 3
+
+
+def test_high_water_mark_does_not_move_back(appliance):
+    with Inventory(FakeSession(appliance), ':memory:') as inventory:
+        inventory.sync()
+        appliance.resources.clear()
+        inventory.sync()
+        assert inventory.high_water('resources') == '2019-05-01T12:00:05.000Z'
+        assert len(inventory.resources()) == 3
+
+
+def test_resync_falls_back_to_full_reads_without_odata(appliance):
+    appliance.odata = False
+    vra = FakeSession(appliance)
+    with Inventory(vra, ':memory:') as inventory:
+        inventory.sync()
+        appliance.put_resource(3)
+        del appliance.resources['resource-0']
+
+        assert inventory.sync()['resources'] == 3
+        assert names(inventory.resources()) == ['vm-1', 'vm-2', 'vm-3']
+        assert appliance.queries.count(None) == 6
+        # the filter was rejected once per collection and isn't tried again
+        inventory.sync()
+        assert appliance.queries.count("lastUpdated ge '2019-05-01T12:00:05.000Z'") == 1
+        assert len(vra._odata_unsupported) == 2
+
+
+def test_database_is_kept_per_user(appliance, tmp_path):
+    path = str(tmp_path / 'inventory.db')
+    with Inventory(FakeSession(appliance), path) as inventory:
+        inventory.sync()
+
+    with Inventory(FakeSession(appliance), path) as inventory:
+        assert len(inventory.resources()) == 3
+
+    other = FakeSession(appliance)
+    other.username = 'other@corp.local'
+    with pytest.raises(ValueError):
+        Inventory(other, path)
@@ -0,0 +1,112 @@
+import pytest
+
+from vralib.models import CompactDeployment, CompactModel, CompactReservation, LazyField
+
+from tests.fakes import CLOUDURL
+
+
+class Session(object):
+    cloudurl = CLOUDURL
+
+
+def resource(n=1):
+    return {
+        'id': 'resource-%d' % n,
+        'name': 'vm-%d' % n,
+        'resourceTypeRef': {'id': 'Infrastructure.Virtual'},
+        'organization': {'subtenantRef': 'group-1', 'tenantRef': 'tenant'},
+        'operations': [{'name': 'Reboot', 'description': 'Reboot it', 'id': 'reboot'}],
+    }
+
+
+class Counted(CompactModel):
+    """A model counting the conversions of its fields."""
+
+    __slots__ = ()
+    conversions = []
+
+    name = LazyField('name', convert=lambda model, value: Counted.conversions.append(value) or value.upper())
+    group = LazyField('organization', 'subtenantRef')
+    size = LazyField('size', default=0)
+
+
+@pytest.fixture(autouse=True)
+def reset_conversions():
+    del Counted.conversions[:]
+
+
+def test_fields_get_slots():
+    assert Counted._fields == ('name', 'group', 'size')
+    assert set(Counted.__slots__) == {'_name', '_group', '_size'}
+    model = Counted(Session(), resource())
+    with pytest.raises(AttributeError):
+        model.__dict__
+    with pytest.raises(AttributeError):
+        model.unknown = 1
+
+
+def test_fields_are_decoded_once_on_first_read():
+    model = Counted(Session(), resource())
+    assert Counted.conversions == []
+    assert model.name == 'VM-1'
+    assert model.name == 'VM-1'
+    assert Counted.conversions == ['vm-1']
+    assert model.group == 'group-1'
+
+
+def test_missing_keys_read_as_the_default():
+    model = Counted(Session(), {'organization': 'not a dict'})
+    assert model.group is None
+    assert model.size == 0
+    # the default isn't converted
+    assert model.name is None
+    assert Counted.conversions == []
+
+
+def test_fields_can_be_set():
+    model = Counted(Session(), resource())
+    model.size = 10
+    assert model.size == 10
+
+
+def test_keep_raw_false_decodes_every_field_and_drops_the_payload():
+    payload = resource()
+    model = Counted(Session(), payload, keep_raw=False)
+    assert model.raw is None
+    assert Counted.conversions == ['vm-1']
+    payload['name'] = 'changed'
+    assert (model.name, model.group, model.size) == ('VM-1', 'group-1', 0)
+
+
+def test_keep_raw_false_with_fields_keeps_only_those():
+    model = Counted(Session(), resource(), keep_raw=False, fields=('group',))
+    assert model.group == 'group-1'
+    assert model.name is None
+    assert Counted.conversions == []
+
+
+def test_compact_deployment():
+    deployment = CompactDeployment(Session(), resource())
+    assert deployment.raw is deployment.deployment_json
+    assert deployment.resource_id == 'resource-1'
+    assert deployment.business_group_id == 'group-1'
+    assert deployment.lease is None
+    operation, = deployment.operations
+    assert operation['name'] == 'Reboot'
+    assert operation['request_url'] == \
+        'https://%s/catalog-service/api/consumer/resources/resource-1/actions/reboot/requests' % CLOUDURL
+    assert CompactDeployment(Session(), {'id': 'x'}).operations == ()
+    assert repr(deployment) == '<CompactDeployment vm-1>'
+
+
+def test_many():
+    deployments = CompactDeployment.many(Session(), [resource(n) for n in range(3)], keep_raw=False,
+                                         fields=('resource_id',))
+    assert [d.resource_id for d in deployments] == ['resource-0', 'resource-1', 'resource-2']
+    assert all(d.raw is None and d.name is None for d in deployments)
+
+
+def test_models_dont_share_slots():
+    reservation = CompactReservation(Session(), {'id': 'reservation-1', 'name': 'r1'})
+    assert reservation.reservation_id == 'reservation-1'
+    assert not hasattr(CompactReservation, '_resource_id')
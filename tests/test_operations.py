@@ -0,0 +1,108 @@
+import json
+import re
+import threading
+
+import pytest
+
+from vralib.deployment import Deployment, VirtualMachine
+from vralib.operations import OperationExecutor
+from vralib.vraexceptions import NotFoundError
+
+from tests.fakes import FakeSession, response
+
+
+OPERATIONS = [{'name': 'Power Off', 'description': '', 'id': 'power-off'},
+              {'name': 'Reconfigure', 'description': '', 'id': 'reconfigure'}]
+
+
+class Appliance(object):
+    """Answers operation templates and submissions, and completes every request at once."""
+
+    def __init__(self):
+        self.templates = []
+        self.submitted = []
+        self.lock = threading.Lock()
+
+    def __call__(self, method, url, payload):
+        match = re.search(r'/resources/([^/]+)/actions/([^/]+)/requests(/template)?$', url)
+        if match and match.group(3):
+            with self.lock:
+                self.templates.append(match.group(1))
+            return {'type': 'ResourceActionRequest', 'resourceId': match.group(1), 'data': {'cpu': 1}}
+        if match:
+            with self.lock:
+                self.submitted.append(json.loads(payload))
+                request_id = 'request-%d' % len(self.submitted)
+            return response(201, headers={'Location': 'https://vra.local/requests/%s' % request_id})
+        ids = re.findall(r"id eq '([^']+)'", url.replace('%20', ' '))
+        return {'content': [{'id': i, 'state': 'SUCCESSFUL'} for i in ids],
+                'metadata': {'totalElements': len(ids), 'totalPages': 1}}
+
+
+def resource(vra, n, cls=VirtualMachine, operations=OPERATIONS):
+    payload = {'id': 'vm-%d' % n, 'resourceTypeRef': {'id': 'Infrastructure.Virtual'}, 'description': None,
+               'name': 'vm-%d' % n, 'requestId': None, 'dateCreated': None, 'owners': [], 'lease': None,
+               'organization': {'subtenantRef': 'group-1', 'subtenantLabel': 'Group', 'tenantRef': 'tenant'},
+               'operations': operations}
+    return cls(vra, payload, Deployment._get_operations(vra, payload['id'], payload), [])
+
+
+@pytest.fixture
+def appliance():
+    return Appliance()
+
+
+@pytest.fixture
+def vra(appliance):
+    vra = FakeSession(appliance)
+    yield vra
+    vra.close()
+
+
+def test_unknown_operation_fails_only_its_resource(vra, appliance):
+    resources = [resource(vra, 0), resource(vra, 1, operations=OPERATIONS[1:]), resource(vra, 2)]
+    results = OperationExecutor(vra, workers=2).execute(resources, 'Power Off')
+
+    assert [r.index for r in results] == [0, 1, 2]
+    assert isinstance(results[1].error, NotFoundError)
+    assert 'Reconfigure' in str(results[1].error)
+    assert results[1].request_id is None
+    assert sorted(r.request_id for r in (results[0], results[2])) == ['request-1', 'request-2']
+    assert sorted(p['resourceId'] for p in appliance.submitted) == ['vm-0', 'vm-2']
+
+
+def test_require_operation(vra):
+    vm = resource(vra, 0)
+    assert vm.require_operation('Reconfigure')['id'] == 'reconfigure'
+    with pytest.raises(NotFoundError) as e:
+        vm.require_operation('Destroy')
+    assert 'Power Off, Reconfigure' in str(e.value)
+    with pytest.raises(NotFoundError):
+        vm.get_operation_template('Destroy')
+
+
+def test_overrides_and_payload(vra, appliance):
+    resources = [resource(vra, n) for n in range(3)]
+    OperationExecutor(vra).execute(resources, 'Reconfigure',
+                                   overrides=lambda r: {'data': {'cpu': int(r.name[3:])}})
+
+    payloads = sorted(appliance.submitted, key=lambda p: p['resourceId'])
+    assert [p['data'] for p in payloads] == [{'cpu': n} for n in range(3)]
+    assert all(p['actionId'] == 'reconfigure' for p in payloads)
+
+
+def test_templates_are_reused_per_resource_type(vra, appliance):
+    resources = [resource(vra, n) for n in range(5)]
+    results = OperationExecutor(vra, workers=4, reuse_templates=True).execute(resources, 'Power Off')
+
+    assert not any(r.error for r in results)
+    assert len(appliance.templates) == 1
+    # the shared template is sent with the id of each resource
+    assert sorted(p['resourceId'] for p in appliance.submitted) == ['vm-%d' % n for n in range(5)]
+
+
+def test_wait_reports_the_completed_requests(vra):
+    resources = [resource(vra, n) for n in range(3)]
+    vra.waiter.interval = 0.01
+    results = OperationExecutor(vra).execute(resources, 'Power Off', wait=True)
+    assert [r.request['state'] for r in results] == ['SUCCESSFUL'] * 3
@@ -0,0 +1,67 @@
+import datetime
+
+from urllib.parse import unquote
+
+import pytest
+
+from vralib.query import Query, odata_fallback
+
+
+def test_literal_quotes_strings():
+    assert Query.literal('cent') == "'cent'"
+    assert Query.literal("O'Brien") == "'O''Brien'"
+    assert Query.literal("''") == "''''''"
+
+
+def test_literal_other_types():
+    assert Query.literal(None) == 'null'
+    assert Query.literal(True) == 'true'
+    assert Query.literal(False) == 'false'
+    assert Query.literal(42) == '42'
+    assert Query.literal(datetime.date(2019, 5, 1)) == "'2019-05-01'"
+    assert Query.literal(datetime.datetime(2019, 5, 1, 12, 30, 5, 123456)) == "'2019-05-01T12:30:05.123Z'"
+
+
+def test_str_escapes_reserved_characters():
+    query = Query().eq('name', "a&b c+d#e'f").orderby('name', descending=True)
+    rendered = str(query)
+
+    assert rendered == "&$filter=name%20eq%20'a%26b%20c%2Bd%23e''f'&$orderby=name%20desc"
+    # the values can't end the parameter or the query string early
+    assert rendered.count('&') == 2
+    assert '#' not in rendered and '+' not in rendered
+    assert unquote(rendered.split('&$orderby=')[0]) == "&$filter=name eq 'a&b c+d#e''f'"
+
+
+def test_predicates_are_joined_with_and():
+    query = Query().contains('name', 'CenT').ge('dateCreated', datetime.date(2019, 1, 1)).ne('status', None)
+    assert query.filter_expression == ("substringof('cent',tolower(name)) and dateCreated ge '2019-01-01' "
+                                       "and status ne null")
+
+
+def test_any_of():
+    assert Query().any_of('id', ['a']).filter_expression == "id eq 'a'"
+    assert Query().any_of('id', ['a', "b'c"]).filter_expression == "(id eq 'a' or id eq 'b''c')"
+    with pytest.raises(ValueError):
+        Query().any_of('id', [])
+
+
+def test_empty_query():
+    assert str(Query()) == ''
+    assert not Query()
+    assert Query().orderby('name')
+
+
+def test_odata_fallback_remembers_unsupported_endpoints():
+    unsupported = set()
+
+    assert odata_fallback(unsupported, 'u', 500) is True
+    assert unsupported == set()
+
+    assert odata_fallback(unsupported, 'u', 404) is False
+    assert odata_fallback(unsupported, 'u', None) is False
+    assert unsupported == set()
+
+    assert odata_fallback(unsupported, 'u', 400) is True
+    assert odata_fallback(unsupported, 'v', 501) is True
+    assert unsupported == {'u', 'v'}
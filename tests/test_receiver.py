@@ -0,0 +1,136 @@
+import threading
+
+import pytest
+import requests
+
+from vralib.receiver import EventReceiver
+
+
+def event(n, topic='com.vmware.csp.iaas.blueprint.service.machine.lifecycle.provision'):
+    return {'id': 'event-%d' % n, 'eventTopicId': topic, 'data': {'n': n}}
+
+
+@pytest.fixture
+def start():
+    receivers = []
+
+    def start(**kwargs):
+        receiver = EventReceiver(port=0, **kwargs).start()
+        receivers.append(receiver)
+        return receiver, 'http://127.0.0.1:%d/' % receiver.address[1]
+
+    yield start
+    for receiver in receivers:
+        receiver.shutdown()
+
+
+def test_handlers_by_topic(start):
+    receiver, url = start()
+    by_topic, every = [], []
+    receiver.add_handler(by_topic.append, topic='topic.a')
+    receiver.add_handler(every.append)
+
+    payload = {'content': [event(1, 'topic.a'), event(2, 'topic.b'), {'id': 'no topic'}], 'metadata': {}}
+    assert requests.post(url, json=payload).status_code == 200
+    assert [e['id'] for e in by_topic] == ['event-1']
+    assert sorted(e['id'] for e in every) == ['event-1', 'event-2', 'no topic']
+    assert receiver.stats == {'received': 3, 'handled': 3, 'failed': 0, 'rejected': 0}
+    assert requests.get(url).status_code == 200
+
+
+def test_batch_larger_than_the_pool(start):
+    receiver, url = start(workers=2, queue_size=3)
+    handled = []
+    receiver.add_handler(lambda e: handled.append(e['id']))
+
+    assert requests.post(url, json=[event(n) for n in range(200)]).status_code == 200
+    assert sorted(handled) == sorted('event-%d' % n for n in range(200))
+
+
+def test_secret(start):
+    receiver, url = start(secret='s3cret')
+    assert requests.post(url, json=event(1)).status_code == 401
+    assert requests.post(url, json=event(1), headers={'X-Receiver-Secret': 'wrong'}).status_code == 401
+    assert requests.post(url, json=event(1), headers={'X-Receiver-Secret': 's3cret'}).status_code == 200
+
+
+def test_body_too_large(start):
+    receiver, url = start(max_body=100)
+    assert requests.post(url, json=[event(n) for n in range(10)]).status_code == 413
+    assert receiver.stats['received'] == 0
+
+
+@pytest.mark.parametrize('body', [b'not json', b'["a"]', b'[1, {"id": 1}]', b'"event"', b'null'])
+def test_bad_payloads(start, body):
+    receiver, url = start()
+    assert requests.post(url, data=body).status_code == 400
+    assert receiver.stats['received'] == 0
+
+
+def test_bad_content_length(start):
+    import socket
+
+    receiver, url = start()
+    connection = socket.create_connection(receiver.address)
+    try:
+        connection.sendall(b'POST / HTTP/1.1\r\nHost: x\r\nContent-Length: abc\r\n\r\n')
+        assert connection.recv(100).split(b'\r\n')[0].endswith(b'400 Bad Request')
+    finally:
+        connection.close()
+
+
+def test_full_pool_is_answered_503(start):
+    receiver, url = start(workers=1, queue_size=0, retry_after=7)
+    release = threading.Event()
+    running = threading.Event()
+
+    def block(e):
+        running.set()
+        release.wait(5)
+
+    receiver.add_handler(block)
+    first = threading.Thread(target=requests.post, args=(url,), kwargs={'json': event(1)})
+    first.start()
+    try:
+        assert running.wait(5)
+        response = requests.post(url, json=event(2))
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '7'
+    finally:
+        release.set()
+        first.join()
+    assert receiver.stats['rejected'] == 1
+    assert requests.post(url, json=event(3)).status_code == 200
+
+
+def test_handler_failure_is_answered_500(start):
+    receiver, url = start()
+
+    def fail(e):
+        if e['data']['n'] == 2:
+            raise RuntimeError('handler failed')
+
+    receiver.add_handler(fail)
+    assert requests.post(url, json=[event(1), event(2), event(3)]).status_code == 500
+    assert receiver.stats['handled'] == 2
+    assert receiver.stats['failed'] == 1
+
+
+def test_handler_timeout_is_answered_500(start):
+    receiver, url = start(ack_timeout=0.2)
+    release = threading.Event()
+    receiver.add_handler(lambda e: release.wait(5))
+    try:
+        assert requests.post(url, json=event(1)).status_code == 500
+    finally:
+        release.set()
+
+
+def test_shutdown_stops_serve_forever():
+    receiver = EventReceiver(port=0)
+    thread = threading.Thread(target=receiver.serve_forever)
+    thread.start()
+    assert requests.get('http://127.0.0.1:%d/' % receiver.address[1]).status_code == 200
+    receiver.shutdown()
+    thread.join(5)
+    assert not thread.is_alive()
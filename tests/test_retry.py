@@ -0,0 +1,64 @@
+import random
+import time
+
+from vralib.retry import RateLimiter, RetryPolicy
+
+
+def test_delay_stays_within_the_backoff_window():
+    policy = RetryPolicy(backoff=0.5, max_backoff=4)
+    random.seed(1)
+    for attempt in range(10):
+        ceiling = min(4, 0.5 * 2 ** attempt)
+        delays = [policy.delay(attempt) for _ in range(200)]
+        assert all(0 <= d <= ceiling for d in delays)
+        # full jitter: the delays spread over the window
+        assert max(delays) > ceiling / 2
+
+
+def test_delay_endpoints(monkeypatch):
+    policy = RetryPolicy(backoff=0.5, max_backoff=4)
+    monkeypatch.setattr(random, 'uniform', lambda low, high: high)
+    assert [policy.delay(attempt) for attempt in range(6)] == [0.5, 1, 2, 4, 4, 4]
+    monkeypatch.setattr(random, 'uniform', lambda low, high: low)
+    assert policy.delay(5) == 0
+
+
+def test_retry_after_is_a_capped_minimum(monkeypatch):
+    policy = RetryPolicy(backoff=0.5, max_backoff=4)
+    monkeypatch.setattr(random, 'uniform', lambda low, high: low)
+    assert policy.delay(0, '2') == 2
+    assert policy.delay(0, '3600') == 4
+    assert policy.delay(0, 'Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert policy.delay(0, None) == 0
+
+
+def test_should_retry():
+    policy = RetryPolicy(retries=2)
+    assert policy.should_retry('GET', 0)
+    assert policy.should_retry('GET', 1, 503)
+    assert not policy.should_retry('GET', 2, 503)
+    assert not policy.should_retry('GET', 0, 500)
+    assert not policy.should_retry('POST', 0, 503)
+    assert policy.should_retry('POST', 0, 503, safe=True)
+
+
+def test_rate_limiter_rate_bounds():
+    limiter = RateLimiter(rate=8, min_rate=1, max_rate=10, decrease=0.5, increase=1)
+    for _ in range(10):
+        limiter.backoff()
+    assert limiter.rate == 1
+    for _ in range(20):
+        limiter.success()
+    assert limiter.rate == 10
+
+
+def test_rate_limiter_burst_then_throttle():
+    limiter = RateLimiter(rate=50, burst=5)
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    assert time.monotonic() - start < 0.05
+    for _ in range(5):
+        limiter.acquire()
+    # the 5 requests after the burst wait for tokens refilled at 50 per second
+    assert time.monotonic() - start >= 0.08
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from vralib.streaming import PageParser
+
+
+PAGE = {
+    'links': [{'rel': 'next', 'href': 'https://vra/resources?page=2'}],
+    'content': [
+        {'id': 'a', 'name': 'café ☃ \U0001f600', 'count': 12345, 'ratio': -1.5e-3, 'tags': []},
+        {'id': 'b', 'name': 'braces {"]}[ and \\"quotes\\"', 'nested': {'list': [1, [2, {}]], 'ok': True}},
+        {'id': 'c', 'value': None, 'flag': False},
+        7,
+        'text',
+    ],
+    'metadata': {'size': 5, 'totalElements': 5, 'totalPages': 1, 'number': 1, 'offset': 0},
+}
+
+
+def chunked(data, size):
+    return [data[n:n + size] for n in range(0, len(data), size)]
+
+
+def parse(chunks):
+    parser = PageParser(chunks)
+    return list(parser), parser.page
+
+
+@pytest.mark.parametrize('separators', [(',', ':'), (', ', ': ')])
+def test_every_split_point(separators):
+    data = json.dumps(PAGE, ensure_ascii=False, separators=separators).encode('utf-8')
+    for split in range(1, len(data)):
+        items, page = parse([data[:split], data[split:]])
+        assert items == PAGE['content'], split
+        assert page == {'links': PAGE['links'], 'metadata': PAGE['metadata']}, split
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 4096])
+def test_small_chunks(size):
+    data = json.dumps(PAGE, indent=2, ensure_ascii=False).encode('utf-8')
+    items, page = parse(chunked(data, size))
+    assert items == PAGE['content']
+    assert page['metadata'] == PAGE['metadata']
+
+
+def test_numbers_cut_at_the_end_of_a_chunk():
+    items, _ = parse([b'{"content": [12', b'345, 1.', b'5e', b'3, tr', b'ue]}'])
+    assert items == [12345, 1500.0, True]
+
+
+def test_empty_content_and_chunks():
+    items, page = parse([b'', b'{"content":[],', b'', b'"metadata":{"totalElements":0}}', b''])
+    assert items == []
+    assert page == {'metadata': {'totalElements': 0}}
+
+
+def test_items_are_yielded_before_the_page_ends():
+    def chunks():
+        yield b'{"content": [{"id": 1}, '
+        yield b'{"id": 2}'
+        raise AssertionError('read past the items that were asked for')
+
+    parser = iter(PageParser(chunks()))
+    assert next(parser) == {'id': 1}
+
+
+def test_truncated_page():
+    with pytest.raises(ValueError):
+        parse([b'{"content": [{"id": 1}, {"id"'])
+
+
+def test_not_a_page():
+    with pytest.raises(ValueError):
+        parse([b'[1, 2]'])
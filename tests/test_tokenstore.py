@@ -0,0 +1,119 @@
+import json
+import multiprocessing
+import os
+import time
+
+import pytest
+import requests
+
+import vralib
+from vralib import tokenstore
+from vralib.tokenstore import TokenStore, parse_expires
+
+from tests.fakes import CLOUDURL, TENANT, response, url
+
+
+USER = 'user@corp.local'
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TokenStore(str(tmp_path / 'vralib' / 'tokens.json'))
+
+
+def expires_in(seconds):
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(time.time() + seconds))
+
+
+def test_parse_expires():
+    assert parse_expires('2019-05-01T12:00:00.000Z') == 1556712000
+    assert parse_expires('2019-05-01T12:00:00Z') == 1556712000
+    assert parse_expires('tomorrow') is None
+    assert parse_expires(None) is None
+
+
+def test_tokens_expire_with_a_margin(store):
+    store.set(CLOUDURL, TENANT, USER, 'fresh', expires_in(3600))
+    assert store.get(CLOUDURL, TENANT, USER) == 'fresh'
+
+    store.set(CLOUDURL, TENANT, USER, 'expiring', expires_in(30))
+    assert store.get(CLOUDURL, TENANT, USER) is None
+    assert TokenStore(store.path, margin=0).get(CLOUDURL, TENANT, USER) == 'expiring'
+
+    # a token without a known expiry is used until the server rejects it
+    store.set(CLOUDURL, TENANT, USER, 'unknown')
+    assert store.get(CLOUDURL, TENANT, USER) == 'unknown'
+
+
+def test_tokens_are_kept_per_user_and_deleted(store):
+    store.set(CLOUDURL, TENANT, USER, 'a')
+    store.set(CLOUDURL, 'other', USER, 'b')
+    store.delete(CLOUDURL, TENANT, USER)
+    assert store.get(CLOUDURL, TENANT, USER) is None
+    assert store.get(CLOUDURL, 'other', USER) == 'b'
+
+
+def test_file_is_private(store):
+    store.set(CLOUDURL, TENANT, USER, 'a')
+    assert os.stat(store.path).st_mode & 0o777 == 0o600
+    assert os.stat(os.path.dirname(store.path)).st_mode & 0o777 == 0o700
+    with open(store.path) as f:
+        assert json.load(f)[TokenStore.key(CLOUDURL, TENANT, USER)]['id'] == 'a'
+
+
+def store_tokens(path, worker, count):
+    store = TokenStore(path)
+    for n in range(count):
+        store.set(CLOUDURL, TENANT, 'user-%d-%d' % (worker, n), 'token')
+
+
+@pytest.mark.skipif(tokenstore.fcntl is None, reason='the file is only locked where fcntl is available')
+def test_processes_dont_lose_each_others_tokens(store):
+    processes = [multiprocessing.Process(target=store_tokens, args=(store.path, worker, 20)) for worker in range(6)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    with open(store.path) as f:
+        assert len(json.load(f)) == 120
+
+
+def test_rejected_token_is_replaced_and_the_request_retried(store, monkeypatch):
+    issued = []
+
+    def get_token(http, username, password, cloudurl, tenant, ssl_verify):
+        issued.append(password)
+        return {'id': 'token-%d' % len(issued), 'expires': expires_in(3600)}
+
+    sent = []
+
+    def send(self, request_method, request_url, payload=None, stream=False):
+        sent.append(self.headers['Authorization'])
+        if self.headers['Authorization'] == 'Bearer stale':
+            return response(401)
+        return response(200, {'id': 'r1'})
+
+    monkeypatch.setattr(vralib.Session, '_get_token', staticmethod(get_token))
+    monkeypatch.setattr(vralib.Session, '_send', send)
+    store.set(CLOUDURL, TENANT, USER, 'stale', expires_in(3600))
+
+    vra = vralib.Session.login(USER, lambda: 'secret', CLOUDURL, TENANT, token_store=store)
+    # the stored token is used without logging in
+    assert not issued and vra.token == 'Bearer stale'
+
+    assert vra._request(url('/catalog-service/api/consumer/requests/r1')) == {'id': 'r1'}
+    assert sent == ['Bearer stale', 'Bearer token-1']
+    assert issued == ['secret']
+    assert store.get(CLOUDURL, TENANT, USER) == 'token-1'
+
+
+def test_rejected_token_without_relogin(store, monkeypatch):
+    monkeypatch.setattr(vralib.Session, '_send', lambda self, *args, **kwargs: response(401))
+    store.set(CLOUDURL, TENANT, USER, 'stale')
+
+    vra = vralib.Session.login(USER, 'secret', CLOUDURL, TENANT, token_store=store, relogin=False)
+    with pytest.raises(requests.exceptions.HTTPError) as e:
+        vra._request(url('/catalog-service/api/consumer/requests/r1'))
+    assert e.value.response.status_code == 401
@@ -0,0 +1,153 @@
+import re
+import threading
+
+from concurrent.futures import Future
+from urllib.parse import unquote
+
+import pytest
+
+from vralib.vraexceptions import NotFoundError
+from vralib.waiter import RequestWaiter
+
+from tests.fakes import FakeSession, response
+
+
+REQUESTS = '/catalog-service/api/consumer/requests'
+
+
+class Requests(object):
+    """The catalog requests of a fake server, advanced one state per poll."""
+
+    def __init__(self, odata=True):
+        self.states = {}
+        self.odata = odata
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def add(self, request_id, *states):
+        self.states[request_id] = list(states)
+
+    def request(self, request_id):
+        with self.lock:
+            states = self.states[request_id]
+            state = states.pop(0) if len(states) > 1 else states[0]
+        return {'id': request_id, 'state': state}
+
+    def __call__(self, method, url, payload):
+        path, _, query = unquote(url).partition('?')
+        if path.endswith(REQUESTS):
+            if not self.odata:
+                return response(400)
+            ids = re.findall(r"id eq '([^']+)'", query)
+            self.queries.append(ids)
+            return {'content': [self.request(i) for i in ids if i in self.states]}
+        request_id = path.rsplit('/', 1)[-1]
+        if request_id not in self.states:
+            return response(404)
+        self.queries.append([request_id])
+        return self.request(request_id)
+
+
+def pending(waiter, *request_ids):
+    # poll() is called by the test instead of the background thread
+    for request_id in request_ids:
+        waiter._pending[request_id] = Future()
+    return [waiter._pending[i] for i in request_ids]
+
+
+def test_requests_are_fetched_in_batches():
+    server = Requests()
+    ids = ['r%d' % n for n in range(100)]
+    for request_id in ids:
+        server.add(request_id, 'IN_PROGRESS')
+    waiter = RequestWaiter(FakeSession(server), batch_size=40)
+
+    found = waiter._fetch(ids)
+    assert sorted(found) == sorted(ids)
+    assert [len(q) for q in server.queries] == [40, 40, 20]
+
+
+def test_fetch_falls_back_to_one_get_per_request():
+    server = Requests(odata=False)
+    server.add('r1', 'IN_PROGRESS')
+    vra = FakeSession(server)
+    waiter = RequestWaiter(vra)
+
+    found = waiter._fetch(['r1', 'missing'])
+    assert found['r1']['state'] == 'IN_PROGRESS'
+    assert isinstance(found['missing'], NotFoundError)
+    # the fallback is remembered, so the next poll doesn't try the filter again
+    sent = len(vra.sent)
+    waiter._fetch(['r1'])
+    assert len(vra.sent) == sent + 1
+
+
+def test_interval_slows_down_while_nothing_changes():
+    server = Requests()
+    server.add('r1', 'SUBMITTED', 'SUBMITTED', 'SUBMITTED', 'IN_PROGRESS', 'IN_PROGRESS')
+    waiter = RequestWaiter(FakeSession(server), interval=2, max_interval=5, backoff=2)
+    pending(waiter, 'r1')
+
+    intervals = []
+    for _ in range(5):
+        waiter.poll()
+        intervals.append(waiter._current_interval)
+    # the first poll sees a new state, then nothing changes until IN_PROGRESS
+    assert intervals == [2, 4, 5, 2, 4]
+
+
+def test_completed_requests_are_resolved_and_dropped():
+    server = Requests()
+    server.add('r1', 'IN_PROGRESS', 'SUCCESSFUL')
+    server.add('r2', 'IN_PROGRESS', 'IN_PROGRESS', 'FAILED')
+    server.add('r3', 'IN_PROGRESS')
+    waiter = RequestWaiter(FakeSession(server))
+    r1, r2, r3 = pending(waiter, 'r1', 'r2', 'r3')
+
+    assert waiter.poll() == 0
+    assert waiter.poll() == 1
+    assert r1.result()['state'] == 'SUCCESSFUL'
+    assert waiter.poll() == 1
+    assert r2.result()['state'] == 'FAILED'
+    waiter.poll()
+    assert server.queries[-1] == ['r3']
+    assert not r3.done()
+    assert list(waiter._pending) == ['r3']
+
+
+def test_missing_request_fails_its_future():
+    server = Requests(odata=False)
+    waiter = RequestWaiter(FakeSession(server))
+    future, = pending(waiter, 'missing')
+    waiter.poll()
+    with pytest.raises(NotFoundError):
+        future.result()
+    assert not waiter._pending
+
+
+def test_watch_resolves_futures_and_calls_callbacks():
+    server = Requests()
+    server.add('r1', 'SUBMITTED', 'IN_PROGRESS', 'SUCCESSFUL')
+    waiter = RequestWaiter(FakeSession(server), interval=0.01)
+
+    called = threading.Event()
+    future = waiter.watch('r1', callback=lambda f: called.set())
+    # watching a request twice shares its future
+    assert waiter.watch('r1') is future
+    assert future.result(timeout=5)['state'] == 'SUCCESSFUL'
+    assert called.wait(5)
+
+
+def test_wait_returns_the_completed_requests():
+    server = Requests()
+    server.add('r1', 'IN_PROGRESS', 'SUCCESSFUL')
+    server.add('r2', 'IN_PROGRESS', 'FAILED')
+    server.add('r3', 'IN_PROGRESS')
+    waiter = RequestWaiter(FakeSession(server), interval=0.01, max_interval=0.01)
+
+    completed = waiter.wait(['r1', 'r2', 'r3', 'r1'], timeout=0.5)
+    assert sorted(completed) == ['r1', 'r2']
+    assert completed['r2']['state'] == 'FAILED'
+    # r3 timed out and nobody else watches it, so it isn't polled anymore
+    assert not waiter._pending
+    waiter.stop()
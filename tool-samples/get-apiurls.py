@@ -9,7 +9,6 @@
 import argparse
 import getpass
 import json
-import six
 
 import vralib
 
@@ -44,7 +43,7 @@ def main():
     catalog_id = args.id
 
     if not username:
-        username = six.moves.input('vRA Username (user@domain): ')
+        username = input('vRA Username (user@domain): ')
 
     password = getpass.getpass('vRA Password: ')
 
@@ -6,15 +6,11 @@
 
 """
 
-# TODO set an environment variable that stores the auth token
-# TODO create a check for auth token env variable. If present don't prompt for password
-
 __version__ = "$Revision$"
 # $Source$
 
 import getpass
 import argparse
-import six
 
 import vralib
 from prettytable import PrettyTable
@@ -51,11 +47,11 @@ def main():
     name = args.name
 
     if not username:
-        username = six.moves.input('vRA Username (user@domain): ')
-
-    password = getpass.getpass('vRA Password: ')
+        username = input('vRA Username (user@domain): ')
 
-    vra = vralib.Session.login(username, password, cloudurl, tenant, ssl_verify=False)
+    # the password is only prompted for if no token is stored for this user, see setup_api_env.py
+    vra = vralib.Session.login(username, lambda: getpass.getpass('vRA Password: '), cloudurl, tenant,
+                               ssl_verify=False, token_store=vralib.TokenStore())
 
     items = vra.get_consumer_resources()
 
@@ -16,7 +16,6 @@ __version__ = "$Revision$"
 import argparse
 import csv
 import getpass
-import six
 
 import vralib
 
@@ -56,7 +55,7 @@ def main():
 
 
     if not username:
-        username = six.moves.input('vRA Username (user@domain): ')
+        username = input('vRA Username (user@domain): ')
 
     password = getpass.getpass('vRA Password: ')
 
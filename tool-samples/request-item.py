@@ -11,12 +11,11 @@ __version__ = "$Revision"
 import argparse
 import getpass
 import json
-import six
-import time
 
 import vralib
 
 from pprint import pprint
+from vralib.provisioning import patch_dict
 from vralib.vraexceptions import NotFoundError
 
 
@@ -59,30 +58,16 @@ def getargs():
     return args
 
 
-def patch_dict(d, p):
-    """Patches the dict `d`.
-
-    Patches the dict `d` with values from the "patcher" dict `p`.
-    """
-    for k in p:
-        if k in d.keys():
-            if type(d[k]) == dict:
-                d[k] = patch_dict(d[k], p[k])
-            else:
-                d[k] = p[k]
-    return d
-
-
 def main():
     args = getargs()
     cloudurl = args.server
     username = args.username
     tenant = args.tenant
     if not username:
-        username = six.moves.input('vRA Username (user@domain): ')
-    password = getpass.getpass('vRA Password: ')
-    vra = vralib.Session.login(username, password, cloudurl,
-                               tenant, ssl_verify=False)
+        username = input('vRA Username (user@domain): ')
+    # the password is only prompted for if no token is stored for this user, see setup_api_env.py
+    vra = vralib.Session.login(username, lambda: getpass.getpass('vRA Password: '), cloudurl, tenant,
+                               ssl_verify=False, token_store=vralib.TokenStore())
 
     if args.businessgroup:
         business_groups = vra.get_businessgroup_byname(args.businessgroup)
@@ -133,19 +118,17 @@ def main():
     build_vm = vra.request_item(catalogitem=catalog_item_id,
                                 payload=request_template)
 
-    while True:
-        vra_request = vra.get_request(request_id=build_vm['id'])
-        print('Current provisioning state is:', vra_request['stateName'],
-              'Current phase is:', vra_request['phase'])
-        if vra_request['state'] == 'PROVIDER_FAILED':
-            raise Exception('Request provider failed! Dumping JSON output of request',
-                            pprint(vra_request, indent=4))
-        elif vra_request['state'] == 'FAILED':
-            raise Exception('Failed inside of vRA! Dumping JSON output of request',
-                            pprint(vra_request, indent=4))
-        elif vra_request['state'] == 'SUCCESSFUL':
-            break
-        time.sleep(5)
+    # the waiter polls the request in the background and slows down while its state doesn't change
+    print('Waiting for request', build_vm['id'])
+    vra_request = vra.waiter.watch(build_vm['id']).result()
+    print('Final provisioning state is:', vra_request['stateName'],
+          'Final phase is:', vra_request['phase'])
+    if vra_request['state'] == 'PROVIDER_FAILED':
+        raise Exception('Request provider failed! Dumping JSON output of request',
+                        pprint(vra_request, indent=4))
+    elif vra_request['state'] != 'SUCCESSFUL':
+        raise Exception('Failed inside of vRA! Dumping JSON output of request',
+                        pprint(vra_request, indent=4))
 
     print('#' * 80)
     pprint(vra_request, indent=4)
@@ -6,8 +6,22 @@
 """
 
 
-from . import classes, deployment, reservation
+from . import classes, deployment, reservation, tokenstore
+from .asyncsession import AsyncSession
+from .cache import ResponseCache
+from .catalog import CatalogIndex
 from .classes import Session
-from .deployment import Deployment, VirtualMachine
+from .deployment import Deployment, DeploymentLoader, VirtualMachine
+from .events import EventTail
+from .inventory import Inventory
+from .metrics import MetricsRegistry
+from .models import CompactDeployment, CompactReservation
+from .operations import OperationExecutor
+from .provisioning import BulkProvisioner
+from .query import Query
+from .receiver import EventReceiver
 from .reservation import Reservation
+from .retry import RateLimiter, RetryPolicy
+from .tokenstore import TokenStore
+from .waiter import RequestWaiter
 from .vraexceptions import InvalidToken, NotFoundError
@@ -0,0 +1,539 @@
+"""
+
+    An asyncio version of vralib.Session built on aiohttp.
+
+"""
+
+import asyncio
+import json
+
+import requests
+
+from vralib.classes import Session
+from vralib.codec import get_codec
+from vralib.deployment import Deployment, RESOURCE_CLASSES
+from vralib.query import Query, odata_fallback
+from vralib.retry import RetryPolicy
+from vralib.vraexceptions import InvalidToken
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+DEFAULT_MAX_CONCURRENCY = 100
+
+
+class AsyncSession(object):
+    """
+    Used to store a vRA login session to a specific tenant for asyncio applications.
+    The class should be invoked via cls.login() from a coroutine.
+
+    The methods mirror the ones of vralib.Session but are coroutines. Pagination is native:
+    once the first page is known the remaining pages are requested at the same time, and
+    every request of the session shares one connection pool and one semaphore, so the number
+    of calls in flight never exceeds max_concurrency. Transient errors are retried, and a rejected
+    token is replaced once, like in vralib.Session.
+
+    Basic usage:
+
+    async def main():
+        async with await vralib.AsyncSession.login(username, password, cloudurl, tenant) as vra:
+            resources = await vra.get_consumer_resources()
+            deployments = await asyncio.gather(*[vra.deployment_fromid(r['id']) for r in resources])
+
+    This class requires aiohttp.
+    """
+
+    def __init__(self, username, cloudurl, tenant, auth_header, ssl_verify,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, page_size=None, http=None, codec=None, retry=True):
+        """Initialization of the AsyncSession class.
+
+        :param username: The username is stored here so it can be passed easily into other methods in other classes.
+        :param cloudurl: Stores the FQDN of the vRealize Automation server
+        :param tenant: Stores the tenant to log into.
+        :param auth_header: Stores the actual Bearer token to be used in subsequent requests.
+        :param ssl_verify: Enable or disable SSL verification.
+        :param max_concurrency: The maximum number of requests in flight, which is also the size of the connection pool.
+        :param page_size: The default number of items requested per page, see vralib.Session.
+        :param http: An optional aiohttp.ClientSession to reuse, e.g. the one used during login.
+        :param codec: The JSON codec of request and response bodies, see vralib.Session.
+        :param retry: A vralib.RetryPolicy for transient errors. True uses the default policy, False disables retries.
+
+        :return:
+        """
+
+        if aiohttp is None:
+            raise ImportError('AsyncSession requires aiohttp. Install it with: pip install aiohttp')
+
+        self.username = username
+        self.cloudurl = cloudurl
+        self.tenant = tenant
+        self.token = auth_header
+        self.headers = {'Content-type': 'Application/json',
+                        'Accept': 'Application/json',
+                        'Authorization': self.token}
+        self.ssl_verify = ssl_verify
+        self.max_concurrency = max_concurrency
+        self.page_size = page_size
+        self._http = http
+        self.codec = get_codec(codec)
+        self.retry = RetryPolicy() if retry is True else retry or None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._authenticate = None
+        self._auth_lock = asyncio.Lock()
+        self._odata_unsupported = set()
+
+    @staticmethod
+    def _new_http(max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=max_concurrency))
+
+    def _get_http(self):
+        if self._http is None or self._http.closed:
+            self._http = self._new_http(self.max_concurrency)
+        return self._http
+
+    async def close(self):
+        """Closes all of the pooled connections held by this session."""
+        if self._http is not None:
+            await self._http.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @classmethod
+    async def login(cls, username, password, cloudurl, tenant=None, ssl_verify=True,
+                    max_concurrency=DEFAULT_MAX_CONCURRENCY, relogin=True, **kwargs):
+        """
+        Async version of vralib.Session.login().
+
+        Basic usage:
+
+        vra = await vralib.AsyncSession.login(username, password, cloudurl, tenant, ssl_verify=False)
+
+        :param username: A username@domain with sufficient rights to use the API
+        :param password: The password of the user
+        :param cloudurl: The vRealize automation server. Should be the FQDN.
+        :param tenant: the tenant ID to be logged into. If left empty it will default to vsphere.local
+        :param ssl_verify: Enable or disable SSL verification.
+        :param max_concurrency: The maximum number of requests in flight.
+        :param relogin: If True, the session logs in again and retries once when the server rejects its token.
+                        This keeps the password in memory for the lifetime of the session.
+        :param kwargs: Any other keyword arguments of AsyncSession.__init__(), e.g. page_size.
+
+        :return: Returns a class that includes all of the login session data (token, tenant and SSL verification)
+        """
+
+        if aiohttp is None:
+            raise ImportError('AsyncSession requires aiohttp. Install it with: pip install aiohttp')
+
+        if not tenant:
+            tenant = 'vsphere.local'
+
+        async def authenticate(http):
+            vratoken = await cls._get_token(http, username, password, cloudurl, tenant, ssl_verify)
+            return 'Bearer %s' % vratoken['id']
+
+        http = cls._new_http(max_concurrency)
+        try:
+            auth_header = await authenticate(http)
+        except Exception:
+            await http.close()
+            raise
+
+        session = cls(username, cloudurl, tenant, auth_header, ssl_verify,
+                      max_concurrency=max_concurrency, http=http, **kwargs)
+        if relogin:
+            session._authenticate = authenticate
+        return session
+
+    @staticmethod
+    async def _get_token(http, username, password, cloudurl, tenant, ssl_verify):
+        """Async version of vralib.Session._get_token()."""
+
+        try:
+            async with http.post('https://%s/identity/api/tokens' % cloudurl,
+                                 headers={'Content-type': 'Application/json',
+                                          'Accept': 'Application/json'},
+                                 ssl=None if ssl_verify else False,
+                                 data=json.dumps({
+                                     "tenant": tenant,
+                                     "username": username,
+                                     "password": password
+                                 })) as r:
+                vratoken = json.loads(await r.read())
+
+        except aiohttp.ClientConnectionError:
+            raise requests.exceptions.ConnectionError(
+                'Unable to connect to server %s.' % cloudurl)
+
+        if 'id' in vratoken.keys():
+            return vratoken
+
+        raise InvalidToken('No bearer token found in response. Response was:',
+                           json.dumps(vratoken))
+
+    async def relogin(self, rejected=None):
+        """
+        Async version of vralib.Session.relogin().
+
+        :param rejected: The token that was rejected. If another task already replaced it, nothing is done.
+
+        :return:
+        """
+
+        if self._authenticate is None:
+            raise InvalidToken('The token was rejected and the session can not log in again. Token was:',
+                               self.token)
+
+        async with self._auth_lock:
+            if rejected is not None and rejected != self.token:
+                return
+            self.token = await self._authenticate(self._get_http())
+            self.headers['Authorization'] = self.token
+
+    async def _request(self, url, request_method='GET', payload=None, content_only=True, retry_safe=False,
+                       **kwargs):
+        """
+        Async version of vralib.Session._request().
+
+        :param url: The complete URL for the requested resource
+        :param request_method: An HTTP method that is either GET, PUT, POST or DELETE
+        :param payload: Used to store a resource that is used in either POST or PUT operations
+        :param content_only: if True, returns the json-encoded content of a response, if any.
+        :param retry_safe: if True, a POST or PUT may be retried like a GET.
+        :param kwargs: Unused currently
+
+        :return: if content_only is set to True, the json-encoded content of a response,
+                 otherwise an aiohttp response whose body has already been read
+        """
+
+        if request_method not in ('GET', 'POST', 'PUT', 'DELETE'):
+            raise Exception('Method %s is not implemented.' % request_method)
+
+        if type(payload) == dict:
+            payload = self.codec.dumps(payload)
+
+        token = self.token
+        relogged = False
+        attempt = 0
+
+        while True:
+            try:
+                async with self._semaphore:
+                    async with self._get_http().request(request_method, url,
+                                                        headers=self.headers,
+                                                        ssl=None if self.ssl_verify else False,
+                                                        data=payload) as r:
+                        content = await r.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if self.retry is None or not self.retry.should_retry(request_method, attempt, safe=retry_safe):
+                    raise
+                retry_after = None
+            else:
+                if r.status == 401 and self._authenticate is not None and not relogged:
+                    await self.relogin(rejected=token)
+                    relogged = True
+                    continue
+
+                if r.status < 400 or self.retry is None or \
+                        not self.retry.should_retry(request_method, attempt, r.status, retry_safe):
+                    break
+                retry_after = r.headers.get('Retry-After')
+
+            # the semaphore is released while waiting, so other requests keep going
+            await asyncio.sleep(self.retry.delay(attempt, retry_after))
+            attempt += 1
+
+        if r.status >= 400:
+            raise requests.exceptions.HTTPError(
+                'HTTP error. Status code was:', r.status, content, response=self._response(r, content))
+
+        if content_only == True:
+            return self.codec.loads(content or b'null')
+
+        return r
+
+    @staticmethod
+    def _response(r, content):
+        """Copies an aiohttp response into a requests.Response, so that errors carry the same response as in Session.
+
+        :param r: An aiohttp response
+        :param content: Its body, already read
+
+        :return: A requests.Response
+        """
+
+        response = requests.Response()
+        response.status_code = r.status
+        response.reason = r.reason
+        response.url = str(r.url)
+        response.headers.update(r.headers)
+        response._content = content
+        return response
+
+    _limit_query = Session._limit_query
+
+    async def _iterate_pages(self, url, query='', page_size=None, probe=False):
+        """
+        Async version of vralib.Session._iterate_pages().
+
+        All of the pages after the first one are requested at once; the session semaphore
+        bounds how many of them are actually in flight.
+
+        :return: a list of requested items from the `content` of the response.
+        """
+
+        query = self._limit_query(page_size, probe) + query
+
+        page = await self._request('%s?page=1%s' % (url, query))
+        pages = [page['content']]
+        total_pages = page['metadata']['totalPages']
+
+        if page['metadata']['totalElements'] != 0 and total_pages > 1:
+            rest = await asyncio.gather(*[self._request('%s?page=%s%s' % (url, n, query))
+                                          for n in range(2, total_pages + 1)])
+            pages.extend(p['content'] for p in rest)
+
+        return list(Session._unique(item for content in pages for item in content))
+
+    async def _iter_pages(self, url, query='', prefetch=False, page_size=None, probe=False):
+        """
+        Async generator version of _iterate_pages(). Items are yielded as each page arrives.
+
+        :param prefetch: If True, the next page is requested while the items of the current page are consumed.
+
+        :return: an async generator of requested items from the `content` of the response.
+        """
+
+        query = self._limit_query(page_size, probe) + query
+        seen = set()
+        next_page = None
+
+        try:
+            n = 1
+            page = await self._request('%s?page=%s%s' % (url, n, query))
+            while True:
+                last = n >= page['metadata']['totalPages'] or page['metadata']['totalElements'] == 0
+                if not last and prefetch:
+                    next_page = asyncio.ensure_future(self._request('%s?page=%s%s' % (url, n + 1, query)))
+
+                for item in Session._unique(page['content'], seen):
+                    yield item
+
+                if last:
+                    break
+                n += 1
+                if prefetch:
+                    page = await next_page
+                    next_page = None
+                else:
+                    page = await self._request('%s?page=%s%s' % (url, n, query))
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    async def _find(self, url, query, match, page_size=None):
+        """Async version of vralib.Session._find()."""
+
+        if url not in self._odata_unsupported:
+            try:
+                items = await self._iterate_pages(url, query=str(query), page_size=page_size, probe=True)
+                return [i for i in items if match(i)]
+            except requests.exceptions.HTTPError as e:
+                if not odata_fallback(self._odata_unsupported, url, getattr(e.response, 'status_code', None)):
+                    raise
+
+        items = await self._iterate_pages(url, page_size=page_size)
+        return [i for i in items if match(i)]
+
+    async def get_business_groups(self, page_size=None, query=None):
+        url = 'https://%s/identity/api/tenants/%s/subtenants' % (
+            self.cloudurl, self.tenant)
+        return await self._iterate_pages(url, query=str(query or ''), page_size=page_size)
+
+    def iter_business_groups(self, prefetch=False, page_size=None, query=None):
+        url = 'https://%s/identity/api/tenants/%s/subtenants' % (
+            self.cloudurl, self.tenant)
+        return self._iter_pages(url, query=str(query or ''), prefetch=prefetch, page_size=page_size)
+
+    async def get_business_groups_byuser(self, username, role=None, expand_groups=False, page_size=None,
+                                         query=None):
+        url = 'https://%s/identity/api/tenants/%s/principals/%s/subtenants' % (
+            self.cloudurl, self.tenant, username)
+        params = Session._principal_query(role, expand_groups)
+        return await self._iterate_pages(url, query=params + str(query or ''), page_size=page_size)
+
+    def iter_business_groups_byuser(self, username, role=None, expand_groups=False, prefetch=False,
+                                    page_size=None, query=None):
+        url = 'https://%s/identity/api/tenants/%s/principals/%s/subtenants' % (
+            self.cloudurl, self.tenant, username)
+        params = Session._principal_query(role, expand_groups)
+        return self._iter_pages(url, query=params + str(query or ''), prefetch=prefetch, page_size=page_size)
+
+    async def get_businessgroup_byname(self, name, page_size=None):
+        url = 'https://%s/identity/api/tenants/%s/subtenants' % (
+            self.cloudurl, self.tenant)
+        return await self._find(url, Query().contains('name', name),
+                                lambda i: name.lower() in i['name'].lower(), page_size=page_size)
+
+    async def get_businessgroup_fromid(self, group_id):
+        url = 'https://%s/identity/api/tenants/%s/subtenants/%s' % (
+            self.cloudurl, self.tenant, group_id)
+        return await self._request(url)
+
+    async def get_entitled_catalog_items(self, service_id=None, on_behalf_of=None, subtenant_id=None,
+                                         page_size=None, query=None):
+        url = 'https://%s/catalog-service/api/consumer/entitledCatalogItems' % self.cloudurl
+        params = Session._catalog_query(service_id, on_behalf_of, subtenant_id)
+        return await self._iterate_pages(url, query=params + str(query or ''), page_size=page_size)
+
+    def iter_entitled_catalog_items(self, service_id=None, on_behalf_of=None, subtenant_id=None,
+                                    prefetch=False, page_size=None, query=None):
+        url = 'https://%s/catalog-service/api/consumer/entitledCatalogItems' % self.cloudurl
+        params = Session._catalog_query(service_id, on_behalf_of, subtenant_id)
+        return self._iter_pages(url, query=params + str(query or ''), prefetch=prefetch, page_size=page_size)
+
+    async def get_entitled_catalog_item_views(self, service_id=None, on_behalf_of=None, subtenant_id=None,
+                                              page_size=None, query=None):
+        url = 'https://%s/catalog-service/api/consumer/entitledCatalogItemViews' % self.cloudurl
+        params = Session._catalog_query(service_id, on_behalf_of, subtenant_id)
+        return await self._iterate_pages(url, query=params + str(query or ''), page_size=page_size)
+
+    def iter_entitled_catalog_item_views(self, service_id=None, on_behalf_of=None, subtenant_id=None,
+                                         prefetch=False, page_size=None, query=None):
+        url = 'https://%s/catalog-service/api/consumer/entitledCatalogItemViews' % self.cloudurl
+        params = Session._catalog_query(service_id, on_behalf_of, subtenant_id)
+        return self._iter_pages(url, query=params + str(query or ''), prefetch=prefetch, page_size=page_size)
+
+    async def get_catalogitem_byname(self, name, catalog=False, page_size=None):
+        def match(i):
+            return name.lower() in i['catalogItem']['name'].lower()
+
+        if not catalog:
+            url = 'https://%s/catalog-service/api/consumer/entitledCatalogItems' % self.cloudurl
+            query = Query().contains('catalogItem/name', name)
+            return await self._find(url, query, match, page_size=page_size)
+
+        return [i for i in catalog if match(i)]
+
+    async def get_catalogitem_byid(self, catalog_id):
+        url = "https://%s/catalog-service/api/consumer/entitledCatalogItems?$filter=id eq '%s'" % (
+            self.cloudurl, catalog_id)
+        return await self._request(url)
+
+    async def get_request_template(self, catalogitem):
+        return await self._request(self.get_request_template_url(catalogitem))
+
+    get_request_template_url = Session.get_request_template_url
+    get_request_url = Session.get_request_url
+
+    async def request_item(self, catalogitem, payload=False):
+        """Async version of vralib.Session.request_item()."""
+
+        if not payload:
+            payload = await self.get_request_template(catalogitem)
+
+        return await self._request(self.get_request_url(catalogitem), request_method="POST", payload=payload)
+
+    async def get_eventbroker_events(self, page_size=None, query=None):
+        url = 'https://%s/event-broker-service/api/events' % self.cloudurl
+        return await self._iterate_pages(url, query=str(query or ''), page_size=page_size)
+
+    def iter_eventbroker_events(self, prefetch=False, page_size=None, query=None):
+        url = 'https://%s/event-broker-service/api/events' % self.cloudurl
+        return self._iter_pages(url, query=str(query or ''), prefetch=prefetch, page_size=page_size)
+
+    async def get_requests(self, page_size=None, query=None):
+        url = 'https://%s/catalog-service/api/consumer/requests' % self.cloudurl
+        return await self._iterate_pages(url, query=str(query or ''), page_size=page_size)
+
+    def iter_requests(self, prefetch=False, page_size=None, query=None):
+        url = 'https://%s/catalog-service/api/consumer/requests' % self.cloudurl
+        return self._iter_pages(url, query=str(query or ''), prefetch=prefetch, page_size=page_size)
+
+    async def get_request(self, request_id):
+        url = 'https://%s/catalog-service/api/consumer/requests/%s' % (
+            self.cloudurl, request_id)
+        return await self._request(url)
+
+    async def get_consumer_resources(self, page_size=None, query=None):
+        url = 'https://%s/catalog-service/api/consumer/resources' % self.cloudurl
+        return await self._iterate_pages(url, query=str(query or ''), page_size=page_size)
+
+    def iter_consumer_resources(self, prefetch=False, page_size=None, query=None):
+        url = 'https://%s/catalog-service/api/consumer/resources' % self.cloudurl
+        return self._iter_pages(url, query=str(query or ''), prefetch=prefetch, page_size=page_size)
+
+    async def get_consumer_resource(self, resource_id):
+        url = 'https://%s/catalog-service/api/consumer/resources/%s' % (
+            self.cloudurl, resource_id)
+        return await self._request(url)
+
+    async def get_consumer_resource_byname(self, name, page_size=None):
+        url = 'https://%s/catalog-service/api/consumer/resources' % self.cloudurl
+        return await self._find(url, Query().contains('name', name),
+                                lambda i: name.lower() in i['name'].lower(), page_size=page_size)
+
+    async def get_resource_view(self, resource_id):
+        options = "?managedOnly=false&withExtenedData=true&withOperations=true"
+        url = 'https://%s/catalog-service/api/consumer/resourceViews/%s%s' % (
+            self.cloudurl, resource_id, options)
+        return await self._request(url)
+
+    async def get_reservations(self):
+        url = 'https://%s/reservation-service/api/reservations' % self.cloudurl
+        return await self._request(url)
+
+    async def get_reservation(self, reservation_id):
+        url = 'https://%s/reservation-service/api/reservations/%s' % (
+            self.cloudurl, reservation_id)
+        return await self._request(url)
+
+    async def deployment_fromid(self, resource_id, cls=Deployment):
+        """
+        Async version of Deployment.fromid(). The children of a deployment are listed from their
+        resourceViews and loaded concurrently, with their operations, from their consumer resources.
+
+        Basic usage:
+
+        deployment = await vra.deployment_fromid('28e735b6-04d3-46d1-bf4e-ca7210b2cba4')
+
+        The returned objects keep a reference to this AsyncSession, so their day 2 methods that only
+        issue one request (e.g. get_operation_template) return coroutines. Use a vralib.Session
+        to run day 2 operations.
+
+        :param resource_id: The GUID of the deployment
+        :param cls: The class to build, Deployment or one of its subclasses
+
+        :return: An instance of cls with its deployment_children resolved
+        """
+
+        deployment = await self.get_consumer_resource(resource_id)
+        operations = Deployment._get_operations(self, resource_id, deployment)
+        deployment_children = []
+
+        if deployment['hasChildren'] == True:
+            deployment_children = await self._deployment_children(resource_id)
+
+        return cls(self, deployment, operations, deployment_children)
+
+    async def _deployment_children(self, resource_id):
+        children = await self._iterate_pages(Deployment._get_children_url(self),
+                                             query=Deployment._get_children_query(resource_id))
+        return list(await asyncio.gather(*[
+            self._deployment_fromview(child)
+            for child in children if child['resourceType'] in RESOURCE_CLASSES]))
+
+    async def _deployment_fromview(self, view):
+        if view.get('hasChildren'):
+            resource, deployment_children = await asyncio.gather(self.get_consumer_resource(view['resourceId']),
+                                                                 self._deployment_children(view['resourceId']))
+        else:
+            resource, deployment_children = await self.get_consumer_resource(view['resourceId']), []
+        operations = Deployment._get_operations(self, view['resourceId'], resource)
+        return RESOURCE_CLASSES[view['resourceType']](self, resource, operations, deployment_children)
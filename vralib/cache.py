@@ -0,0 +1,143 @@
+"""
+
+    An opt-in response cache for read-mostly vRA endpoints.
+
+"""
+
+import threading
+import time
+
+from collections import OrderedDict
+
+
+# Endpoints cached by default, as (URL substring, seconds). The first match wins, so specific patterns go first.
+DEFAULT_TTLS = (
+    ('/requests/template', 300),
+    ('/catalog-service/api/consumer/entitledCatalogItemViews', 300),
+    ('/catalog-service/api/consumer/entitledCatalogItems', 300),
+    ('/identity/api/tenants/', 600),
+)
+
+
+class ResponseCache(object):
+    """
+    A size-bounded LRU cache of GET response bodies, keyed by the full URL including the query string.
+
+    Only URLs matching one of the configured endpoint patterns are cached, each with its own TTL.
+    Bodies are stored as the raw bytes returned by the server and decoded on every hit, so callers
+    can modify what they get back (e.g. a request template) without corrupting the cache.
+
+    Basic usage:
+
+    vra = vralib.Session.login(username, password, cloudurl, tenant, cache=vralib.ResponseCache())
+    vra.get_entitled_catalog_items()       # miss, goes to the server
+    vra.get_entitled_catalog_items()       # hit
+    vra.cache.invalidate('entitledCatalogItems')
+    print(vra.cache.stats())
+
+    A cache should only be used by one Session, since responses depend on who is logged in.
+    """
+
+    def __init__(self, maxsize=256, ttls=DEFAULT_TTLS, default_ttl=None):
+        """
+        :param maxsize: The maximum number of responses kept. The least recently used one is evicted first.
+        :param ttls: A sequence of (URL substring, seconds) pairs. The first matching pattern sets the TTL.
+        :param default_ttl: The TTL of URLs matching no pattern. None means they are not cached.
+        """
+
+        self.maxsize = maxsize
+        self.ttls = list(ttls)
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def ttl_for(self, url):
+        """Returns the TTL in seconds for url, or None if it is not cached."""
+
+        for pattern, ttl in self.ttls:
+            if pattern in url:
+                return ttl
+        return self.default_ttl
+
+    def get(self, url):
+        """
+        :return: The cached body for url, or None on a miss or if url is not cached.
+        """
+
+        if not self.ttl_for(url):
+            return None
+
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                expires, content = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(url)
+                    self.hits += 1
+                    return content
+                del self._entries[url]
+            self.misses += 1
+            return None
+
+    def set(self, url, content):
+        """Stores the body of a response for url if url is cached."""
+
+        ttl = self.ttl_for(url)
+        if not ttl:
+            return
+
+        with self._lock:
+            self._entries[url] = (time.monotonic() + ttl, content)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, pattern=None):
+        """Drops the cached responses whose URL contains pattern, or all of them.
+
+        :return: The number of responses dropped
+        """
+
+        with self._lock:
+            if pattern is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                return dropped
+            urls = [url for url in self._entries if pattern in url]
+            for url in urls:
+                del self._entries[url]
+            return len(urls)
+
+    def invalidate_paths(self, paths):
+        """Drops the cached responses of the given URLs without query strings, whatever their query was.
+
+        Used by Session after a PUT, POST or DELETE so collections don't show stale data.
+
+        :return: The number of responses dropped
+        """
+
+        paths = set(paths)
+        with self._lock:
+            urls = [url for url in self._entries if url.split('?', 1)[0] in paths]
+            for url in urls:
+                del self._entries[url]
+            return len(urls)
+
+    def stats(self):
+        """
+        :return: A dictionary with the size of the cache and its hit, miss and eviction counters
+        """
+
+        with self._lock:
+            return {'size': len(self._entries),
+                    'maxsize': self.maxsize,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions}
+
+    def __len__(self):
+        return len(self._entries)
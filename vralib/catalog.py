@@ -0,0 +1,227 @@
+"""
+
+    An in-memory index of the entitled catalog for fast lookups by id, name, service and business group.
+
+"""
+
+import bisect
+import heapq
+import itertools
+import threading
+import time
+
+
+def catalog_item_fields(item):
+    """Reads the fields the index needs from an entitled catalog item or catalog item view.
+
+    :return: A tuple of (id, name, service id, business group ids, version)
+    """
+
+    if 'catalogItem' in item:
+        # entitledCatalogItems wrap the catalog item
+        catalog_item = item['catalogItem']
+        catalog_item_id = catalog_item['id']
+    else:
+        catalog_item = item
+        catalog_item_id = item.get('catalogItemId', item.get('id'))
+
+    service = catalog_item.get('serviceRef') or {}
+    version = (catalog_item.get('version'), catalog_item.get('lastUpdatedDate'))
+    groups = tuple(sorted(o.get('subtenantRef') for o in item.get('entitledOrganizations') or []
+                          if o.get('subtenantRef')))
+    return catalog_item_id, catalog_item.get('name') or '', service.get('id'), groups, version
+
+
+def _grams(text, sizes=(1, 2, 3)):
+    return set(text[i:i + n] for n in sizes for i in range(len(text) - n + 1))
+
+
+class CatalogIndex(object):
+    """
+    Indexes the entitled catalog items of a session in memory.
+
+    Lookups by id are dictionary lookups, prefix searches are a binary search over the sorted names,
+    and substring searches intersect the sets of catalog items containing each 1, 2 or 3 character
+    slice of the text. Names are compared case insensitively.
+
+    refresh() reads the catalog again, but only re-indexes the items that were added, changed or
+    removed since the previous refresh. With max_age set, searches refresh the index once it is older
+    than max_age seconds.
+
+    Basic usage:
+
+    catalog = vralib.CatalogIndex(vra)
+    catalog.search('cent')                                  # every item with 'cent' in its name
+    catalog.search(prefix='cent', business_group=group_id)
+    catalog.get('0ebbcf20-abdf-4663-a40c-1e50e7340190')
+    vra.get_catalogitem_byname('cent', catalog=catalog)
+    """
+
+    def __init__(self, session, views=False, max_age=None, page_size='auto'):
+        """
+        :param session: A vralib.Session
+        :param views: If True the index is built from entitledCatalogItemViews instead of entitledCatalogItems
+        :param max_age: Seconds after which a search refreshes the index first. None never refreshes.
+        :param page_size: Items per page when reading the catalog: a number, 'auto' or None
+        """
+
+        self.session = session
+        self.views = views
+        self.max_age = max_age
+        self.page_size = page_size
+        self.refreshed_at = None
+        self._items = {}
+        self._fields = {}
+        self._names = []
+        self._grams = {}
+        self._by_service = {}
+        self._by_group = {}
+        self._lock = threading.RLock()
+        self.refresh()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, catalog_item_id):
+        return catalog_item_id in self._items
+
+    def refresh(self, items=None):
+        """Reads the catalog and updates the index with the items that changed.
+
+        :param items: The catalog items to index instead of reading them from the session
+
+        :return: A dictionary with the number of items added, updated and removed
+        """
+
+        if items is None:
+            if self.views:
+                items = self.session.get_entitled_catalog_item_views(page_size=self.page_size)
+            else:
+                items = self.session.get_entitled_catalog_items(page_size=self.page_size)
+
+        latest = {}
+        for item in items:
+            fields = catalog_item_fields(item)
+            latest[fields[0]] = (item, fields)
+
+        counts = {'added': 0, 'updated': 0, 'removed': 0}
+        with self._lock:
+            for catalog_item_id in [i for i in self._items if i not in latest]:
+                self._remove(catalog_item_id)
+                counts['removed'] += 1
+
+            for catalog_item_id, (item, fields) in latest.items():
+                old = self._fields.get(catalog_item_id)
+                if old == fields:
+                    self._items[catalog_item_id] = item
+                    continue
+                if old is not None:
+                    self._remove(catalog_item_id)
+                    counts['updated'] += 1
+                else:
+                    counts['added'] += 1
+                self._add(item, fields)
+
+            self.refreshed_at = time.time()
+        return counts
+
+    def _add(self, item, fields):
+        catalog_item_id, name, service, groups, _ = fields
+        lowered = name.lower()
+        self._items[catalog_item_id] = item
+        self._fields[catalog_item_id] = fields
+        bisect.insort(self._names, (lowered, catalog_item_id))
+        for gram in _grams(lowered):
+            self._grams.setdefault(gram, set()).add(catalog_item_id)
+        self._by_service.setdefault(service, set()).add(catalog_item_id)
+        for group in groups:
+            self._by_group.setdefault(group, set()).add(catalog_item_id)
+
+    def _discard(self, index, key, catalog_item_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(catalog_item_id)
+            if not ids:
+                del index[key]
+
+    def _remove(self, catalog_item_id):
+        _, name, service, groups, _ = self._fields.pop(catalog_item_id)
+        del self._items[catalog_item_id]
+        lowered = name.lower()
+        position = bisect.bisect_left(self._names, (lowered, catalog_item_id))
+        del self._names[position]
+        for gram in _grams(lowered):
+            self._discard(self._grams, gram, catalog_item_id)
+        self._discard(self._by_service, service, catalog_item_id)
+        for group in groups:
+            self._discard(self._by_group, group, catalog_item_id)
+
+    def _refresh_if_stale(self):
+        if self.max_age is not None and time.time() - self.refreshed_at > self.max_age:
+            self.refresh()
+
+    def get(self, catalog_item_id):
+        """
+        :return: The catalog item with the given id, or None
+        """
+
+        self._refresh_if_stale()
+        return self._items.get(catalog_item_id)
+
+    def _prefix_ids(self, prefix):
+        names = self._names
+        position = bisect.bisect_left(names, (prefix,))
+        while position < len(names) and names[position][0].startswith(prefix):
+            yield names[position][1]
+            position += 1
+
+    def _substring_ids(self, text):
+        if len(text) <= 3:
+            return self._grams.get(text, set())
+
+        candidates = sorted((self._grams.get(text[i:i + 3], set()) for i in range(len(text) - 2)), key=len)
+        ids = set(candidates[0]).intersection(*candidates[1:])
+        return set(i for i in ids if text in self._fields[i][1].lower())
+
+    def search(self, text=None, prefix=None, service=None, business_group=None, limit=None):
+        """Finds catalog items. Every criterion given must match.
+
+        :param text: A substring of the name
+        :param prefix: The start of the name
+        :param service: The id of a service
+        :param business_group: The id of a business group the item is entitled to
+        :param limit: The maximum number of items returned
+
+        :return: A list of catalog items, sorted by name
+        """
+
+        self._refresh_if_stale()
+
+        with self._lock:
+            sets = []
+            if text:
+                sets.append(self._substring_ids(text.lower()))
+            if service is not None:
+                sets.append(self._by_service.get(service, set()))
+            if business_group is not None:
+                sets.append(self._by_group.get(business_group, set()))
+
+            if prefix:
+                ids = (i for i in self._prefix_ids(prefix.lower()) if all(i in s for s in sets))
+                ids = list(itertools.islice(ids, limit))
+            elif sets:
+                sets.sort(key=len)
+                found = set(sets[0]).intersection(*sets[1:])
+                keys = ((self._fields[i][1].lower(), i) for i in found)
+                ids = [i for _, i in heapq.nsmallest(len(found) if limit is None else limit, keys)]
+            else:
+                ids = [i for _, i in self._names[:limit]]
+
+            return [self._items[i] for i in ids]
+
+    def services(self):
+        """
+        :return: The ids of the services of the indexed catalog items
+        """
+
+        return [s for s in self._by_service if s is not None]
@@ -1,12 +1,26 @@
-# TODO implement logging
-
 __author__ = 'Russell Pope'
 
 
 import json
+import logging
 import requests
-
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
+
+from vralib.catalog import CatalogIndex
+from vralib.codec import get_codec
+from vralib.hooks import Hooks, RequestTrace
+from vralib.metrics import MetricsRegistry, endpoint_template
+from vralib.provisioning import BulkProvisioner
+from vralib.query import Query, odata_fallback
+from vralib.retry import PUSHBACK_STATUSES, RetryPolicy
+from vralib.streaming import STREAM_CHUNK_SIZE, PageParser
 from vralib.vraexceptions import InvalidToken
+from vralib.waiter import RequestWaiter
 
 try:
     from requests.packages.urllib3.exceptions import InsecureRequestWarning
@@ -14,6 +28,18 @@ except ImportError:
     pass
 
 
+log = logging.getLogger(__name__)
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_PAGE_WORKERS = 1
+
+# page_size='auto' uses large pages for bulk reads and small pages for probes that expect a few rows
+PAGE_SIZE_AUTO = 'auto'
+AUTO_BULK_PAGE_SIZE = 500
+AUTO_PROBE_PAGE_SIZE = 20
+
+
 class Session(object):
     """
     Used to store vRA login session to a specific tenant. The class should be invoked via cls.login()
@@ -39,10 +65,14 @@ class Session(object):
 
     """
 
-    def __init__(self, username, cloudurl, tenant, auth_header, ssl_verify):
+    def __init__(self, username, cloudurl, tenant, auth_header, ssl_verify,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=False, http=None, page_workers=DEFAULT_PAGE_WORKERS, page_size=None,
+                 cache=None, retry=True, rate_limiter=None, codec=None, metrics=None):
         """Initialization of the Session class.
 
         The password is intentionally not stored in this class since we only really need the token.
+        Sessions created by login() keep it in a closure (unless relogin=False) to replace expired tokens.
 
         When creating instances of this class you should invoke the Session.login() @classmethod. 
         If you invoke Session.__init__() directly you'll need to know what your bearer token is ahead of time.  
@@ -51,6 +81,25 @@ class Session(object):
         :param cloudurl: Stores the FQDN of the vRealize Automation server
         :param tenant: Stores the tenant to log into. If left blank it will default to vsphere.local
         :param auth_header: Stores the actual Bearer token to be used in subsequent requests.
+        :param pool_connections: The number of per-host connection pools to keep around.
+        :param pool_maxsize: The maximum number of keep-alive connections kept per host.
+                             Set it to at least the number of threads sharing this session.
+        :param pool_block: If True, callers wait for a free connection instead of
+                           opening (and then discarding) extra ones above pool_maxsize.
+        :param http: An optional requests.Session to reuse, e.g. the one used during login.
+        :param page_workers: The default number of threads used to fetch the remaining pages of a
+                             collection once the first page is known. 1 fetches them serially.
+        :param page_size: The default number of items requested per page (the `limit` query parameter).
+                          None keeps the server default, 'auto' picks a large page for bulk reads
+                          and a small one for lookups that expect only a few rows.
+        :param cache: An optional vralib.ResponseCache for read-mostly endpoints such as the catalog,
+                      business groups and request templates.
+        :param retry: A vralib.RetryPolicy for transient errors. True uses the default policy, False disables retries.
+        :param rate_limiter: An optional vralib.RateLimiter, which may be shared with other sessions.
+        :param codec: The JSON codec of request and response bodies: None for the fastest one installed
+                      (orjson, ujson, then the standard library), a name, or an object with loads() and dumps().
+        :param metrics: An optional vralib.MetricsRegistry recording per-endpoint request metrics, which may be
+                        shared with other sessions. True creates one. Without a registry nothing is recorded.
 
         :return:
         """
@@ -63,9 +112,56 @@ class Session(object):
                         'Accept': 'Application/json',
                         'Authorization': self.token}
         self.ssl_verify = ssl_verify
+        self._http = http or self._new_http(pool_connections, pool_maxsize, pool_block)
+        self.page_workers = page_workers
+        self.page_size = page_size
+        self.cache = cache
+        self.retry = RetryPolicy() if retry is True else retry or None
+        self.rate_limiter = rate_limiter
+        self.codec = get_codec(codec)
+        self.metrics = MetricsRegistry() if metrics is True else metrics or None
+        self.hooks = Hooks()
+        self.token_store = None
+        self._authenticate = None
+        self._auth_lock = threading.Lock()
+        self._odata_unsupported = set()
+        self._waiter = None
+        self._waiter_lock = threading.Lock()
+
+    @staticmethod
+    def _new_http(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                  pool_block=False):
+        """Creates the pooled keep-alive transport used by a Session.
+
+        Cookies are never stored, so the only state shared between threads is the
+        thread-safe urllib3 connection pool.
+
+        :return: A requests.Session with a pooled HTTPS adapter mounted
+        """
+
+        http = requests.Session()
+        http.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        http.mount('https://', HTTPAdapter(pool_connections=pool_connections,
+                                           pool_maxsize=pool_maxsize,
+                                           pool_block=pool_block))
+        return http
+
+    def close(self):
+        """Closes all of the pooled connections held by this session."""
+        if self._waiter is not None:
+            self._waiter.stop()
+        self._http.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
     @classmethod
-    def login(cls, username, password, cloudurl, tenant=None, ssl_verify=True):
+    def login(cls, username, password, cloudurl, tenant=None, ssl_verify=True,
+              pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+              pool_block=False, token_store=None, relogin=True, **kwargs):
         """
         Takes in a username, password, URL, and tenant to access a vRealize Automation server AP. These attributes
         can be used to send or retrieve data from the vRealize automation API.
@@ -76,11 +172,25 @@ class Session(object):
 
         This creates a Session object called 'vra' which can now be used to access all of the methods in this class.
 
+        To reuse tokens between runs, pass a token store and, optionally, a callable for the password.
+        The callable is only invoked when a new token is actually needed:
+
+        vra = vralib.Session.login(username, lambda: getpass.getpass(), cloudurl, tenant,
+                                   token_store=vralib.TokenStore())
+
         :param username: A username@domain with sufficient rights to use the API
-        :param password: The password of the user
+        :param password: The password of the user, or a callable that returns it
         :param cloudurl: The vRealize automation server. Should be the FQDN.
         :param tenant: the tenant ID to be logged into. If left empty it will default to vsphere.local
         :param ssl_verify: Enable or disable SSL verification.
+        :param pool_connections: The number of per-host connection pools to keep around.
+        :param pool_maxsize: The maximum number of keep-alive connections kept per host.
+        :param pool_block: If True, wait for a free pooled connection instead of opening extra ones.
+        :param token_store: An optional vralib.TokenStore. An unexpired token stored for the same cloudurl,
+                            tenant and username is used instead of logging in, and new tokens are saved to it.
+        :param relogin: If True, the session logs in again and retries once when the server rejects its token.
+                        This keeps the password in memory for the lifetime of the session.
+        :param kwargs: Any other keyword arguments of Session.__init__(), e.g. page_workers.
 
         :return: Returns a class that includes all of the login session data (token, tenant and SSL verification)
         """
@@ -88,16 +198,44 @@ class Session(object):
         if not tenant:
             tenant = 'vsphere.local'
 
+        if not ssl_verify:
+            try:
+                requests.packages.urllib3.disable_warnings(
+                    InsecureRequestWarning)
+            except AttributeError:
+                pass
+
+        http = cls._new_http(pool_connections, pool_maxsize, pool_block)
+        secret = []
+
+        def authenticate():
+            if not secret:
+                secret.append(password() if callable(password) else password)
+            vratoken = cls._get_token(http, username, secret[0], cloudurl, tenant, ssl_verify)
+            if token_store is not None:
+                token_store.set(cloudurl, tenant, username, vratoken['id'], vratoken.get('expires'))
+            return 'Bearer %s' % vratoken['id']
+
+        token_id = token_store.get(cloudurl, tenant, username) if token_store is not None else None
+        auth_header = 'Bearer %s' % token_id if token_id else authenticate()
+
+        session = cls(username, cloudurl, tenant, auth_header, ssl_verify, http=http, **kwargs)
+        session.token_store = token_store
+        if relogin:
+            session._authenticate = authenticate
+        return session
+
+    @staticmethod
+    def _get_token(http, username, password, cloudurl, tenant, ssl_verify):
+        """Requests a new bearer token from the identity service.
+
+        :return: The token as returned by the API, including its `id` and `expires` timestamp
+        """
+
         r = None
 
         try:
-            if not ssl_verify:
-                try:
-                    requests.packages.urllib3.disable_warnings(
-                        InsecureRequestWarning)
-                except AttributeError:
-                    pass
-            r = requests.post(
+            r = http.post(
                 url='https://%s/identity/api/tokens' % cloudurl,
                 headers={'Content-type': 'Application/json',
                          'Accept': 'Application/json'},
@@ -112,8 +250,7 @@ class Session(object):
             vratoken = json.loads(r.content)
 
             if 'id' in vratoken.keys():
-                auth_header = 'Bearer %s' % vratoken['id']
-                return cls(username, cloudurl, tenant, auth_header, ssl_verify)
+                return vratoken
             else:
                 raise InvalidToken('No bearer token found in response. Response was:',
                                    json.dumps(vratoken))
@@ -126,7 +263,68 @@ class Session(object):
             raise requests.exceptions.HTTPError(
                 'HTTP error. Status code was:', r.status_code)
 
-    def _request(self, url, request_method='GET', payload=None, content_only=True, **kwargs):
+    def relogin(self, rejected=None):
+        """
+        Replaces the bearer token of the session with a new one. _request() calls this when the server
+        answers 401, so there is normally no need to call it directly.
+
+        :param rejected: The token that was rejected. If another thread already replaced it, nothing is done.
+
+        :return:
+        """
+
+        if self._authenticate is None:
+            raise InvalidToken('The token was rejected and the session can not log in again. Token was:',
+                               self.token)
+
+        with self._auth_lock:
+            if rejected is not None and rejected != self.token:
+                return
+            log.info('Token of %s@%s rejected, logging in again', self.username, self.cloudurl)
+            if self.token_store is not None:
+                self.token_store.delete(self.cloudurl, self.tenant, self.username)
+            self.token = self._authenticate()
+            self.headers['Authorization'] = self.token
+
+    def add_hook(self, event, callback, endpoint=None):
+        """Registers a callback fired around the requests of this session, see vralib.hooks.Hooks.
+
+        :param event: 'before_send', 'after_headers', 'after_body', 'after_decode' or 'error'
+        :param callback: A callable taking a vralib.hooks.RequestTrace
+        :param endpoint: None for every request, a substring of the endpoint templates to hook,
+                         e.g. 'resourceViews', or a compiled regular expression
+
+        :return:
+        """
+
+        self.hooks.add(event, callback, endpoint)
+
+    def remove_hook(self, event, callback):
+        self.hooks.remove(event, callback)
+
+    def _send(self, request_method, url, payload=None, stream=False):
+        return self._http.request(request_method,
+                                  url=url,
+                                  headers=self.headers,
+                                  verify=self.ssl_verify,
+                                  data=payload,
+                                  stream=stream)
+
+    def _traced_cache_hit(self, request_method, url, content):
+        """Decodes a response served from the cache, firing the before_send and after_decode hooks."""
+
+        trace = RequestTrace(request_method, url)
+        trace.cached = True
+        trace.size = len(content)
+        self.hooks.fire('before_send', trace)
+        decode_started = time.perf_counter()
+        decoded = self.codec.loads(content or b'null')
+        trace.decode_seconds = time.perf_counter() - decode_started
+        self.hooks.fire('after_decode', trace)
+        return decoded
+
+    def _request(self, url, request_method='GET', payload=None, content_only=True, retry_safe=False, stream=False,
+                 **kwargs):
         """
         Generic requestor method for all of the HTTP methods. This gets invoked by pretty much everything in the API.
         You can also use it to do anything not yet implemented in the API. For example:
@@ -135,94 +333,380 @@ class Session(object):
         out = vra._request(url='https://vra-01a.corp.local/properties-service/api/propertygroups')
         print(json.dumps(out, indent=4))
 
+        If the server rejects the token (401) and the session was created with login(), the session
+        logs in again and the request is retried once. Transient errors are retried according to the
+        retry policy of the session, and every attempt waits for the rate limiter, if there is one.
+
         :param url: The complete URL for the requested resource
-        :param request_method: An HTTP method that is either PUT, POST or GET
+        :param request_method: An HTTP method that is either GET, PUT, POST or DELETE
         :param payload: Used to store a resource that is used in either POST or PUT operations
         :param content_only: if True, returns the json-encoded content of a response, if any.
+        :param retry_safe: if True, a POST or PUT may be retried like a GET. Only use it for requests
+                           that do no harm when they reach the server twice.
+        :param stream: if True, the body of a successful response is not read and the response object is
+                       returned whatever content_only is. The caller must close it. The cache is bypassed.
         :param kwargs: Unused currently
 
         :return: if content_only is set to True, the json-encoded content of a response,
                  otherwise a response object
         """
 
-        if request_method == "PUT" or "POST" and payload:
-            if type(payload) == dict:
-                payload = json.dumps(payload)
+        if request_method not in ('GET', 'PUT', 'POST', 'DELETE'):
+            raise Exception('Method %s is not implemented.' % request_method)
 
-            r = requests.request(request_method,
-                                 url=url,
-                                 headers=self.headers,
-                                 verify=self.ssl_verify,
-                                 data=payload)
+        if self.cache is not None and request_method == 'GET' and content_only == True and not stream:
+            content = self.cache.get(url)
+            if content is not None:
+                if self.metrics is not None:
+                    self.metrics.cache_hit(url, request_method)
+                if self.hooks.active and self.hooks.wants(endpoint_template(url), ('before_send', 'after_decode')):
+                    return self._traced_cache_hit(request_method, url, content)
+                return self.codec.loads(content or b'null')
+
+        if type(payload) == dict:
+            payload = self.codec.dumps(payload)
+
+        metrics = self.metrics
+        if metrics is not None:
+            started = time.perf_counter()
+
+        hooks = self.hooks
+        trace = None
+        split_body = False
+        if hooks.active:
+            endpoint = endpoint_template(url)
+            if hooks.wants(endpoint):
+                trace = RequestTrace(request_method, url)
+                split_body = hooks.wants(endpoint, ('after_headers', 'after_body'))
 
-            if not r.ok:
-                raise requests.exceptions.HTTPError(
-                    'HTTP error. Status code was:', r.status_code, r.content)
+        try:
+            token = self.token
+            relogged = False
+            attempt = 0
 
-        elif request_method == "GET":
-            r = requests.request(request_method,
-                                 url=url,
-                                 headers=self.headers,
-                                 verify=self.ssl_verify)
+            while True:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
 
-            if not r.ok:
-                raise requests.exceptions.HTTPError(
-                    'HTTP error. Status and content:', r.status_code, r.content)
+                if trace is not None:
+                    trace.sending(attempt)
+                    hooks.fire('before_send', trace)
 
-        elif request_method == "DELETE":
-            r = requests.request(request_method,
-                                 url=url,
-                                 headers=self.headers,
-                                 verify=self.ssl_verify)
+                try:
+                    # when a hook times the body it is read separately, so that after_headers fires before it arrives
+                    r = self._send(request_method, url, payload, stream or split_body)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    if self.retry is None or not self.retry.should_retry(request_method, attempt, safe=retry_safe):
+                        if metrics is not None:
+                            metrics.observe(url, request_method, None, time.perf_counter() - started)
+                        raise
+                    retry_after = None
+                else:
+                    if trace is not None:
+                        trace.received(r)
+                        hooks.fire('after_headers', trace)
+
+                    if r.status_code == 401 and self._authenticate is not None and not relogged:
+                        r.close()
+                        self.relogin(rejected=token)
+                        relogged = True
+                        continue
+
+                    if self.rate_limiter is not None:
+                        if r.status_code in PUSHBACK_STATUSES:
+                            self.rate_limiter.backoff()
+                        elif r.ok:
+                            self.rate_limiter.success()
+
+                    if r.ok or self.retry is None or \
+                            not self.retry.should_retry(request_method, attempt, r.status_code, retry_safe):
+                        break
+                    retry_after = r.headers.get('Retry-After')
+                    r.close()
+
+                if metrics is not None:
+                    metrics.retry(url, request_method)
+                delay = self.retry.delay(attempt, retry_after)
+                log.debug('Retrying %s %s in %.2fs (attempt %d)', request_method, url, delay, attempt + 1)
+                time.sleep(delay)
+                attempt += 1
+
+            if trace is not None and not (stream and r.ok):
+                trace.read(r)
+                hooks.fire('after_body', trace)
 
             if not r.ok:
+                if metrics is not None:
+                    metrics.observe(url, request_method, r.status_code, time.perf_counter() - started, len(r.content))
                 raise requests.exceptions.HTTPError(
-                    'HTTP error. Status code was:', r.status_code)
-
-        else:
-            raise Exception('Method %s is not implemented.' % request_method)
-
-        if content_only == True:
-            return json.loads(r.content or 'null')
+                    'HTTP error. Status code was:', r.status_code, r.content, response=r)
+
+            if stream:
+                if metrics is not None:
+                    # the body is read by the caller, so only its announced size is known
+                    metrics.observe(url, request_method, r.status_code, time.perf_counter() - started,
+                                    int(r.headers.get('Content-Length') or 0))
+                return r
+
+            if self.cache is not None:
+                if request_method == 'GET':
+                    self.cache.set(url, r.content)
+                else:
+                    # whatever was changed and the collection it belongs to are now stale
+                    path = url.split('?', 1)[0]
+                    self.cache.invalidate_paths((path, path.rsplit('/', 1)[0]))
+
+            if content_only != True:
+                if metrics is not None:
+                    metrics.observe(url, request_method, r.status_code, time.perf_counter() - started, len(r.content))
+                return r
+
+            if metrics is None and trace is None:
+                return self.codec.loads(r.content or b'null')
+
+            decode_started = time.perf_counter()
+            content = self.codec.loads(r.content or b'null')
+            decode_seconds = time.perf_counter() - decode_started
+            if metrics is not None:
+                metrics.observe(url, request_method, r.status_code, decode_started - started, len(r.content),
+                                decode_seconds)
+            if trace is not None:
+                trace.decode_seconds = decode_seconds
+                hooks.fire('after_decode', trace)
+            return content
+        except Exception as e:
+            # every failure, including relogin and JSON decode errors, fires the error hooks once
+            if trace is not None and trace.error is None:
+                trace.error = e
+                hooks.fire('error', trace)
+            raise
+
+    def _request_page(self, url):
+        """Requests one page of a collection.
+
+        :param url: The URL of the page, including its query string
+        """
 
-        return r
+        page = self._request(url)
+        if self.metrics is not None:
+            self.metrics.page(url)
+        return page
 
-    def _iterate_pages(self, url, query=''):
+    def _iterate_pages(self, url, query='', workers=None, page_size=None, probe=False):
         """
         Iterates over pages of the HTTP Response.
 
+        The first page tells us how many pages there are. The remaining pages are fetched
+        serially or, if workers is greater than 1, concurrently by a bounded thread pool.
+        Pages are always returned in order, and items that shifted between pages while
+        they were being read are only returned once.
+
+        :param url: The URL of the collection without a query string
+        :param query: Extra query parameters, each one starting with '&'
+        :param workers: The number of threads used to fetch the remaining pages.
+                        Defaults to the page_workers attribute of the session.
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param probe: True if only a few items are expected, which makes 'auto' pick a small page.
+
         :return: a list of requested items from the `content` of the response.
         """
 
-        result = []
+        if workers is None:
+            workers = self.page_workers
+        query = self._limit_query(page_size, probe) + query
 
-        n = 1
-        while True:
-            page = self._request('%s?page=%s%s' % (url, n, query))
-            result += page['content']
-            if n == page['metadata']['totalPages'] or \
-                    page['metadata']['totalElements'] == 0:
-                break
-            n += 1
+        page = self._request_page('%s?page=1%s' % (url, query))
+        pages = [page['content']]
+        total_pages = page['metadata']['totalPages']
 
-        return result
+        if page['metadata']['totalElements'] != 0 and total_pages > 1:
+            def fetch(n):
+                return self._request_page('%s?page=%s%s' % (url, n, query))['content']
+
+            if workers > 1:
+                with ThreadPoolExecutor(max_workers=min(workers, total_pages - 1)) as pool:
+                    pages.extend(pool.map(fetch, range(2, total_pages + 1)))
+            else:
+                pages.extend(fetch(n) for n in range(2, total_pages + 1))
+
+        return list(self._unique(item for content in pages for item in content))
+
+    def _iter_pages(self, url, query='', prefetch=False, page_size=None, probe=False, stream=False):
+        """
+        Generator version of _iterate_pages().
+
+        Items are yielded as soon as their page arrives, so only one page (two with prefetch)
+        is held in memory at a time. With stream=True items are yielded while their page is still
+        downloading, and only one item is held in memory at a time.
+
+        :param url: The URL of the collection without a query string
+        :param query: Extra query parameters, each one starting with '&'
+        :param prefetch: If True, the next page is requested in the background while
+                         the items of the current page are being consumed.
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param probe: True if only a few items are expected, which makes 'auto' pick a small page.
+        :param stream: If True, each page is parsed incrementally. prefetch is ignored.
+
+        :return: a generator of requested items from the `content` of the response.
+        """
+
+        seen = set()
+        query = self._limit_query(page_size, probe) + query
+
+        if stream:
+            n = 1
+            while True:
+                page = {}
+                for item in self._unique(self._stream_page('%s?page=%s%s' % (url, n, query), page), seen):
+                    yield item
+
+                metadata = page.get('metadata') or {}
+                if n >= metadata.get('totalPages', 0) or metadata.get('totalElements') == 0:
+                    return
+                n += 1
+
+        pool = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+        try:
+            n = 1
+            page = self._request_page('%s?page=%s%s' % (url, n, query))
+            while True:
+                last = n >= page['metadata']['totalPages'] or page['metadata']['totalElements'] == 0
+                if not last and pool:
+                    next_page = pool.submit(self._request_page, '%s?page=%s%s' % (url, n + 1, query))
+
+                for item in self._unique(page['content'], seen):
+                    yield item
+
+                if last:
+                    break
+                n += 1
+                page = next_page.result() if pool else self._request_page('%s?page=%s%s' % (url, n, query))
+        finally:
+            if pool:
+                pool.shutdown(wait=False)
+
+    def _stream_page(self, url, page):
+        """Requests one page of a collection and yields the items of its `content` as they are parsed.
+
+        :param url: The URL of the page, including its query string
+        :param page: A dictionary that receives the other top-level keys of the page, e.g. `metadata`.
+                     It is complete once the generator is exhausted.
+        """
+
+        r = self._request(url, stream=True)
+        try:
+            parser = PageParser(r.iter_content(STREAM_CHUNK_SIZE))
+            for item in parser:
+                yield item
+            page.update(parser.page)
+            if self.metrics is not None:
+                self.metrics.page(url)
+        finally:
+            r.close()
+
+    def _limit_query(self, page_size=None, probe=False):
+        """Builds the `limit` query parameter for a paginated request.
+
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param probe: True if only a few items are expected, which makes 'auto' pick a small page.
+
+        :return: '&limit=N', or an empty string to keep the server default
+        """
+
+        if page_size is None:
+            page_size = self.page_size
+        if page_size == PAGE_SIZE_AUTO:
+            page_size = AUTO_PROBE_PAGE_SIZE if probe else AUTO_BULK_PAGE_SIZE
+        if not page_size:
+            return ''
+        return '&limit=%d' % page_size
+
+    @staticmethod
+    def _unique(items, seen=None, key='id'):
+        """Drops repeated items of a collection, keeping the first one seen.
+
+        Items without `key` are always kept.
+
+        :param seen: An optional set of keys already seen, shared between calls.
+        """
+
+        if seen is None:
+            seen = set()
+        for item in items:
+            item_id = item.get(key) if isinstance(item, dict) else None
+            if item_id is not None:
+                if item_id in seen:
+                    continue
+                seen.add(item_id)
+            yield item
 
     def _filter(self, items, name, key='name'):
         """Filter a list of dicts by `key` if `name` is in it."""
         return [i for i in items if name.lower() in i[key].lower()]
 
-    def get_business_groups(self):
+    def _find(self, url, query, match, workers=None, page_size=None):
+        """
+        Searches a collection with an OData query, falling back to a local filter.
+
+        The query is sent to the server so only matching rows cross the wire. If the endpoint
+        rejects it, the whole collection is read instead and the endpoint is remembered so later
+        lookups go straight to the local filter. The local `match` is applied in both cases, which
+        keeps the result identical whether or not the server understood the query.
+
+        :param url: The URL of the collection without a query string
+        :param query: A vralib.Query with the predicates to push down
+        :param match: A callable that returns True for the items to keep
+        :param workers: The number of threads used to fetch pages.
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+
+        :return: a list of the matching items
+        """
+
+        if url not in self._odata_unsupported:
+            try:
+                items = self._iterate_pages(url, query=str(query), workers=workers,
+                                            page_size=page_size, probe=True)
+                return [i for i in items if match(i)]
+            except requests.exceptions.HTTPError as e:
+                if not odata_fallback(self._odata_unsupported, url, getattr(e.response, 'status_code', None)):
+                    raise
+
+        items = self._iterate_pages(url, workers=workers, page_size=page_size)
+        return [i for i in items if match(i)]
+
+    def get_business_groups(self, workers=None, page_size=None, query=None):
         """
         Retrieves a list of all vRA business groups for the currently logged in user.
 
+        :param workers: The number of threads used to fetch pages. Defaults to the page_workers attribute.
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param query: A vralib.Query (or a raw query string) to filter and order the items on the server.
         :return: python dictionary with the JSON response contents.
         """
 
         url = 'https://%s/identity/api/tenants/%s/subtenants' % (
             self.cloudurl, self.tenant)
-        return self._iterate_pages(url)
+        return self._iterate_pages(url, query=str(query or ''), workers=workers, page_size=page_size)
+
+    def iter_business_groups(self, prefetch=False, page_size=None, query=None, stream=False):
+        """
+        Generator version of get_business_groups(). Yields business groups as each page arrives.
+
+        :param prefetch: If True, the next page is fetched while the current one is consumed.
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param query: A vralib.Query (or a raw query string) to filter and order the items on the server.
+        :param stream: If True, items are parsed from the response while it downloads (see vralib.streaming).
+        :return: a generator of business groups.
+        """
+
+        url = 'https://%s/identity/api/tenants/%s/subtenants' % (
+            self.cloudurl, self.tenant)
+        return self._iter_pages(url, query=str(query or ''), prefetch=prefetch, page_size=page_size,
+                                stream=stream)
 
-    def get_business_groups_byuser(self, username, role=None, expand_groups=False):
+    def get_business_groups_byuser(self, username, role=None, expand_groups=False, workers=None,
+                                   page_size=None, query=None):
         """
         Finds business groups that a user belongs to.
         They might be filtered by role and/or expanded to take into account SSO/custom groups that the user belongs to.
@@ -240,29 +724,66 @@ class Session(object):
             `CSP_CONSUMER_WITH_SHARED_ACCESS` for Shared Access User,
             `CSP_CONSUMER` for Basic User.
         :param expand_groups: True to recursively expand groups
+        :param workers: The number of threads used to fetch pages. Defaults to the page_workers attribute.
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param query: A vralib.Query (or a raw query string) to filter and order the items on the server.
         :return: python dictionary with the JSON response contents.
         """
 
         url = 'https://%s/identity/api/tenants/%s/principals/%s/subtenants' % (
             self.cloudurl, self.tenant, username)
+        params = self._principal_query(role, expand_groups)
+
+        return self._iterate_pages(url, query=params + str(query or ''), workers=workers, page_size=page_size)
+
+    def iter_business_groups_byuser(self, username, role=None, expand_groups=False, prefetch=False,
+                                    page_size=None, query=None, stream=False):
+        """
+        Generator version of get_business_groups_byuser(). Yields business groups as each page arrives.
+
+        :param username: User Prinical Name for the user, e.g. vrauser@vsphere.local
+        :param role: the role to filter, see get_business_groups_byuser()
+        :param expand_groups: True to recursively expand groups
+        :param prefetch: If True, the next page is fetched while the current one is consumed.
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param query: A vralib.Query (or a raw query string) to filter and order the items on the server.
+        :param stream: If True, items are parsed from the response while it downloads (see vralib.streaming).
+        :return: a generator of business groups.
+        """
+
+        url = 'https://%s/identity/api/tenants/%s/principals/%s/subtenants' % (
+            self.cloudurl, self.tenant, username)
+        params = self._principal_query(role, expand_groups)
+
+        return self._iter_pages(url, query=params + str(query or ''), prefetch=prefetch, page_size=page_size,
+                                stream=stream)
+
+    @staticmethod
+    def _principal_query(role=None, expand_groups=False):
+        """Builds the query parameters for the principal subtenants collection."""
 
         query = ''
         if role is not None:
             query += '&role=%s' % role
         if expand_groups is True:
             query += '&expandGroups=true'
+        return query
 
-        return self._iterate_pages(url, query=query)
-
-    def get_businessgroup_byname(self, name):
+    def get_businessgroup_byname(self, name, workers=None, page_size=None):
         """
         Loop through all vRA business groups until you find the one with the specified name.
         This method allows you to "filter" returned business groups via a partial match.
+
+        The match is sent to the server as an OData $filter. If the server doesn't support it,
+        all business groups are retrieved and filtered locally.
         """
 
-        business_groups = self.get_business_groups()
+        url = 'https://%s/identity/api/tenants/%s/subtenants' % (
+            self.cloudurl, self.tenant)
+        query = Query().contains('name', name)
 
-        return self._filter(business_groups, name)
+        return self._find(url, query, lambda i: name.lower() in i['name'].lower(),
+                          workers=workers, page_size=page_size)
 
     def get_businessgroup_fromid(self, group_id):
         """Lists a business group using the group id.
@@ -285,7 +806,8 @@ class Session(object):
             self.cloudurl, self.tenant, group_id)
         return self._request(url, request_method='DELETE')
 
-    def get_entitled_catalog_items(self, service_id=None, on_behalf_of=None, subtenant_id=None):
+    def get_entitled_catalog_items(self, service_id=None, on_behalf_of=None, subtenant_id=None, workers=None,
+                                   page_size=None, query=None):
         """
         Deprecated since version 7.5.
         Get a ConsumerEntitledCatalogItem by its unique Id.
@@ -305,24 +827,46 @@ class Session(object):
                              to use when the intention is to request on behalf of someone else
         :param subtenant_id: optional query parameter which dictates if the output should be filtered
                              for given subtenant only
+        :param workers:      the number of threads used to fetch pages. Defaults to the page_workers attribute.
+        :param page_size:    items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param query:        a vralib.Query (or a raw query string) to filter and order the items on the server.
 
         :return: python dictionary with the JSON response contents.
         """
 
         # TODO add a deprecation warning
         url = 'https://%s/catalog-service/api/consumer/entitledCatalogItems' % self.cloudurl
+        params = self._catalog_query(service_id, on_behalf_of, subtenant_id)
 
-        query = ''
-        if service_id is not None:
-            query += '&serviceId=%s' % service_id
-        if on_behalf_of is not None:
-            query += '&onBehalfOf=%s' % on_behalf_of
-        if subtenant_id is not None:
-            query += '&subtenantId=%s' % subtenant_id
+        return self._iterate_pages(url, query=params + str(query or ''), workers=workers, page_size=page_size)
 
-        return self._iterate_pages(url, query=query)
+    def iter_entitled_catalog_items(self, service_id=None, on_behalf_of=None, subtenant_id=None, prefetch=False,
+                                    page_size=None, query=None, stream=False):
+        """
+        Generator version of get_entitled_catalog_items(). Yields catalog items as each page arrives.
 
-    def get_entitled_catalog_item_views(self, service_id=None, on_behalf_of=None, subtenant_id=None):
+        :param service_id:   optional query parameter to filter the returned Catalog Items
+                             by one specific Service
+        :param on_behalf_of: optional query parameter providing the value of the user Id
+                             to use when the intention is to request on behalf of someone else
+        :param subtenant_id: optional query parameter which dictates if the output should be filtered
+                             for given subtenant only
+        :param prefetch:     if True, the next page is fetched while the current one is consumed.
+        :param page_size:    items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param query:        a vralib.Query (or a raw query string) to filter and order the items on the server.
+        :param stream:       if True, items are parsed from the response while it downloads (see vralib.streaming).
+
+        :return: a generator of catalog items.
+        """
+
+        url = 'https://%s/catalog-service/api/consumer/entitledCatalogItems' % self.cloudurl
+        params = self._catalog_query(service_id, on_behalf_of, subtenant_id)
+
+        return self._iter_pages(url, query=params + str(query or ''), prefetch=prefetch, page_size=page_size,
+                                stream=stream)
+
+    def get_entitled_catalog_item_views(self, service_id=None, on_behalf_of=None, subtenant_id=None, workers=None,
+                                        page_size=None, query=None):
         """
         Get all ConsumerEntitledCatalogItemView for the current user.
         ConsumerEntitledCatalogItemView are basically catalog items:
@@ -341,11 +885,46 @@ class Session(object):
                              to use when the intention is to request on behalf of someone else
         :param subtenant_id: optional query parameter which dictates if the output should be filtered
                              for given subtenant only
+        :param workers:      the number of threads used to fetch pages. Defaults to the page_workers attribute.
+        :param page_size:    items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param query:        a vralib.Query (or a raw query string) to filter and order the items on the server.
 
         :return: python dictionary with the JSON response contents.
         """
 
         url = 'https://%s/catalog-service/api/consumer/entitledCatalogItemViews' % self.cloudurl
+        params = self._catalog_query(service_id, on_behalf_of, subtenant_id)
+
+        return self._iterate_pages(url, query=params + str(query or ''), workers=workers, page_size=page_size)
+
+    def iter_entitled_catalog_item_views(self, service_id=None, on_behalf_of=None, subtenant_id=None,
+                                         prefetch=False, page_size=None, query=None, stream=False):
+        """
+        Generator version of get_entitled_catalog_item_views(). Yields catalog item views as each page arrives.
+
+        :param service_id:   optional query parameter to filter the returned Catalog Items
+                             by one specific Service
+        :param on_behalf_of: optional query parameter providing the value of the user Id
+                             to use when the intention is to request on behalf of someone else
+        :param subtenant_id: optional query parameter which dictates if the output should be filtered
+                             for given subtenant only
+        :param prefetch:     if True, the next page is fetched while the current one is consumed.
+        :param page_size:    items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param query:        a vralib.Query (or a raw query string) to filter and order the items on the server.
+        :param stream:       if True, items are parsed from the response while it downloads (see vralib.streaming).
+
+        :return: a generator of catalog item views.
+        """
+
+        url = 'https://%s/catalog-service/api/consumer/entitledCatalogItemViews' % self.cloudurl
+        params = self._catalog_query(service_id, on_behalf_of, subtenant_id)
+
+        return self._iter_pages(url, query=params + str(query or ''), prefetch=prefetch, page_size=page_size,
+                                stream=stream)
+
+    @staticmethod
+    def _catalog_query(service_id=None, on_behalf_of=None, subtenant_id=None):
+        """Builds the query parameters for the entitled catalog item collections."""
 
         query = ''
         if service_id is not None:
@@ -354,10 +933,9 @@ class Session(object):
             query += '&onBehalfOf=%s' % on_behalf_of
         if subtenant_id is not None:
             query += '&subtenantId=%s' % subtenant_id
+        return query
 
-        return self._iterate_pages(url, query=query)
-
-    def get_catalogitem_byname(self, name, catalog=False):
+    def get_catalogitem_byname(self, name, catalog=False, workers=None, page_size=None):
         """Loop through catalog items until you find the one with the specified name.        
 
         This method allows you to "filter" returned catalog items via a partial match.
@@ -378,22 +956,38 @@ class Session(object):
 
         catalog_offerings = vra.get_catalogitem_byname(name='cent', vra.get_entitled_catalog_items())
 
+        Without a catalog the match is sent to the server as an OData $filter. If the server doesn't support it,
+        all entitled catalog items are retrieved and filtered locally.
+
+        With a vralib.CatalogIndex as the catalog the lookup is answered by the index without any request.
+        The index must hold entitled catalog items (views=False), so the results have the usual layout:
+
+        catalog_offerings = vra.get_catalogitem_byname(name='cent', catalog=vralib.CatalogIndex(vra))
+
         :param name: A required string that will be used to filter the return to items that contain the string.
-        :param catalog: An optional dictionary of all of the catalog items available to the user.
+        :param catalog: An optional dictionary of all of the catalog items available to the user,
+                        or a vralib.CatalogIndex.
+        :param workers: The number of threads used to fetch pages. Defaults to the page_workers attribute.
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
 
         :return: Returns a list of dictionaries that contain the catalog item and ID
         """
 
-        if not catalog:
-            catalog = self.get_entitled_catalog_items()
+        if isinstance(catalog, CatalogIndex):
+            if catalog.views:
+                raise ValueError('get_catalogitem_byname() returns entitled catalog items, so it needs a CatalogIndex '
+                                 'built with views=False. Use catalog.search() to look catalog item views up.')
+            return catalog.search(name)
 
-        result = []
+        def match(i):
+            return name.lower() in i['catalogItem']['name'].lower()
 
-        for i in catalog:
-            if name.lower() in i['catalogItem']['name'].lower():
-                result.append(i)
+        if not catalog:
+            url = 'https://%s/catalog-service/api/consumer/entitledCatalogItems' % self.cloudurl
+            query = Query().contains('catalogItem/name', name)
+            return self._find(url, query, match, workers=workers, page_size=page_size)
 
-        return result
+        return [i for i in catalog if match(i)]
 
     def get_catalogitem_byid(self, catalog_id):
         """Retrieves a specific catalog item by ID.
@@ -482,25 +1076,84 @@ class Session(object):
             self.cloudurl, catalogitem)
         return self._request(url, request_method="POST", payload=payload)
 
-    def get_eventbroker_events(self):
+    def request_items(self, specs, workers=8):
+        """Requests many items from the vRealize catalog at once.
+
+        Basic usage:
+
+        results = vra.request_items([
+            {'catalogitem': '0ebbcf20-abdf-4663-a40c-1e50e7340190', 'overrides': {'description': 'web-01'}},
+            {'catalogitem': '0ebbcf20-abdf-4663-a40c-1e50e7340190', 'overrides': {'description': 'web-02'}},
+        ], workers=16)
+
+        The template of each catalog item is fetched once and patched with the overrides of each request.
+        See vralib.BulkProvisioner for details.
+
+        :param specs: An iterable of dicts with a 'catalogitem' id and optional 'overrides' for its template
+        :param workers: The maximum number of requests submitted at the same time
+        :return: A list of vralib.provisioning.ProvisioningResult, one per spec and in the same order.
+                 Failed requests have their exception in `error` and don't stop the others.
+        """
+
+        return BulkProvisioner(self, workers=workers).submit(specs)
+
+    def get_eventbroker_events(self, workers=None, page_size=None, query=None):
         """Retrieves events from Event Broker.
 
+        :param workers: The number of threads used to fetch pages. Defaults to the page_workers attribute.
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param query: A vralib.Query (or a raw query string) to filter and order the items on the server.
+
         :return:
         """
 
         # TODO create a handler for the different API verbs this thing needs to support
 
         url = 'https://%s/event-broker-service/api/events' % self.cloudurl
-        return self._iterate_pages(url)
+        return self._iterate_pages(url, query=str(query or ''), workers=workers, page_size=page_size)
+
+    def iter_eventbroker_events(self, prefetch=False, page_size=None, query=None, stream=False):
+        """Generator version of get_eventbroker_events(). Yields events as each page arrives.
+
+        :param prefetch: If True, the next page is fetched while the current one is consumed.
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param query: A vralib.Query (or a raw query string) to filter and order the items on the server.
+        :param stream: If True, items are parsed from the response while it downloads (see vralib.streaming).
+
+        :return: a generator of events.
+        """
+
+        url = 'https://%s/event-broker-service/api/events' % self.cloudurl
+        return self._iter_pages(url, query=str(query or ''), prefetch=prefetch, page_size=page_size,
+                                stream=stream)
 
-    def get_requests(self):
+    def get_requests(self, workers=None, page_size=None, query=None):
         """Retrieves all requests.
 
+        :param workers: The number of threads used to fetch pages. Defaults to the page_workers attribute.
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param query: A vralib.Query (or a raw query string) to filter and order the items on the server.
+
         :return:
         """
 
         url = 'https://%s/catalog-service/api/consumer/requests' % self.cloudurl
-        return self._iterate_pages(url)
+        return self._iterate_pages(url, query=str(query or ''), workers=workers, page_size=page_size)
+
+    def iter_requests(self, prefetch=False, page_size=None, query=None, stream=False):
+        """Generator version of get_requests(). Yields requests as each page arrives.
+
+        :param prefetch: If True, the next page is fetched while the current one is consumed.
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param query: A vralib.Query (or a raw query string) to filter and order the items on the server.
+        :param stream: If True, items are parsed from the response while it downloads (see vralib.streaming).
+
+        :return: a generator of requests.
+        """
+
+        url = 'https://%s/catalog-service/api/consumer/requests' % self.cloudurl
+        return self._iter_pages(url, query=str(query or ''), prefetch=prefetch, page_size=page_size,
+                                stream=stream)
 
     def get_request(self, request_id):
         """Retrieves a requests specified by request_id.
@@ -514,6 +1167,21 @@ class Session(object):
             self.cloudurl, request_id)
         return self._request(url)
 
+    @property
+    def waiter(self):
+        """The vralib.RequestWaiter of this session, created on first use.
+
+        Basic usage:
+
+        build = vra.request_item(catalog_item_id)
+        request = vra.waiter.watch(build['id']).result()
+        """
+
+        with self._waiter_lock:
+            if self._waiter is None:
+                self._waiter = RequestWaiter(self)
+            return self._waiter
+
     def get_requests_forms_details(self, resource_id):
         """Retrieves some request details on an individual request.
 
@@ -540,14 +1208,33 @@ class Session(object):
             self.cloudurl, request_id)
         return self._request(url)
 
-    def get_consumer_resources(self):
+    def get_consumer_resources(self, workers=None, page_size=None, query=None):
         """Retrieves a list of all the provisioned items.
 
+        :param workers: The number of threads used to fetch pages. Defaults to the page_workers attribute.
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param query: A vralib.Query (or a raw query string) to filter and order the items on the server.
+
         :return:
         """
 
         url = 'https://%s/catalog-service/api/consumer/resources' % self.cloudurl
-        return self._iterate_pages(url)
+        return self._iterate_pages(url, query=str(query or ''), workers=workers, page_size=page_size)
+
+    def iter_consumer_resources(self, prefetch=False, page_size=None, query=None, stream=False):
+        """Generator version of get_consumer_resources(). Yields provisioned items as each page arrives.
+
+        :param prefetch: If True, the next page is fetched while the current one is consumed.
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute.
+        :param query: A vralib.Query (or a raw query string) to filter and order the items on the server.
+        :param stream: If True, items are parsed from the response while it downloads (see vralib.streaming).
+
+        :return: a generator of provisioned items.
+        """
+
+        url = 'https://%s/catalog-service/api/consumer/resources' % self.cloudurl
+        return self._iter_pages(url, query=str(query or ''), prefetch=prefetch, page_size=page_size,
+                                stream=stream)
 
     def get_consumer_resource(self, resource_id):
         """Retrieves a consumer resource by resource_id.
@@ -559,15 +1246,20 @@ class Session(object):
             self.cloudurl, resource_id)
         return self._request(url)
 
-    def get_consumer_resource_byname(self, name):
+    def get_consumer_resource_byname(self, name, workers=None, page_size=None):
         """
         Loop through all consumer resources until you find the one with the specified name.
         This method allows you to "filter" returned consumer resources via a partial match.
+
+        The match is sent to the server as an OData $filter. If the server doesn't support it,
+        all consumer resources are retrieved and filtered locally.
         """
 
-        consumer_resources = self.get_consumer_resources()
+        url = 'https://%s/catalog-service/api/consumer/resources' % self.cloudurl
+        query = Query().contains('name', name)
 
-        return self._filter(consumer_resources, name)
+        return self._find(url, query, lambda i: name.lower() in i['name'].lower(),
+                          workers=workers, page_size=page_size)
 
     def get_reservations_info(self):
         """
@@ -0,0 +1,96 @@
+"""
+
+    JSON codecs used to encode request bodies and decode responses.
+
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JSONCodec(object):
+    """The standard library json module. Always available."""
+
+    name = 'json'
+
+    @staticmethod
+    def loads(data):
+        return json.loads(data)
+
+    @staticmethod
+    def dumps(obj):
+        return json.dumps(obj)
+
+
+class OrjsonCodec(object):
+    """orjson, the fastest decoder available. dumps() returns bytes, which requests and aiohttp send as is."""
+
+    name = 'orjson'
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError('OrjsonCodec requires orjson. Install it with: pip install orjson')
+        self.loads = orjson.loads
+        self.dumps = orjson.dumps
+
+
+class UjsonCodec(object):
+    """ujson, used when orjson is not installed."""
+
+    name = 'ujson'
+
+    def __init__(self):
+        if ujson is None:
+            raise ImportError('UjsonCodec requires ujson. Install it with: pip install ujson')
+        self.loads = ujson.loads
+        self.dumps = ujson.dumps
+
+
+# Codecs by name, in order of preference
+CODECS = (
+    ('orjson', OrjsonCodec),
+    ('ujson', UjsonCodec),
+    ('json', JSONCodec),
+)
+
+
+def available_codecs():
+    """
+    :return: The names of the codecs that can be used here, fastest first
+    """
+
+    available = []
+    for name, codec in CODECS:
+        try:
+            codec()
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+
+def get_codec(codec=None):
+    """Resolves the codec argument of a Session.
+
+    :param codec: None or 'auto' for the fastest codec installed, the name of a codec ('orjson', 'ujson'
+                  or 'json'), or an object with loads() and dumps() methods, which is returned as is
+
+    :return: An object with loads() and dumps() methods
+    """
+
+    if codec is None or codec == 'auto':
+        return dict(CODECS)[available_codecs()[0]]()
+    if isinstance(codec, str):
+        if codec not in dict(CODECS):
+            raise ValueError('Unknown JSON codec %s, use one of: %s' % (codec, ', '.join(dict(CODECS))))
+        return dict(CODECS)[codec]()
+    return codec
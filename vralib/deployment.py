@@ -1,5 +1,15 @@
 # TODO implement logging
 
+import time
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from vralib.query import Query, odata_fallback
+from vralib.vraexceptions import NotFoundError
+
 __author__ = 'Russell Pope'
 
 
@@ -46,7 +56,7 @@ class Deployment(object):
             self.parent_resource = deployment['parentResourceRef']
 
     @classmethod
-    def fromid(cls, session, resource_id):
+    def fromid(cls, session, resource_id, from_views=False):
         """Creates an instance based on the GUID in vRA.
 
         If the deployment has children it will attempt to resolve them
@@ -54,6 +64,10 @@ class Deployment(object):
 
         :param session:
         :param resource_id:
+        :param from_views: If True the children are built from the resourceViews of the deployment (see fromview),
+                           which costs one request per nested deployment, and their operations are read when
+                           first used. If False every child is loaded with fromid, which costs at least two
+                           requests per child.
 
         :return:
         """
@@ -61,11 +75,138 @@ class Deployment(object):
         # Grab a dict with the given deployment in there and use as input
         deployment = session.get_consumer_resource(resource_id=resource_id)
         # Store operations and deployment children in a list
-        operations = []
+        operations = Deployment._get_operations(session, resource_id, deployment)
         deployment_children = []
 
+        # See if we have children and if we do create an instance of the appropriate class
+        if deployment['hasChildren'] == True:
+            children = Deployment._get_children(session, resource_id)
+            for child in children:
+                child_class = RESOURCE_CLASSES.get(child['resourceType'])
+                if child_class and from_views:
+                    deployment_children.append(child_class.fromview(session, child))
+                elif child_class:
+                    deployment_children.append(child_class.fromid(session, child['resourceId']))
+
+        return cls(session, deployment, operations, deployment_children)
+
+    @classmethod
+    def fromids(cls, session, resource_ids, workers=8, page_size=None, batch_size=40):
+        """Creates instances for many resources at once.
+
+        The resources are read with batched `$filter=id eq ... or ...` requests, and their children one
+        level at a time with batched parentResource filters (see DeploymentLoader), so the number of
+        requests grows with the number of pages rather than with the number of resources.
+
+        Basic usage:
+
+        deployments = vralib.Deployment.fromids(vra, resource_ids)
+
+        :param session:
+        :param resource_ids: An iterable of resource GUIDs
+        :param workers: The maximum number of requests sent at the same time
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute of the session.
+        :param batch_size: The number of resource ids sent in one $filter
+
+        :return: A list of instances in the order of resource_ids, each of the class registered for its type in
+                 RESOURCE_CLASSES or else cls. Resources that don't exist are left out.
+        """
+
+        loader = DeploymentLoader(session, workers=workers, page_size=page_size, batch_size=batch_size)
+        return loader.load_many(resource_ids, cls)
+
+    @classmethod
+    def from_query(cls, session, query, workers=8, page_size=None, batch_size=40):
+        """Creates instances for the consumer resources matching a query, like fromids().
+
+        Basic usage:
+
+        query = vralib.Query().eq('resourceType/id', 'composition.resource.type.deployment')
+        deployments = vralib.Deployment.from_query(vra, query)
+
+        :param session:
+        :param query: A vralib.Query (or a raw query string) selecting consumer resources
+        :param workers: The maximum number of requests sent at the same time
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute of the session.
+        :param batch_size: The number of parent ids sent in one $filter when reading children
+
+        :return: A list of instances, each of the class registered for its type in RESOURCE_CLASSES or else cls
+        """
+
+        loader = DeploymentLoader(session, workers=workers, page_size=page_size, batch_size=batch_size)
+        return loader.load_query(query, cls)
+
+    @classmethod
+    def fromview(cls, session, view, deployment_children=None):
+        """Creates an instance from a resourceView, as returned for the children of a deployment,
+        without requesting the resource again.
+
+        A view only carries part of a consumer resource: deployment_json has no resourceData, and
+        its resourceTypeRef label is the type id. The day 2 operations are taken from the `operations`
+        of the view when it has them, otherwise they are read from the consumer resource the first time
+        the operations attribute is used. If the resource has children and deployment_children is None,
+        they are built from one more request for their views.
+
+        Basic usage:
+
+        view = vra._request('https://%s/catalog-service/api/consumer/resourceViews/%s' % (vra.cloudurl, resource_id))
+        vm = vralib.VirtualMachine.fromview(vra, view)
+
+        :param session:
+        :param view: A resourceView dict
+        :param deployment_children: The already built children of the resource, if any
+
+        :return:
+        """
+
+        resource_id = view['resourceId']
+        deployment = Deployment._resource_from_view(view)
+        operations = None
+        if view.get('operations'):
+            operations = Deployment._get_operations(session, resource_id, view)
+
+        if deployment_children is None:
+            deployment_children = []
+            if view.get('hasChildren'):
+                for child in Deployment._get_children(session, resource_id):
+                    child_class = RESOURCE_CLASSES.get(child['resourceType'])
+                    if child_class:
+                        deployment_children.append(child_class.fromview(session, child))
+
+        return cls(session, deployment, operations, deployment_children)
+
+    @staticmethod
+    def _resource_from_view(view):
+        """Maps the fields of a resourceView to the layout of a consumer resource, which is what __init__ reads."""
+
+        deployment = {
+            'id': view['resourceId'],
+            'resourceTypeRef': {'id': view['resourceType'], 'label': view['resourceType']},
+            'description': view.get('description'),
+            'name': view['name'],
+            'requestId': view.get('requestId'),
+            'organization': {'subtenantRef': view.get('businessGroupId'),
+                             'subtenantLabel': view.get('businessGroupName'),
+                             'tenantRef': view.get('tenantId')},
+            'dateCreated': view.get('dateCreated'),
+            'owners': view.get('owners'),
+            'lease': view.get('lease'),
+            'hasChildren': view.get('hasChildren', False),
+            'status': view.get('status'),
+            'data': view.get('data', {}),
+        }
+        if view.get('parentResourceId'):
+            deployment['parentResourceRef'] = {'id': view['parentResourceId']}
+        return deployment
+
+    @staticmethod
+    def _get_operations(session, resource_id, deployment):
+        """Builds the list of day 2 operations, with their template and request URLs, for a consumer resource."""
+
+        operations = []
+        base_url = 'https://%s/catalog-service/api/consumer/resources' % session.cloudurl
+
         for operation in deployment['operations']:
-            base_url = 'https://%s/catalog-service/api/consumer/resources' % session.cloudurl
             operations.append({
                 'name': operation['name'],
                 'description': operation['description'],
@@ -74,34 +215,27 @@ class Deployment(object):
                 'request_url': '%s/%s/actions/%s/requests' % (base_url, resource_id, operation['id']),
             })
 
-        # See if we have children and if we do create an instance of the appropriate class
-        if deployment['hasChildren'] == True:
-            children = Deployment._get_children(session, resource_id)
-            for child in children:
-                if child['resourceType'] == 'Infrastructure.Virtual':
-                    deployment_children.append(
-                        VirtualMachine.fromid(session, child['resourceId']))
-                if child['resourceType'] == 'Infrastructure.Network.LoadBalancer.NSX':
-                    deployment_children.append(
-                        LoadBalancer.fromid(session, child['resourceId']))
-                if child['resourceType'] == 'Infrastructure.Network.Gateway.NSX.Edge':
-                    deployment_children.append(
-                        Edge.fromid(session, child['resourceId']))
-                if child['resourceType'] == 'Infrastructure.Network.Network.Existing':
-                    deployment_children.append(
-                        Network.fromid(session, child['resourceId']))
-                if child['resourceType'] == 'composition.resource.type.deployment':
-                    deployment_children.append(
-                        Deployment.fromid(session, child['resourceId']))
+        return operations
 
-        return cls(session, deployment, operations, deployment_children)
+    @staticmethod
+    def _get_children_url(session):
+        return 'https://%s/catalog-service/api/consumer/resourceViews' % session.cloudurl
 
     @staticmethod
-    def _get_children(session, resource_id):
-        base_url = 'https://%s/catalog-service/api/consumer/resourceViews' % session.cloudurl
-        arguments = "?managedOnly=false&withExtendedData=true&withOperations=true&$filter=parentResource eq '%s'" % resource_id
-        children = session._request(url=base_url+arguments)
-        return children['content']
+    def _get_children_query(resource_ids):
+        if isinstance(resource_ids, str):
+            resource_ids = [resource_ids]
+        arguments = '&managedOnly=false&withExtendedData=true&withOperations=true'
+        return arguments + str(Query().any_of('parentResource', resource_ids))
+
+    @staticmethod
+    def _get_children(session, resource_ids, workers=None, page_size=None):
+        """Retrieves the resourceViews of the children of one resource, or of a list of resources,
+        reading every page."""
+
+        return session._iterate_pages(Deployment._get_children_url(session),
+                                      query=Deployment._get_children_query(resource_ids),
+                                      workers=workers, page_size=page_size)
 
     def scale_out(self, new_value):
         """Currently this only works with a single tier app.
@@ -116,20 +250,57 @@ class Deployment(object):
         # TODO need to re-write this since we can now have access to individual children
         # TODO maybe make a generic day 2 operation with **kwargs to drive it?
 
-        template = None
+        o = self.require_operation('Scale Out')
+        template = self.session._request(url=o['template_url'])
+        for key, value in template['data'].items():
+            for inner_key, inner_value in template['data'][key]['data'].items():
+                template['data'][key]['data'][inner_key]['data']['_cluster'] = new_value
+
+        scale_out = self.session._request(
+            url=o['request_url'], request_method='POST', payload=template)
+        return scale_out
 
-        for operation in self.operations:
-            if operation['name'] == 'Scale Out':
-                template = self.session._request(url=operation['template_url'])
-                for key, value in template['data'].items():
-                    for inner_key, inner_value in template['data'][key]['data'].items():
-                        template['data'][key]['data'][inner_key]['data']['_cluster'] = new_value
+    @property
+    def operations(self):
+        """The day 2 operations of the resource, a list of dicts with a name, id, template_url and request_url.
 
-        for o in self.operations:
-            if o['name'] == 'Scale Out':
-                scale_out = self.session._request(
-                    url=o['request_url'], request_method='POST', payload=template)
-                return scale_out
+        Instances built from a resourceView without operations read them from the consumer resource here,
+        the first time they are needed.
+        """
+
+        if self._operations is None:
+            self._load_operations()
+        return self._operations
+
+    @operations.setter
+    def operations(self, operations):
+        self._operations = operations
+        self._operations_by_name = None if operations is None else dict((o['name'], o) for o in operations)
+
+    def _load_operations(self):
+        resource = self.session.get_consumer_resource(resource_id=self.resource_id)
+        self.operations = Deployment._get_operations(self.session, self.resource_id, resource)
+
+    def get_operation(self, operation):
+        """
+        :param operation: The name of an operation, e.g. 'Power Off'
+
+        :return: The operation dict from the operations attribute, or None if the resource doesn't offer it
+        """
+
+        if self._operations_by_name is None:
+            self._load_operations()
+        return self._operations_by_name.get(operation)
+
+    def require_operation(self, operation):
+        """Like get_operation(), but raises vralib.vraexceptions.NotFoundError if the resource doesn't offer it."""
+
+        o = self.get_operation(operation)
+        if o is None:
+            raise NotFoundError('%s %s has no operation %s. Its operations are: %s' % (
+                self.resource_type.get('id'), self.resource_id, operation,
+                ', '.join(sorted(self._operations_by_name)) or 'none'))
+        return o
 
     def get_operation_template(self, operation):
         """Used to collect a template for use in the execute_operation() method. The template should be modified before
@@ -139,11 +310,11 @@ class Deployment(object):
         operations attribute
 
         :return: A Python dictionary that may be modified and used in the execute_operation() method
+        :raises NotFoundError: if the resource doesn't offer the operation
         """
 
-        for o in self.operations:
-            if o['name'] == operation:
-                return self.session._request(url=o['template_url'])
+        o = self.require_operation(operation)
+        return self.session._request(url=o['template_url'])
 
     def execute_operation(self, operation, payload):
         """Execute an operation on a resource.
@@ -153,17 +324,16 @@ class Deployment(object):
         :param payload: a template from the get_operation_template method
 
         :return: The ID of a request for the operation
+        :raises NotFoundError: if the resource doesn't offer the operation
         """
-        # TODO See if there's a better way to find the operation to improve performance
-        for o in self.operations:
-            if o['name'] == operation:
-                response = self.session._request(
-                    url=o['request_url'], request_method='POST', payload=payload, content_only=False)
-                location = response.headers.get('Location', None)
-                if location:
-                    request_id = location.split(
-                        'https://%s/catalog-service/api/consumer/requests/' % self.session.cloudurl)[1]
-                    return self.session.get_request(request_id)
+        o = self.require_operation(operation)
+        response = self.session._request(
+            url=o['request_url'], request_method='POST', payload=payload, content_only=False)
+        location = response.headers.get('Location', None)
+        if location:
+            request_id = location.split(
+                'https://%s/catalog-service/api/consumer/requests/' % self.session.cloudurl)[1]
+            return self.session.get_request(request_id)
 
     def destroy(self, force=False):
         """Used to destroy the deployment. The deployment may be force destroyed if it failed previously.
@@ -283,3 +453,175 @@ class Edge(Deployment):
 
 class Network(Deployment):
     pass
+
+
+LevelTiming = namedtuple('LevelTiming', ['level', 'parents', 'resources', 'seconds'])
+LevelTiming.__doc__ = """How long a DeploymentLoader spent on one level of a deployment tree.
+
+Level 0 is the deployment itself. parents is the number of resources whose children were read at this
+level and resources the number of resources found.
+"""
+
+
+class DeploymentLoader(object):
+    """
+    Loads whole deployment trees breadth-first.
+
+    Every level of the tree is read at once: the children of the resources of a level are requested
+    in batches, with one `parentResource eq ... or ...` filter per batch_size parents, by a bounded
+    thread pool that reads every page. Children are built from their resourceViews (see
+    Deployment.fromview), so their operations are read from the consumer resource when first used
+    unless the views carry them. The time spent on each level is kept in `levels`, which shows where large
+    nested compositions spend their time.
+
+    load_many() and load_query() read many deployments the same way, so the number of requests grows
+    with the number of pages rather than with the number of deployments.
+
+    Basic usage:
+
+    loader = vralib.DeploymentLoader(vra, workers=16)
+    deployment = loader.load('28e735b6-04d3-46d1-bf4e-ca7210b2cba4')
+    for level in loader.levels:
+        print(level.level, level.resources, level.seconds)
+
+    deployments = loader.load_query(vralib.Query().eq('resourceType/id', 'composition.resource.type.deployment'))
+    """
+
+    def __init__(self, session, workers=8, page_size=None, batch_size=40):
+        """
+        :param session: A vralib.Session
+        :param workers: The maximum number of requests sent at the same time
+        :param page_size: Items per page: a number, 'auto' or None. Defaults to the page_size attribute of the session.
+        :param batch_size: The number of resource ids sent in one $filter
+        """
+
+        self.session = session
+        self.workers = workers
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.levels = []
+
+    def load(self, resource_id, cls=Deployment):
+        """
+        :param resource_id: The GUID of the deployment
+        :param cls: The class to build, Deployment or one of its subclasses
+
+        :return: An instance of cls with its deployment_children resolved at every depth
+        """
+
+        start = time.perf_counter()
+        deployment = self.session.get_consumer_resource(resource_id=resource_id)
+        self.levels = [LevelTiming(0, 0, 1, time.perf_counter() - start)]
+        return self._build([deployment], cls, by_type=False)[0]
+
+    def load_many(self, resource_ids, cls=Deployment):
+        """
+        :param resource_ids: An iterable of resource GUIDs
+        :param cls: The class to build for resources whose type is not in RESOURCE_CLASSES
+
+        :return: A list of instances in the order of resource_ids. Resources that don't exist are left out.
+        """
+
+        resource_ids = list(resource_ids)
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            found = {}
+            for resources in pool.map(self._get_resources, self._batches(resource_ids)):
+                found.update((r['id'], r) for r in resources)
+
+        resources = [found[i] for i in resource_ids if i in found]
+        self.levels = [LevelTiming(0, 0, len(resources), time.perf_counter() - start)]
+        return self._build(resources, cls)
+
+    def load_query(self, query, cls=Deployment):
+        """
+        :param query: A vralib.Query (or a raw query string) selecting consumer resources
+        :param cls: The class to build for resources whose type is not in RESOURCE_CLASSES
+
+        :return: A list of instances of the matching resources
+        """
+
+        start = time.perf_counter()
+        resources = self.session.get_consumer_resources(workers=self.workers, page_size=self.page_size,
+                                                        query=query)
+        self.levels = [LevelTiming(0, 0, len(resources), time.perf_counter() - start)]
+        return self._build(resources, cls)
+
+    def _batches(self, items):
+        return [items[n:n + self.batch_size] for n in range(0, len(items), self.batch_size)]
+
+    def _get_resources(self, resource_ids):
+        """Retrieves a batch of consumer resources, one request per resource if the endpoint rejects the filter."""
+
+        url = 'https://%s/catalog-service/api/consumer/resources' % self.session.cloudurl
+        if url not in self.session._odata_unsupported:
+            try:
+                return self.session.get_consumer_resources(workers=1, page_size=self.page_size,
+                                                           query=Query().any_of('id', resource_ids))
+            except requests.exceptions.HTTPError as e:
+                if not odata_fallback(self.session._odata_unsupported, url, getattr(e.response, 'status_code', None)):
+                    raise
+
+        resources = []
+        for resource_id in resource_ids:
+            try:
+                resources.append(self.session.get_consumer_resource(resource_id))
+            except requests.exceptions.HTTPError as e:
+                if getattr(e.response, 'status_code', None) != 404:
+                    raise
+        return resources
+
+    def _get_children(self, parent_ids):
+        return Deployment._get_children(self.session, parent_ids, workers=1, page_size=self.page_size)
+
+    def _build(self, resources, cls, by_type=True):
+        """Builds the resources and resolves their children one level at a time.
+
+        :param by_type: If True the class of each resource is looked up in RESOURCE_CLASSES, with cls as a fallback.
+                        If False every resource is an instance of cls.
+        """
+
+        roots = []
+        parents = {}
+        for resource in resources:
+            resource_class = RESOURCE_CLASSES.get(resource['resourceTypeRef']['id'], cls) if by_type else cls
+            operations = Deployment._get_operations(self.session, resource['id'], resource)
+            roots.append(resource_class(self.session, resource, operations, []))
+            if resource.get('hasChildren') == True:
+                parents[resource['id']] = roots[-1]
+
+        level = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while parents:
+                level += 1
+                start = time.perf_counter()
+                found = 0
+                next_parents = {}
+
+                for children in pool.map(self._get_children, self._batches(list(parents))):
+                    for child in children:
+                        child_class = RESOURCE_CLASSES.get(child['resourceType'])
+                        parent = parents.get(child.get('parentResourceId'))
+                        if not child_class or parent is None:
+                            continue
+                        instance = child_class.fromview(self.session, child, [])
+                        parent.deployment_children.append(instance)
+                        found += 1
+                        if child.get('hasChildren'):
+                            next_parents[instance.resource_id] = instance
+
+                self.levels.append(LevelTiming(level, len(parents), found, time.perf_counter() - start))
+                parents = next_parents
+
+        return roots
+
+
+# The classes used for the children of a deployment, by resourceType
+RESOURCE_CLASSES = {
+    'Infrastructure.Virtual': VirtualMachine,
+    'Infrastructure.Network.LoadBalancer.NSX': LoadBalancer,
+    'Infrastructure.Network.Gateway.NSX.Edge': Edge,
+    'Infrastructure.Network.Network.Existing': Network,
+    'composition.resource.type.deployment': Deployment,
+}
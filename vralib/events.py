@@ -0,0 +1,238 @@
+"""
+
+    Follows the Event Broker event log from a checkpoint that survives restarts.
+
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+from vralib.query import Query, odata_fallback
+
+
+class EventTail(object):
+    """
+    Returns each Event Broker event once, newest last, without reading the whole event log on every poll.
+
+    The tail keeps a high-water mark: the timestamp of the newest event returned and the ids of the
+    events with that timestamp. A poll only asks for the events at or after that timestamp, ordered by
+    timestamp, and skips the ids it already returned. If the server rejects the filter, the log is
+    read in full and filtered locally instead.
+
+    With a checkpoint file the mark is written atomically after every poll, so a restarted process
+    carries on where the previous one stopped. The mark only moves past an event once the next one is
+    asked for, so an event being handled when the process dies is returned again after the restart.
+
+    Without a checkpoint, start='latest' skips the events that already happened and start='earliest'
+    returns the whole log first.
+
+    Basic usage:
+
+    tail = vralib.EventTail(vra, checkpoint='/var/lib/automation/events.json')
+    for event in tail.tail(interval=60):
+        handle(event)
+    """
+
+    def __init__(self, session, checkpoint=None, start='latest', query=None, page_size='auto',
+                 timestamp_field='timeStamp'):
+        """
+        :param session: A vralib.Session
+        :param checkpoint: The JSON file the high-water mark is kept in, or None to keep it in memory only
+        :param start: Where to start without a checkpoint: 'latest' or 'earliest'
+        :param query: An optional vralib.Query whose filters are added to every poll, e.g. on eventTopicId
+        :param page_size: Items per page: a number, 'auto' or None
+        :param timestamp_field: The field of the events holding their timestamp
+        """
+
+        if start not in ('latest', 'earliest'):
+            raise ValueError("start must be 'latest' or 'earliest', not %r" % start)
+
+        self.session = session
+        self.checkpoint = os.path.expanduser(checkpoint) if checkpoint else None
+        self.query = query
+        self.page_size = page_size
+        self.timestamp_field = timestamp_field
+        self.timestamp = None
+        self.seen_ids = set()
+        self.url = 'https://%s/event-broker-service/api/events' % session.cloudurl
+        self._stopped = threading.Event()
+
+        if not self._load() and start == 'latest':
+            self._start_at_latest()
+
+    @property
+    def scope(self):
+        return '%s|%s|%s' % (self.session.cloudurl, self.session.tenant, self.session.username)
+
+    def _load(self):
+        """Reads the checkpoint file.
+
+        :return: False if there is no checkpoint yet
+        """
+
+        if not self.checkpoint:
+            return False
+        try:
+            with open(self.checkpoint) as f:
+                state = json.load(f)
+        except (IOError, OSError):
+            return False
+
+        if state.get('scope') != self.scope:
+            raise ValueError('%s holds the checkpoint of %s, not %s' % (self.checkpoint, state.get('scope'),
+                                                                       self.scope))
+        self.timestamp = state.get('timestamp')
+        self.seen_ids = set(state.get('ids') or [])
+        return True
+
+    def save(self):
+        """Writes the high-water mark to the checkpoint file, if there is one."""
+
+        if not self.checkpoint:
+            return
+
+        directory = os.path.dirname(self.checkpoint) or '.'
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+
+        state = {'scope': self.scope, 'timestamp': self.timestamp, 'ids': sorted(self.seen_ids)}
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.events-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp, self.checkpoint)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def _query(self):
+        query = Query()
+        if self.query is not None:
+            query.filters.extend(self.query.filters)
+        return query
+
+    def _start_at_latest(self):
+        newest = None
+        fallback = self.url in self.session._odata_unsupported
+        if not fallback:
+            query = self._query().orderby(self.timestamp_field, descending=True)
+            try:
+                # only the first page, which holds the newest events
+                for event in self.session.iter_eventbroker_events(page_size=1, query=query):
+                    newest = event
+                    break
+            except requests.exceptions.HTTPError as e:
+                if not odata_fallback(self.session._odata_unsupported, self.url,
+                                      getattr(e.response, 'status_code', None)):
+                    raise
+                fallback = True
+
+        if fallback:
+            for event in self._filter_locally(self.session.iter_eventbroker_events(page_size=self.page_size)):
+                newest = event
+
+        if newest is not None:
+            self._advance(newest)
+        self.save()
+
+    def _is_new(self, event):
+        timestamp = event.get(self.timestamp_field)
+        if self.timestamp is None or timestamp is None:
+            return event.get('id') not in self.seen_ids
+        if timestamp != self.timestamp:
+            return timestamp > self.timestamp
+        return event.get('id') not in self.seen_ids
+
+    def _advance(self, event):
+        timestamp = event.get(self.timestamp_field)
+        if timestamp is not None and timestamp != self.timestamp:
+            self.timestamp = timestamp
+            self.seen_ids = set()
+        self.seen_ids.add(event.get('id'))
+
+    def _filter_locally(self, events):
+        """Sorts and filters a full read of the log, for servers without $filter support."""
+
+        if self.query is not None and self.query.filters:
+            raise ValueError('The server does not support $filter, so the query of the tail can\'t be applied')
+        new = [e for e in events if self._is_new(e)]
+        return sorted(new, key=lambda e: e.get(self.timestamp_field) or '')
+
+    def events(self, stream=False):
+        """Yields the events that happened since the last poll, oldest first. The checkpoint is saved when
+        the generator is exhausted or closed.
+
+        :param stream: If True, events are parsed from the responses while they download (see vralib.streaming)
+
+        :return: A generator of events
+        """
+
+        return self._events(stream, stop=None)
+
+    def _events(self, stream, stop):
+        try:
+            for event in self._new_events(stream):
+                yield event
+                self._advance(event)
+                if stop is not None and stop.is_set():
+                    return
+        finally:
+            self.save()
+
+    def _new_events(self, stream):
+        if self.url not in self.session._odata_unsupported:
+            query = self._query()
+            if self.timestamp is not None:
+                query.ge(self.timestamp_field, self.timestamp)
+            query.orderby(self.timestamp_field)
+
+            first = True
+            try:
+                for event in self.session.iter_eventbroker_events(page_size=self.page_size, query=query,
+                                                                  stream=stream):
+                    first = False
+                    if self._is_new(event):
+                        yield event
+                return
+            except requests.exceptions.HTTPError as e:
+                # a server rejecting the filter does so on the first page
+                if not first or not odata_fallback(self.session._odata_unsupported, self.url,
+                                                   getattr(e.response, 'status_code', None)):
+                    raise
+
+        for event in self._filter_locally(self.session.iter_eventbroker_events(page_size=self.page_size,
+                                                                               stream=stream)):
+            yield event
+
+    def poll(self):
+        """
+        :return: A list of the events that happened since the last poll, oldest first
+        """
+
+        return list(self.events())
+
+    def tail(self, interval=60, stream=False):
+        """Yields new events as they happen, polling every `interval` seconds, until stop() is called.
+
+        :param interval: Seconds between polls
+        :param stream: If True, events are parsed from the responses while they download
+
+        :return: A generator of events
+        """
+
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            started = time.time()
+            for event in self._events(stream, stop=self._stopped):
+                yield event
+            self._stopped.wait(max(0, interval - (time.time() - started)))
+
+    def stop(self):
+        """Makes tail() return after the event being handled, or at once while it waits for the next poll."""
+
+        self._stopped.set()
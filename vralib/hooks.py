@@ -0,0 +1,150 @@
+"""
+
+    Callbacks fired around the requests of a Session, for tracing and profiling.
+
+"""
+
+import threading
+import time
+
+from vralib.metrics import endpoint_template
+
+
+# The points of a request where hooks are fired, in order
+HOOK_EVENTS = ('before_send', 'after_headers', 'after_body', 'after_decode', 'error')
+
+
+class RequestTrace(object):
+    """
+    What is known about a request when a hook is fired. The same object is passed to every hook of
+    a request, so hooks may set their own attributes on it, e.g. a tracing span, in before_send and
+    read them back in a later hook.
+
+    Times are seconds measured with time.perf_counter(). `seconds` is the time since the request
+    started, including earlier attempts, when the hook was fired. `cached` is True when the response
+    was served from the cache of the session, without reaching the server.
+    """
+
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint_template(url)
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        self.attempt = 0
+        self.status = None
+        self.headers = None
+        self.headers_seconds = None
+        self.body_seconds = None
+        self.size = None
+        self.decode_seconds = None
+        self.error = None
+        self.cached = False
+        self._sent = None
+
+    def sending(self, attempt):
+        self.attempt = attempt
+        self._sent = time.perf_counter()
+
+    def received(self, response):
+        self.status = response.status_code
+        self.headers = response.headers
+        self.headers_seconds = time.perf_counter() - self._sent
+
+    def read(self, response):
+        body_started = time.perf_counter()
+        self.size = len(response.content)
+        self.body_seconds = time.perf_counter() - body_started
+
+    def __repr__(self):
+        return '<RequestTrace %s %s %s>' % (self.method, self.endpoint, self.status)
+
+
+class Hooks(object):
+    """
+    The hooks registered on a Session.
+
+    A hook is a callable taking a vralib.hooks.RequestTrace. It is fired for every request whose
+    endpoint template (e.g. catalog-service/api/consumer/resourceViews/{id}) matches its endpoint
+    filter: None matches every request, a string matches the endpoints containing it and a compiled
+    regular expression matches the endpoints it finds a match in.
+
+    The events are:
+
+    before_send      before each attempt, including retries. trace.attempt counts the retries.
+    after_headers    when the status and headers of an attempt are received
+    after_body       when the body of the response is read. Not fired for streamed responses.
+    after_decode     when the JSON body is decoded, with trace.decode_seconds
+    error            when the request fails for good, with the exception in trace.error. This includes
+                     failed relogins, undecodable bodies and exceptions raised by other hooks.
+
+    Responses served from the cache of the session only fire before_send and after_decode, with
+    trace.cached set to True.
+
+    Requests that no hook matches are sent as if there were no hooks. Responses are only streamed,
+    so that the headers and the body are timed separately, when an after_headers or after_body hook
+    matches the request.
+
+    Exceptions raised by hooks are not caught, so they fail the request.
+
+    Basic usage:
+
+    def slow_call(trace):
+        if trace.seconds > 1:
+            print('%s %s took %.1fs' % (trace.method, trace.url, trace.seconds))
+
+    vra.add_hook('after_decode', slow_call, endpoint='resourceViews')
+    """
+
+    def __init__(self):
+        self._hooks = dict((event, []) for event in HOOK_EVENTS)
+        self._lock = threading.Lock()
+        # checked by Session._request before doing any work for hooks
+        self.active = False
+
+    def add(self, event, callback, endpoint=None):
+        """Registers a hook.
+
+        :param event: One of HOOK_EVENTS
+        :param callback: A callable taking a RequestTrace
+        :param endpoint: None, a substring of the endpoint templates to hook, or a compiled regular expression
+        """
+
+        if event not in self._hooks:
+            raise ValueError('Unknown hook event %s, use one of: %s' % (event, ', '.join(HOOK_EVENTS)))
+
+        with self._lock:
+            self._hooks[event] = self._hooks[event] + [(callback, endpoint)]
+            self.active = True
+
+    def remove(self, event, callback):
+        """Unregisters every registration of callback for event."""
+
+        with self._lock:
+            self._hooks[event] = [(c, e) for c, e in self._hooks[event] if c is not callback]
+            self.active = any(self._hooks.values())
+
+    @staticmethod
+    def _matches(endpoint_filter, endpoint):
+        if endpoint_filter is None:
+            return True
+        if isinstance(endpoint_filter, str):
+            return endpoint_filter in endpoint
+        return endpoint_filter.search(endpoint) is not None
+
+    def wants(self, endpoint, events=HOOK_EVENTS):
+        """
+        :param endpoint: An endpoint template, see vralib.metrics.endpoint_template()
+        :param events: The events to look at
+
+        :return: True if a hook of one of the events is fired for requests to endpoint
+        """
+
+        return any(self._matches(endpoint_filter, endpoint)
+                   for event in events for _, endpoint_filter in self._hooks[event])
+
+    def fire(self, event, trace):
+        trace.seconds = time.perf_counter() - trace.started
+        for callback, endpoint_filter in self._hooks[event]:
+            if self._matches(endpoint_filter, trace.endpoint):
+                callback(trace)
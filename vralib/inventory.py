@@ -0,0 +1,389 @@
+"""
+
+    A local SQLite mirror of vRA collections for fast reporting.
+
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+from vralib.query import Query, odata_fallback
+
+
+DEFAULT_INVENTORY_FILE = os.path.join(os.path.expanduser('~'), '.vralib', 'inventory.db')
+
+# Rows written per transaction while syncing
+SYNC_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    collection TEXT PRIMARY KEY,
+    high_water TEXT,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS resources (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    type TEXT,
+    status TEXT,
+    business_group_id TEXT,
+    parent_id TEXT,
+    lease_end TEXT,
+    last_updated TEXT,
+    data BLOB
+);
+CREATE INDEX IF NOT EXISTS resources_name ON resources (name);
+CREATE INDEX IF NOT EXISTS resources_type ON resources (type);
+CREATE INDEX IF NOT EXISTS resources_business_group ON resources (business_group_id);
+CREATE INDEX IF NOT EXISTS resources_lease_end ON resources (lease_end);
+CREATE TABLE IF NOT EXISTS resource_owners (
+    resource_id TEXT,
+    owner TEXT,
+    PRIMARY KEY (resource_id, owner)
+);
+CREATE INDEX IF NOT EXISTS resource_owners_owner ON resource_owners (owner);
+CREATE TABLE IF NOT EXISTS requests (
+    id TEXT PRIMARY KEY,
+    state TEXT,
+    item_name TEXT,
+    requested_by TEXT,
+    business_group_id TEXT,
+    date_created TEXT,
+    last_updated TEXT,
+    data BLOB
+);
+CREATE INDEX IF NOT EXISTS requests_state ON requests (state);
+CREATE INDEX IF NOT EXISTS requests_business_group ON requests (business_group_id);
+CREATE INDEX IF NOT EXISTS requests_requested_by ON requests (requested_by);
+CREATE TABLE IF NOT EXISTS business_groups (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    data BLOB
+);
+CREATE INDEX IF NOT EXISTS business_groups_name ON business_groups (name);
+"""
+
+
+def _get(item, *path):
+    for key in path:
+        if not isinstance(item, dict):
+            return None
+        item = item.get(key)
+    return item
+
+
+class Inventory(object):
+    """
+    Mirrors consumer resources, requests and business groups into an indexed SQLite database, so
+    reports run locally in milliseconds instead of reading every collection from vRA.
+
+    The first sync reads the collections in full. Later syncs of resources and requests only ask
+    for the rows whose lastUpdated is at or after the newest one already stored. Rows deleted in
+    vRA are only dropped by a full sync, sync(full=True). Business groups are always read in full.
+
+    A database holds the inventory of one appliance, tenant and user, since what vRA returns
+    depends on who is asking.
+
+    Basic usage:
+
+    inventory = vralib.Inventory(vra)
+    inventory.sync()
+    expiring = inventory.resources(business_group=group_id, lease_end_before='2019-06-08')
+    """
+
+    def __init__(self, session, path=DEFAULT_INVENTORY_FILE, page_size='auto'):
+        """
+        :param session: A vralib.Session
+        :param path: The SQLite database file, or ':memory:'
+        :param page_size: Items per page while syncing: a number, 'auto' or None
+        """
+
+        self.session = session
+        self.path = path
+        self.page_size = page_size
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if path != ':memory:' and directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+            self._check_scope()
+
+    def _check_scope(self):
+        scope = '%s|%s|%s' % (self.session.cloudurl, self.session.tenant, self.session.username)
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'scope'").fetchone()
+        if row is None:
+            self._db.execute("INSERT INTO meta (key, value) VALUES ('scope', ?)", (scope,))
+        elif row['value'] != scope:
+            raise ValueError('%s holds the inventory of %s, not %s' % (self.path, row['value'], scope))
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def sync(self, full=False):
+        """Brings the inventory up to date.
+
+        :param full: If True every collection is read in full and rows missing from vRA are deleted
+
+        :return: A dictionary of the number of rows written per collection
+        """
+
+        return {
+            'resources': self.sync_resources(full),
+            'requests': self.sync_requests(full),
+            'business_groups': self.sync_business_groups(),
+        }
+
+    def sync_resources(self, full=False):
+        """
+        :return: The number of resources written
+        """
+
+        url = 'https://%s/catalog-service/api/consumer/resources' % self.session.cloudurl
+        return self._sync('resources', url, self.session.iter_consumer_resources, self._resource_rows, full)
+
+    def sync_requests(self, full=False):
+        """
+        :return: The number of requests written
+        """
+
+        url = 'https://%s/catalog-service/api/consumer/requests' % self.session.cloudurl
+        return self._sync('requests', url, self.session.iter_requests, self._request_rows, full)
+
+    def sync_business_groups(self):
+        """
+        :return: The number of business groups written
+        """
+
+        started = time.time()
+        groups = self.session.get_business_groups(page_size=self.page_size)
+        rows = [(g['id'], g.get('name'), self.session.codec.dumps(g)) for g in groups]
+
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM business_groups')
+            self._db.executemany('INSERT INTO business_groups (id, name, data) VALUES (?, ?, ?)', rows)
+            self._set_state('business_groups', None, started)
+        return len(rows)
+
+    def _sync(self, collection, url, iterate, write, full):
+        started = time.time()
+        high_water = None if full else self.high_water(collection)
+
+        if high_water and url not in self.session._odata_unsupported:
+            query = Query().ge('lastUpdated', high_water).orderby('lastUpdated')
+            try:
+                count, newest = self._write_all(iterate(page_size=self.page_size, query=query), write)
+            except requests.exceptions.HTTPError as e:
+                if not odata_fallback(self.session._odata_unsupported, url, getattr(e.response, 'status_code', None)):
+                    raise
+            else:
+                with self._lock, self._db:
+                    self._set_state(collection, max(high_water, newest or ''), started)
+                return count
+
+        # a full read, which also drops the rows that disappeared from vRA
+        seen = set()
+
+        def remember(items):
+            for item in items:
+                seen.add(item['id'])
+                yield item
+
+        count, newest = self._write_all(remember(iterate(page_size=self.page_size)), write)
+
+        with self._lock, self._db:
+            self._db.execute('CREATE TEMP TABLE IF NOT EXISTS seen (id TEXT PRIMARY KEY)')
+            self._db.execute('DELETE FROM seen')
+            self._db.executemany('INSERT INTO seen (id) VALUES (?)', ((i,) for i in seen))
+            self._db.execute('DELETE FROM %s WHERE id NOT IN (SELECT id FROM seen)' % collection)
+            if collection == 'resources':
+                self._db.execute('DELETE FROM resource_owners WHERE resource_id NOT IN (SELECT id FROM seen)')
+            self._db.execute('DELETE FROM seen')
+            self._set_state(collection, newest, started)
+        return count
+
+    def _write_all(self, items, write):
+        """Writes the items in batches.
+
+        :return: The number of items written and the newest lastUpdated seen
+        """
+
+        count = 0
+        newest = None
+        batch = []
+
+        for item in items:
+            batch.append(item)
+            if item.get('lastUpdated') and (newest is None or item['lastUpdated'] > newest):
+                newest = item['lastUpdated']
+            if len(batch) >= SYNC_BATCH_SIZE:
+                count += self._write_batch(batch, write)
+                batch = []
+        if batch:
+            count += self._write_batch(batch, write)
+        return count, newest
+
+    def _write_batch(self, batch, write):
+        with self._lock, self._db:
+            write(batch)
+        return len(batch)
+
+    def _resource_rows(self, resources):
+        dumps = self.session.codec.dumps
+        self._db.executemany(
+            'INSERT OR REPLACE INTO resources (id, name, type, status, business_group_id, parent_id, lease_end, '
+            'last_updated, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(r['id'], r.get('name'), _get(r, 'resourceTypeRef', 'id'), r.get('status'),
+              _get(r, 'organization', 'subtenantRef'), _get(r, 'parentResourceRef', 'id'), _get(r, 'lease', 'end'),
+              r.get('lastUpdated'), dumps(r)) for r in resources])
+        self._db.executemany('DELETE FROM resource_owners WHERE resource_id = ?', [(r['id'],) for r in resources])
+        self._db.executemany(
+            'INSERT OR IGNORE INTO resource_owners (resource_id, owner) VALUES (?, ?)',
+            [(r['id'], o['ref']) for r in resources for o in r.get('owners') or [] if o.get('ref')])
+
+    def _request_rows(self, items):
+        dumps = self.session.codec.dumps
+        self._db.executemany(
+            'INSERT OR REPLACE INTO requests (id, state, item_name, requested_by, business_group_id, date_created, '
+            'last_updated, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(r['id'], r.get('state'), r.get('requestedItemName'), r.get('requestedBy'),
+              _get(r, 'organization', 'subtenantRef'), r.get('dateCreated'), r.get('lastUpdated'), dumps(r))
+             for r in items])
+
+    def _set_state(self, collection, high_water, synced_at):
+        self._db.execute('INSERT OR REPLACE INTO sync_state (collection, high_water, synced_at) VALUES (?, ?, ?)',
+                         (collection, high_water, synced_at))
+
+    def high_water(self, collection):
+        """
+        :return: The newest lastUpdated stored for a collection, or None if it was never synced
+        """
+
+        with self._lock:
+            row = self._db.execute('SELECT high_water FROM sync_state WHERE collection = ?', (collection,)).fetchone()
+        return row['high_water'] if row else None
+
+    def sync_state(self):
+        """
+        :return: A dictionary of {collection: {'high_water': ..., 'synced_at': ...}}
+        """
+
+        with self._lock:
+            rows = self._db.execute('SELECT collection, high_water, synced_at FROM sync_state').fetchall()
+        return dict((r['collection'], {'high_water': r['high_water'], 'synced_at': r['synced_at']}) for r in rows)
+
+    def query(self, sql, parameters=()):
+        """Runs a raw SQL query against the inventory.
+
+        :return: A list of sqlite3.Row
+        """
+
+        with self._lock:
+            return self._db.execute(sql, parameters).fetchall()
+
+    def _select(self, table, conditions, parameters, order):
+        sql = 'SELECT %s.data FROM %s' % (table, table)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY ' + order
+        loads = self.session.codec.loads
+        return [loads(row['data']) for row in self.query(sql, parameters)]
+
+    def resources(self, business_group=None, resource_type=None, owner=None, name=None, parent=None,
+                  lease_end_before=None, lease_end_after=None):
+        """Finds stored consumer resources. Every criterion given must match.
+
+        :param business_group: The id of a business group
+        :param resource_type: A resource type id, e.g. 'Infrastructure.Virtual'
+        :param owner: The principal of an owner, e.g. 'vrauser@vsphere.local'
+        :param name: A substring of the name, case insensitive
+        :param parent: The id of the parent resource
+        :param lease_end_before: Leases ending before this ISO 8601 timestamp, e.g. '2019-06-08'
+        :param lease_end_after: Leases ending at or after this ISO 8601 timestamp
+
+        :return: A list of resources as returned by Session.get_consumer_resources()
+        """
+
+        conditions = []
+        parameters = []
+        for column, value in (('business_group_id', business_group), ('type', resource_type),
+                              ('parent_id', parent)):
+            if value is not None:
+                conditions.append('%s = ?' % column)
+                parameters.append(value)
+        if owner is not None:
+            conditions.append('id IN (SELECT resource_id FROM resource_owners WHERE owner = ?)')
+            parameters.append(owner)
+        if name is not None:
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            parameters.append('%%%s%%' % name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+        if lease_end_before is not None:
+            conditions.append('lease_end < ?')
+            parameters.append(lease_end_before)
+        if lease_end_after is not None:
+            conditions.append('lease_end >= ?')
+            parameters.append(lease_end_after)
+
+        return self._select('resources', conditions, parameters, 'name')
+
+    def get_resource(self, resource_id):
+        """
+        :return: A stored consumer resource, or None
+        """
+
+        found = self._select('resources', ['id = ?'], [resource_id], 'id')
+        return found[0] if found else None
+
+    def requests(self, state=None, requested_by=None, business_group=None, created_after=None):
+        """Finds stored catalog requests. Every criterion given must match.
+
+        :param state: A request state, e.g. 'FAILED'
+        :param requested_by: The principal who submitted the requests
+        :param business_group: The id of a business group
+        :param created_after: Requests created at or after this ISO 8601 timestamp
+
+        :return: A list of requests as returned by Session.get_requests(), newest first
+        """
+
+        conditions = []
+        parameters = []
+        for column, value in (('state', state), ('requested_by', requested_by),
+                              ('business_group_id', business_group)):
+            if value is not None:
+                conditions.append('%s = ?' % column)
+                parameters.append(value)
+        if created_after is not None:
+            conditions.append('date_created >= ?')
+            parameters.append(created_after)
+
+        return self._select('requests', conditions, parameters, 'date_created DESC')
+
+    def business_groups(self, name=None):
+        """
+        :param name: A substring of the name, case insensitive
+
+        :return: A list of business groups as returned by Session.get_business_groups()
+        """
+
+        if name is None:
+            return self._select('business_groups', [], [], 'name')
+        escaped = name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return self._select('business_groups', ["name LIKE ? ESCAPE '\\'"], ['%%%s%%' % escaped], 'name')
@@ -0,0 +1,219 @@
+"""
+
+    Per-endpoint request metrics of a Session, exportable in the Prometheus text format.
+
+"""
+
+import re
+import threading
+
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Path segments that identify one object rather than an endpoint: UUIDs and numbers
+_ID_SEGMENT = re.compile(r'^(?:[0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}|\d+)$')
+
+
+def endpoint_template(url):
+    """Reduces a URL to the endpoint it calls, e.g.
+    https://vra/catalog-service/api/consumer/resources/<uuid>?page=2 to catalog-service/api/consumer/resources/{id}
+
+    :return: The path of url without its query string, with ids replaced by {id}
+    """
+
+    return _path_template(url.split('?', 1)[0])
+
+
+@lru_cache(maxsize=1024)
+def _path_template(url):
+    path = urlsplit(url).path.strip('/')
+    return '/'.join('{id}' if _ID_SEGMENT.match(segment) else segment for segment in path.split('/'))
+
+
+class EndpointMetrics(object):
+    """The counters of one endpoint and HTTP method."""
+
+    __slots__ = ('requests', 'statuses', 'errors', 'buckets', 'seconds', 'bytes', 'pages', 'retries',
+                 'decode_seconds', 'cache_hits')
+
+    def __init__(self, bucket_count):
+        self.requests = 0
+        self.statuses = {}
+        self.errors = 0
+        self.buckets = [0] * bucket_count
+        self.seconds = 0.0
+        self.bytes = 0
+        self.pages = 0
+        self.retries = 0
+        self.decode_seconds = 0.0
+        self.cache_hits = 0
+
+    def as_dict(self, bounds):
+        return {
+            'requests': self.requests,
+            'statuses': dict(self.statuses),
+            'errors': self.errors,
+            'latency_buckets': list(zip(bounds, self.buckets)),
+            'seconds': self.seconds,
+            'bytes': self.bytes,
+            'pages': self.pages,
+            'retries': self.retries,
+            'decode_seconds': self.decode_seconds,
+            'cache_hits': self.cache_hits,
+        }
+
+
+class MetricsRegistry(object):
+    """
+    Collects call counts, latency histograms, bytes received, pages, retries and JSON decode time of
+    the requests of one or more sessions, per endpoint template and HTTP method. Responses served by
+    a vralib.ResponseCache don't reach the server, so they are only counted in cache_hits.
+
+    A Session only records metrics when it has a registry, so sessions without one pay nothing.
+    Setting enabled to False on a registry stops the recording as well.
+
+    Basic usage:
+
+    vra = vralib.Session.login(username, password, cloudurl, tenant, metrics=True)
+    vra.get_consumer_resources()
+    print(vra.metrics.snapshot()['catalog-service/api/consumer/resources']['GET']['pages'])
+    print(vra.metrics.prometheus())
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, enabled=True):
+        """
+        :param buckets: The upper bounds, in seconds, of the latency histogram buckets
+        :param enabled: If False nothing is recorded until enabled is set to True
+        """
+
+        self.bounds = tuple(sorted(buckets))
+        self.enabled = enabled
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def _metrics(self, url, method):
+        key = (endpoint_template(url), method)
+        metrics = self._endpoints.get(key)
+        if metrics is None:
+            metrics = self._endpoints[key] = EndpointMetrics(len(self.bounds) + 1)
+        return metrics
+
+    def observe(self, url, method, status, seconds, size=0, decode_seconds=0.0):
+        """Records a request.
+
+        :param url: The URL requested
+        :param method: The HTTP method
+        :param status: The HTTP status of the response, or None if no response was received
+        :param seconds: The time taken by the request, including retries
+        :param size: The number of bytes of the response body
+        :param decode_seconds: The time spent decoding the JSON body
+        """
+
+        if not self.enabled:
+            return
+
+        bucket = 0
+        while bucket < len(self.bounds) and seconds > self.bounds[bucket]:
+            bucket += 1
+
+        with self._lock:
+            metrics = self._metrics(url, method)
+            metrics.requests += 1
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            if status is None or status >= 400:
+                metrics.errors += 1
+            metrics.buckets[bucket] += 1
+            metrics.seconds += seconds
+            metrics.bytes += size
+            metrics.decode_seconds += decode_seconds
+
+    def retry(self, url, method):
+        """Records a retry of a request."""
+
+        if not self.enabled:
+            return
+        with self._lock:
+            self._metrics(url, method).retries += 1
+
+    def cache_hit(self, url, method):
+        """Records a response served from the cache of a session."""
+
+        if not self.enabled:
+            return
+        with self._lock:
+            self._metrics(url, method).cache_hits += 1
+
+    def page(self, url):
+        """Records a page of a collection read with GET."""
+
+        if not self.enabled:
+            return
+        with self._lock:
+            self._metrics(url, 'GET').pages += 1
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def snapshot(self):
+        """
+        :return: A dictionary of the counters by endpoint template and HTTP method. latency_buckets holds
+                 (upper bound, count) pairs, and the requests slower than every bound are the remainder.
+        """
+
+        with self._lock:
+            snapshot = {}
+            for (endpoint, method), metrics in self._endpoints.items():
+                snapshot.setdefault(endpoint, {})[method] = metrics.as_dict(self.bounds)
+            return snapshot
+
+    def prometheus(self, prefix='vralib'):
+        """
+        :param prefix: The prefix of the metric names
+
+        :return: The metrics in the Prometheus text exposition format
+        """
+
+        def labels(endpoint, method, **extra):
+            pairs = [('endpoint', endpoint), ('method', method)] + sorted(extra.items())
+            return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                                     for k, v in pairs)
+
+        with self._lock:
+            endpoints = sorted((key, metrics.as_dict(self.bounds)) for key, metrics in self._endpoints.items())
+
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+            for suffix, label_text, value in samples:
+                lines.append('%s_%s%s%s %s' % (prefix, name, suffix, label_text, value))
+
+        family('requests_total', 'counter', 'Requests by endpoint, method and HTTP status.', [
+            ('', labels(e, m, status=status if status is not None else 'none'), count)
+            for (e, m), d in endpoints for status, count in sorted(d['statuses'].items(), key=str)])
+
+        histogram = []
+        for (e, m), d in endpoints:
+            cumulative = 0
+            for bound, count in d['latency_buckets']:
+                cumulative += count
+                histogram.append(('_bucket', labels(e, m, le=repr(float(bound))), cumulative))
+            histogram.append(('_bucket', labels(e, m, le='+Inf'), d['requests']))
+            histogram.append(('_sum', labels(e, m), repr(d['seconds'])))
+            histogram.append(('_count', labels(e, m), d['requests']))
+        family('request_duration_seconds', 'histogram', 'Request latency, including retries.', histogram)
+
+        for name, key, help_text in (('response_bytes_total', 'bytes', 'Bytes of response bodies.'),
+                                     ('pages_total', 'pages', 'Pages of collections read.'),
+                                     ('retries_total', 'retries', 'Requests retried.'),
+                                     ('decode_seconds_total', 'decode_seconds', 'Time spent decoding JSON.'),
+                                     ('cache_hits_total', 'cache_hits', 'Responses served from the cache.')):
+            family(name, 'counter', help_text, [('', labels(e, m), d[key]) for (e, m), d in endpoints])
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,193 @@
+"""
+
+    Compact, slotted read-only models for holding large numbers of vRA resources in memory.
+
+"""
+
+from vralib.deployment import Deployment, RESOURCE_CLASSES
+
+
+def _operations(model, operations):
+    """Builds the operation dicts of vralib.Deployment from the `operations` of a consumer resource."""
+    return Deployment._get_operations(model.session, model.resource_id, {'operations': operations})
+
+
+class LazyField(object):
+    """
+    A field of a compact model that is read from the raw payload on first access and kept in a slot.
+
+    :param path: The keys leading to the value in the payload, e.g. ('organization', 'subtenantRef')
+    :param default: The value used when a key along the path is missing. It is shared by every instance,
+                    so it should be immutable.
+    :param convert: An optional callable taking the model and the value found in the payload and returning
+                    the value of the field
+    """
+
+    def __init__(self, *path, **kwargs):
+        self.path = path
+        self.default = kwargs.get('default')
+        self.convert = kwargs.get('convert')
+        self.name = None
+        self.slot = None
+
+    def extract(self, payload):
+        value = payload
+        for key in self.path:
+            if not isinstance(value, dict) or key not in value:
+                return self.default
+            value = value[key]
+        return value
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            return self.slot.__get__(instance, owner)
+        except AttributeError:
+            if instance._raw is None:
+                return self.default
+            value = self.extract(instance._raw)
+            if self.convert is not None and value is not self.default:
+                value = self.convert(instance, value)
+            self.slot.__set__(instance, value)
+            return value
+
+    def __set__(self, instance, value):
+        self.slot.__set__(instance, value)
+
+
+class _CompactMeta(type):
+    """Adds a slot for every LazyField of a model, named after the field with a leading underscore."""
+
+    def __new__(mcs, name, bases, namespace):
+        fields = dict((k, v) for k, v in namespace.items() if isinstance(v, LazyField))
+        namespace['__slots__'] = tuple(namespace.get('__slots__', ())) + tuple('_' + k for k in fields)
+        cls = super(_CompactMeta, mcs).__new__(mcs, name, bases, namespace)
+        for k, field in fields.items():
+            field.name = k
+            field.slot = cls.__dict__['_' + k]
+        cls._fields = tuple(getattr(cls, '_fields', ())) + tuple(fields)
+        return cls
+
+
+class CompactModel(metaclass=_CompactMeta):
+    """
+    Base class of the compact models.
+
+    Instances have no __dict__. Every field is a LazyField decoded from the raw payload the first time
+    it is read. With keep_raw=False the fields are decoded up front and the payload is dropped, so only
+    the values of the fields are kept alive. Passing `fields` as well keeps only the fields needed.
+    """
+
+    __slots__ = ('session', '_raw')
+
+    def __init__(self, session, payload, keep_raw=True, fields=None):
+        """
+        :param session: A vralib.Session
+        :param payload: The dict returned by the API
+        :param keep_raw: If False the fields are decoded now and the payload is not kept
+        :param fields: With keep_raw=False, the names of the fields to keep. The others read as their default.
+        """
+
+        self.session = session
+        self._raw = payload
+        if not keep_raw:
+            self.compact(fields)
+
+    @property
+    def raw(self):
+        """The payload the model was built from, or None if it was dropped."""
+        return self._raw
+
+    def compact(self, fields=None):
+        """Decodes the fields and drops the payload.
+
+        :param fields: The names of the fields to keep, or None for all of them
+        """
+
+        for name in self._fields if fields is None else fields:
+            getattr(self, name)
+        self._raw = None
+
+    @classmethod
+    def many(cls, session, payloads, keep_raw=True, fields=None):
+        """
+        :param session: A vralib.Session
+        :param payloads: An iterable of dicts returned by the API, e.g. Session.iter_consumer_resources()
+        :param keep_raw: If False the payloads are not kept
+        :param fields: With keep_raw=False, the names of the fields to keep
+
+        :return: A list of instances
+        """
+
+        return [cls(session, payload, keep_raw, fields) for payload in payloads]
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, self.name)
+
+
+class CompactDeployment(CompactModel):
+    """
+    A slotted, read-only version of vralib.Deployment for reporting over many resources.
+
+    It has the same fields as Deployment, but no day 2 methods: load() returns the full Deployment.
+
+    Basic usage:
+
+    resources = vralib.CompactDeployment.many(vra, vra.iter_consumer_resources(), keep_raw=False)
+    expiring = [r.name for r in resources if r.lease and r.lease.get('end', '') < '2019-06-01']
+    """
+
+    __slots__ = ()
+
+    resource_id = LazyField('id')
+    resource_type = LazyField('resourceTypeRef')
+    description = LazyField('description')
+    name = LazyField('name')
+    request_id = LazyField('requestId')
+    business_group_id = LazyField('organization', 'subtenantRef')
+    business_group_label = LazyField('organization', 'subtenantLabel')
+    date_created = LazyField('dateCreated')
+    owners = LazyField('owners')
+    tenant_id = LazyField('organization', 'tenantRef')
+    lease = LazyField('lease')
+    operations = LazyField('operations', default=(), convert=_operations)
+    parent_resource = LazyField('parentResourceRef')
+
+    @property
+    def deployment_json(self):
+        return self._raw
+
+    @classmethod
+    def fromid(cls, session, resource_id, keep_raw=True):
+        return cls(session, session.get_consumer_resource(resource_id=resource_id), keep_raw)
+
+    def load(self):
+        """
+        :return: The full vralib.Deployment (or the subclass for its type) of this resource,
+                 with its children and operations
+        """
+
+        resource_class = RESOURCE_CLASSES.get((self.resource_type or {}).get('id'), Deployment)
+        return resource_class.fromid(self.session, self.resource_id)
+
+
+class CompactReservation(CompactModel):
+    """A slotted, read-only version of vralib.Reservation for reporting over many reservations."""
+
+    __slots__ = ()
+
+    reservation_id = LazyField('id')
+    name = LazyField('name')
+    created_date = LazyField('createdDate')
+    tenantId = LazyField('tenantId')
+    subTenantId = LazyField('subTenantId')
+    enabled = LazyField('enabled')
+
+    @property
+    def reservation_json(self):
+        return self._raw
+
+    @classmethod
+    def fromid(cls, session, reservation_id, keep_raw=True):
+        return cls(session, session.get_reservation(reservation_id=reservation_id), keep_raw)
@@ -0,0 +1,173 @@
+"""
+
+    Runs day 2 operations across many resources.
+
+"""
+
+import threading
+
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait as wait_futures
+
+from vralib.provisioning import patch_dict
+
+
+DEFAULT_WORKERS = 8
+
+
+OperationResult = namedtuple('OperationResult', ['index', 'resource', 'operation', 'request_id', 'request', 'error'])
+OperationResult.__doc__ = """The outcome of an operation on one resource.
+
+index is the position of the resource in the batch. request_id is the id of the catalog request
+created by the operation and request the completed request, if the executor waited for it. error
+holds the exception raised for this resource, if any.
+"""
+
+
+class OperationExecutor(object):
+    """
+    Runs a named day 2 operation, e.g. 'Power Off' or 'Expire', on many Deployment or VirtualMachine
+    instances with bounded concurrency.
+
+    The template of an operation is fetched for every resource. With reuse_templates=True it is fetched
+    once per resource type instead and reused for every resource of that type with only its resourceId
+    swapped in. Only turn it on for operations whose template `data` is empty or the same for every
+    resource (e.g. Power Off, Destroy): the data of templates such as Reconfigure holds the name, CPU,
+    memory and disks of the resource the template was fetched for, and would be sent for all of them.
+
+    Results are streamed as each resource finishes. With wait=True every request is tracked by the
+    RequestWaiter of the session and its result is only reported once the request completes.
+
+    Basic usage:
+
+    executor = vralib.OperationExecutor(vra, workers=16)
+    for result in executor.iter_execute(deployment.deployment_children, 'Power Off', wait=True):
+        print(result.resource.name, result.error or result.request['state'])
+    """
+
+    def __init__(self, session, workers=DEFAULT_WORKERS, reuse_templates=False):
+        """
+        :param session: A vralib.Session
+        :param workers: The maximum number of operations submitted at the same time
+        :param reuse_templates: If True the template is fetched once per operation and resource type. Only use it
+                                for operations whose template data doesn't depend on the resource.
+        """
+
+        self.session = session
+        self.workers = workers
+        self.reuse_templates = reuse_templates
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def template(self, resource, operation):
+        """Returns the template of an operation for a resource. With reuse_templates it is fetched once per
+        operation and resource type.
+
+        The template may be shared, so it must not be modified. Use patch_dict() to get a modified copy.
+
+        :raises NotFoundError: if the resource doesn't offer the operation
+        """
+
+        o = resource.require_operation(operation)
+
+        if not self.reuse_templates:
+            return self.session._request(o['template_url'])
+
+        key = (operation, resource.resource_type['id'])
+        with self._lock:
+            future = self._templates.get(key)
+            owner = future is None
+            if owner:
+                future = self._templates[key] = Future()
+
+        if owner:
+            try:
+                future.set_result(self.session._request(o['template_url']))
+            except Exception as e:
+                future.set_exception(e)
+                with self._lock:
+                    del self._templates[key]
+
+        return future.result()
+
+    def _execute_one(self, index, resource, operation, overrides):
+        try:
+            payload = self.template(resource, operation)
+            if overrides:
+                payload = patch_dict(payload, overrides(resource) if callable(overrides) else overrides)
+            payload = dict(payload, resourceId=resource.resource_id)
+
+            o = resource.require_operation(operation)
+            if o.get('id'):
+                payload['actionId'] = o['id']
+
+            response = self.session._request(o['request_url'], request_method='POST', payload=payload,
+                                             content_only=False)
+            location = response.headers.get('Location')
+            request_id = location.rstrip('/').rsplit('/', 1)[-1] if location else None
+            return OperationResult(index, resource, operation, request_id, None, None)
+        except Exception as e:
+            return OperationResult(index, resource, operation, None, None, e)
+
+    def iter_execute(self, resources, operation, overrides=None, wait=False):
+        """
+        Runs the operation on the resources and yields the results as they complete, which may be out of order.
+
+        Resources are consumed lazily, so at most twice `workers` of them are being submitted at once.
+        Requests tracked with wait=True don't count against that limit.
+
+        :param resources: An iterable of Deployment instances (or of its subclasses)
+        :param operation: The name of the operation, e.g. 'Power Off'
+        :param overrides: A dict patched into the template (see patch_dict), or a callable that returns
+                          one for a resource
+        :param wait: If True, results are reported once their request completes, with the request in `request`
+
+        :return: a generator of OperationResult
+        """
+
+        resources = enumerate(resources)
+        window = self.workers * 2
+        submitting = 0
+        pending = {}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                while submitting < window:
+                    item = next(resources, None)
+                    if item is None:
+                        break
+                    index, resource = item
+                    pending[pool.submit(self._execute_one, index, resource, operation, overrides)] = None
+                    submitting += 1
+
+                if not pending:
+                    return
+
+                done, _ = wait_futures(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = pending.pop(future)
+                    if result is not None:
+                        # a request tracked by the waiter
+                        try:
+                            yield result._replace(request=future.result())
+                        except Exception as e:
+                            yield result._replace(error=e)
+                        continue
+
+                    submitting -= 1
+                    result = future.result()
+                    if wait and result.request_id:
+                        pending[self.session.waiter.watch(result.request_id)] = result
+                    else:
+                        yield result
+
+    def execute(self, resources, operation, overrides=None, wait=False):
+        """
+        Runs the operation on the resources and waits for all of them.
+
+        See iter_execute() for the parameters.
+
+        :return: a list of OperationResult in the order of resources
+        """
+
+        return sorted(self.iter_execute(resources, operation, overrides, wait), key=lambda result: result.index)
@@ -0,0 +1,128 @@
+"""
+
+    Bulk provisioning of catalog items.
+
+"""
+
+import threading
+
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+
+DEFAULT_WORKERS = 8
+
+
+ProvisioningResult = namedtuple('ProvisioningResult', ['index', 'catalogitem', 'request_id', 'request', 'error'])
+ProvisioningResult.__doc__ = """The outcome of one request of a batch.
+
+index is the position of the request in the batch. request is the response of the POST and
+request_id its id, or both are None and error holds the exception that was raised.
+"""
+
+
+def patch_dict(d, p):
+    """Patches the dict `d`.
+
+    Returns a copy of the dict `d` patched with values from the "patcher" dict `p`. Only keys
+    already in `d` are patched and nested dicts are patched recursively. `d` itself is left
+    untouched, and the parts of it that are not patched are shared with the copy instead of
+    being copied, so one template can be patched many times cheaply.
+    """
+
+    result = dict(d)
+    for k in p:
+        if k in d:
+            if type(d[k]) == dict and type(p[k]) == dict:
+                result[k] = patch_dict(d[k], p[k])
+            else:
+                result[k] = p[k]
+    return result
+
+
+class BulkProvisioner(object):
+    """
+    Submits many catalog requests with bounded concurrency.
+
+    The request template of each catalog item is fetched once per provisioner, however many
+    requests use it and even when several workers need it at the same time. Each request is the
+    template patched with its own overrides (see patch_dict). A failed request is reported in
+    its result and doesn't stop the others.
+
+    Basic usage:
+
+    provisioner = vralib.BulkProvisioner(vra, workers=16)
+    results = provisioner.submit([
+        {'catalogitem': '0ebbcf20-abdf-4663-a40c-1e50e7340190', 'overrides': {'description': 'web-01'}},
+        {'catalogitem': '0ebbcf20-abdf-4663-a40c-1e50e7340190', 'overrides': {'description': 'web-02'}},
+    ])
+    failed = [r for r in results if r.error]
+    """
+
+    def __init__(self, session, workers=DEFAULT_WORKERS):
+        """
+        :param session: A vralib.Session
+        :param workers: The maximum number of requests submitted at the same time
+        """
+
+        self.session = session
+        self.workers = workers
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def template(self, catalogitem):
+        """Returns the request template of a catalog item, fetching it only the first time.
+
+        The template is shared, so it must not be modified. Use patch_dict() to get a modified copy.
+        """
+
+        with self._lock:
+            future = self._templates.get(catalogitem)
+            owner = future is None
+            if owner:
+                future = self._templates[catalogitem] = Future()
+
+        if owner:
+            try:
+                future.set_result(self.session.get_request_template(catalogitem))
+            except Exception as e:
+                future.set_exception(e)
+                with self._lock:
+                    del self._templates[catalogitem]
+
+        return future.result()
+
+    def _submit_one(self, index, spec):
+        catalogitem = spec['catalogitem']
+        try:
+            payload = patch_dict(self.template(catalogitem), spec.get('overrides') or {})
+            request = self.session._request(self.session.get_request_url(catalogitem),
+                                            request_method='POST', payload=payload)
+            return ProvisioningResult(index, catalogitem, request.get('id'), request, None)
+        except Exception as e:
+            return ProvisioningResult(index, catalogitem, None, None, e)
+
+    def iter_submit(self, specs):
+        """
+        Submits the requests and yields their results as they complete, which may be out of order.
+
+        :param specs: An iterable of dicts with a 'catalogitem' id and optional 'overrides' for its template
+
+        :return: a generator of ProvisioningResult
+        """
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(self._submit_one, index, spec) for index, spec in enumerate(specs)]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def submit(self, specs):
+        """
+        Submits the requests and waits for all of them.
+
+        :param specs: An iterable of dicts with a 'catalogitem' id and optional 'overrides' for its template
+
+        :return: a list of ProvisioningResult in the order of specs
+        """
+
+        return sorted(self.iter_submit(specs), key=lambda result: result.index)
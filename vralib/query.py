@@ -0,0 +1,189 @@
+"""
+
+    Builds OData `$filter` and `$orderby` query strings for the vRA REST API.
+
+"""
+
+import datetime
+import logging
+
+from urllib.parse import quote
+
+
+log = logging.getLogger(__name__)
+
+# status codes that tell us an endpoint can't handle a $filter, so callers filter locally instead
+ODATA_FALLBACK_STATUSES = (400, 500, 501)
+
+# the ones that are remembered for the rest of the session. A 500 may be transient, so it only makes
+# the call that got it fall back and the next call tries the query again
+ODATA_UNSUPPORTED_STATUSES = (400, 501)
+
+
+def odata_fallback(unsupported, url, status):
+    """Decides whether a call whose OData query was rejected should fall back to filtering locally.
+
+    :param unsupported: The set of URLs known not to support OData queries, e.g. Session._odata_unsupported.
+                        url is added to it when the status says the endpoint will never support them.
+    :param url: The URL of the collection
+    :param status: The HTTP status of the rejected request, or None
+
+    :return: True to fall back, False to raise the error
+    """
+
+    if status not in ODATA_FALLBACK_STATUSES:
+        return False
+    if status in ODATA_UNSUPPORTED_STATUSES:
+        unsupported.add(url)
+    log.debug('%s answered %s to an OData query, filtering locally', url, status)
+    return True
+
+
+class Query(object):
+    """
+    Used to build the OData part of a query string for vRA collections, so that filtering and
+    ordering happen on the server and only the matching rows are transferred.
+
+    Every predicate method returns the query itself, so calls can be chained. Predicates are
+    joined with 'and'.
+
+    Basic usage:
+
+    query = vralib.Query().contains('name', 'cent').eq('status', 'ACTIVE').orderby('dateCreated', descending=True)
+    resources = vra.get_consumer_resources(query=query)
+
+    str(query) renders the parameters with a leading '&', the same format used for every other
+    query string in vralib:
+
+    &$filter=substringof('cent',tolower(name)) and status eq 'ACTIVE'&$orderby=dateCreated desc
+    """
+
+    def __init__(self):
+        self.filters = []
+        self.order = []
+
+    @staticmethod
+    def literal(value):
+        """Formats a python value as an OData literal.
+
+        :param value: A string, number, boolean, None, date or datetime.
+                      Datetimes are expected in UTC.
+
+        :return: A string with the OData representation of value
+        """
+
+        if value is None:
+            return 'null'
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        if isinstance(value, (int, float)):
+            return str(value)
+        if isinstance(value, datetime.datetime):
+            value = value.strftime('%Y-%m-%dT%H:%M:%S.') + '%03dZ' % (value.microsecond // 1000)
+        elif isinstance(value, datetime.date):
+            value = value.isoformat()
+        return "'%s'" % str(value).replace("'", "''")
+
+    def where(self, expression):
+        """Adds a raw OData expression, e.g. "parentResource eq null".
+
+        :return: The query itself
+        """
+
+        self.filters.append(expression)
+        return self
+
+    def _compare(self, field, operator, value):
+        return self.where('%s %s %s' % (field, operator, self.literal(value)))
+
+    def eq(self, field, value):
+        return self._compare(field, 'eq', value)
+
+    def ne(self, field, value):
+        return self._compare(field, 'ne', value)
+
+    def gt(self, field, value):
+        return self._compare(field, 'gt', value)
+
+    def ge(self, field, value):
+        return self._compare(field, 'ge', value)
+
+    def lt(self, field, value):
+        return self._compare(field, 'lt', value)
+
+    def le(self, field, value):
+        return self._compare(field, 'le', value)
+
+    def any_of(self, field, values):
+        """Matches rows where field equals one of values, e.g. a batch of ids.
+
+        :return: The query itself
+        """
+
+        values = list(values)
+        if not values:
+            raise ValueError('any_of() needs at least one value for %s' % field)
+        if len(values) == 1:
+            return self.eq(field, values[0])
+        return self.where('(%s)' % ' or '.join('%s eq %s' % (field, self.literal(v)) for v in values))
+
+    def contains(self, field, value, ignore_case=True):
+        """Matches rows where field contains the string value.
+
+        :param ignore_case: Compares lower case values, like the local substring filters of Session do.
+
+        :return: The query itself
+        """
+
+        if ignore_case:
+            return self.where('substringof(%s,tolower(%s))' % (self.literal(value.lower()), field))
+        return self.where('substringof(%s,%s)' % (self.literal(value), field))
+
+    def startswith(self, field, value, ignore_case=True):
+        """Matches rows where field starts with the string value.
+
+        :return: The query itself
+        """
+
+        if ignore_case:
+            return self.where('startswith(tolower(%s),%s)' % (field, self.literal(value.lower())))
+        return self.where('startswith(%s,%s)' % (field, self.literal(value)))
+
+    def between(self, field, start=None, end=None):
+        """Matches rows where field (typically a date) is within [start, end).
+
+        :return: The query itself
+        """
+
+        if start is not None:
+            self.ge(field, start)
+        if end is not None:
+            self.lt(field, end)
+        return self
+
+    def orderby(self, field, descending=False):
+        """Orders the rows by field. May be called more than once.
+
+        :return: The query itself
+        """
+
+        self.order.append('%s %s' % (field, 'desc' if descending else 'asc'))
+        return self
+
+    @property
+    def filter_expression(self):
+        return ' and '.join(self.filters)
+
+    def __bool__(self):
+        return bool(self.filters or self.order)
+
+    def __str__(self):
+        query = ''
+        if self.filters:
+            query += '&$filter=%s' % quote(self.filter_expression, safe="'(),/:")
+        if self.order:
+            query += '&$orderby=%s' % quote(','.join(self.order), safe=',/')
+        return query
+
+    def __repr__(self):
+        return 'Query(%r)' % str(self)
@@ -0,0 +1,293 @@
+"""
+
+    An embeddable HTTP receiver for Event Broker subscription callbacks.
+
+"""
+
+import hmac
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from vralib.codec import get_codec
+
+
+# The largest body accepted by default, in bytes
+DEFAULT_MAX_BODY = 10 * 1024 * 1024
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class EventReceiver(object):
+    """
+    Receives events POSTed by Event Broker subscriptions and dispatches them to handlers.
+
+    The body of a POST is an event, a list of events, or a page of events ({"content": [...]}), so
+    recorded payloads, e.g. from Session.get_eventbroker_events(), can be replayed with curl. Every
+    event is passed to the handlers registered for its eventTopicId and to the handlers registered for
+    every topic.
+
+    Handlers run on a pool of `workers` threads, with at most `queue_size` more events waiting. When
+    the pool and the queue are full the POST is answered 503 with a Retry-After header, so the sender
+    backs off instead of the receiver running out of memory. A batch larger than the pool and the queue
+    is admitted in chunks, as earlier events of the batch finish. A POST is only acknowledged with 200
+    once every handler of every event in it returned. If a handler raises, or the events aren't all
+    handled within ack_timeout, the POST is answered 500 and the sender delivers the events again:
+    handlers should cope with seeing an event more than once. Bodies that aren't JSON, or hold events
+    that aren't objects, are answered 400 so they aren't delivered again.
+
+    The receiver listens on 127.0.0.1 unless told otherwise. Before exposing it to the network, set a
+    `secret`, which every POST must send in the `secret_header` header or be answered 401, and an
+    ssl.SSLContext to serve HTTPS. Bodies over max_body bytes are answered 413.
+
+    Basic usage:
+
+    receiver = vralib.EventReceiver(port=8080)
+
+    @receiver.handler('com.vmware.csp.iaas.blueprint.service.machine.lifecycle.provision')
+    def provisioned(event):
+        print(event['data']['machine']['name'])
+
+    receiver.serve_forever()    # or receiver.start() to run it in a background thread
+
+    curl -X POST -H 'Content-Type: application/json' -d @event.json http://localhost:8080/
+
+    Exposed to the network:
+
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain('receiver.pem', 'receiver.key')
+    receiver = vralib.EventReceiver('0.0.0.0', 8443, secret=os.environ['RECEIVER_SECRET'], ssl_context=context)
+    """
+
+    def __init__(self, host='127.0.0.1', port=8080, workers=4, queue_size=100, ack_timeout=30, retry_after=5,
+                 codec=None, secret=None, secret_header='X-Receiver-Secret', ssl_context=None,
+                 max_body=DEFAULT_MAX_BODY):
+        """
+        :param host: The address to listen on. '0.0.0.0' listens on every interface.
+        :param port: The port to listen on. 0 picks a free port, see the address attribute.
+        :param workers: The number of threads running handlers
+        :param queue_size: The number of events that may wait for a worker before POSTs are rejected
+        :param ack_timeout: Seconds a POST waits for its handlers before it is answered 500
+        :param retry_after: The Retry-After value, in seconds, of 503 responses
+        :param codec: The JSON codec used to decode bodies, see vralib.codec.get_codec()
+        :param secret: An optional shared secret that every POST must send in the secret_header header
+        :param secret_header: The name of the header holding the secret
+        :param ssl_context: An optional ssl.SSLContext to serve HTTPS with
+        :param max_body: The largest body accepted, in bytes
+        """
+
+        self.workers = workers
+        self.queue_size = queue_size
+        self.ack_timeout = ack_timeout
+        self.retry_after = retry_after
+        self.codec = get_codec(codec)
+        self.secret = secret
+        self.secret_header = secret_header
+        self.max_body = max_body
+        self.stats = {'received': 0, 'handled': 0, 'failed': 0, 'rejected': 0}
+        self._handlers = {}
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._thread = None
+        self._serving = False
+        self._server = _ThreadingHTTPServer((host, port), self._request_handler())
+        if ssl_context is not None:
+            # the handshake happens on the first read, in the thread of the request, not in the accept loop
+            self._server.socket = ssl_context.wrap_socket(self._server.socket, server_side=True,
+                                                          do_handshake_on_connect=False)
+
+    @property
+    def address(self):
+        """The (host, port) the receiver listens on."""
+        return self._server.server_address
+
+    def add_handler(self, handler, topic=None):
+        """Registers a handler.
+
+        :param handler: A callable taking an event
+        :param topic: The eventTopicId of the events passed to the handler, or None for every event
+        """
+
+        with self._lock:
+            self._handlers.setdefault(topic, []).append(handler)
+
+    def handler(self, topic=None):
+        """Decorator version of add_handler()."""
+
+        def register(f):
+            self.add_handler(f, topic)
+            return f
+        return register
+
+    def _handlers_for(self, event):
+        topic = event.get('eventTopicId')
+        with self._lock:
+            handlers = self._handlers.get(None, [])
+            if topic is not None:
+                handlers = self._handlers.get(topic, []) + handlers
+            return handlers
+
+    def _handle(self, event):
+        for handler in self._handlers_for(event):
+            handler(event)
+
+    @staticmethod
+    def events_from(payload):
+        """
+        :return: The list of events in a POSTed payload
+        :raises ValueError: if an event isn't a JSON object
+        """
+
+        if isinstance(payload, list):
+            events = payload
+        elif isinstance(payload, dict) and isinstance(payload.get('content'), list):
+            events = payload['content']
+        else:
+            events = [payload]
+
+        for event in events:
+            if not isinstance(event, dict):
+                raise ValueError('Events must be JSON objects, not %s' % type(event).__name__)
+        return events
+
+    def dispatch(self, events):
+        """Runs the handlers of the events on the worker pool and waits for them.
+
+        :param events: A list of events
+
+        :return: 200 if every handler returned, 503 if the pool is full, 500 otherwise
+        """
+
+        deadline = time.monotonic() + self.ack_timeout
+        if not self._slots.acquire(False):
+            with self._lock:
+                self.stats['rejected'] += len(events)
+            return 503
+
+        futures = []
+        for n, event in enumerate(events):
+            # the first slot is already held. Later events wait for the earlier ones to free theirs.
+            if n and not self._slots.acquire(timeout=max(0, deadline - time.monotonic())):
+                break
+            future = self._executor.submit(self._handle, event)
+            future.add_done_callback(lambda f: self._slots.release())
+            futures.append(future)
+
+        done, not_done = wait_futures(futures, timeout=max(0, deadline - time.monotonic()))
+        failed = len(events) - len(done) + sum(1 for f in done if f.exception() is not None)
+        with self._lock:
+            self.stats['received'] += len(events)
+            self.stats['handled'] += len(events) - failed
+            self.stats['failed'] += failed
+        return 500 if failed else 200
+
+    def authorized(self, headers):
+        """
+        :param headers: The headers of a request
+
+        :return: True if no secret is set or the request sent it
+        """
+
+        if self.secret is None:
+            return True
+        sent = headers.get(self.secret_header)
+        return sent is not None and hmac.compare_digest(sent.encode('utf-8'), self.secret.encode('utf-8'))
+
+    def _request_handler(self):
+        receiver = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+
+            def _reply(self, status, headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_GET(self):
+                # a health check for load balancers
+                self._reply(200)
+
+            def do_POST(self):
+                if not receiver.authorized(self.headers):
+                    self.close_connection = True
+                    return self._reply(401)
+
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    self.close_connection = True
+                    return self._reply(400)
+                if length > receiver.max_body:
+                    # the body is not read, so the connection can't be reused
+                    self.close_connection = True
+                    return self._reply(413)
+
+                try:
+                    payload = receiver.codec.loads(self.rfile.read(length))
+                except ValueError:
+                    return self._reply(400)
+
+                try:
+                    events = receiver.events_from(payload)
+                except ValueError:
+                    return self._reply(400)
+                status = receiver.dispatch(events) if events else 200
+                if status == 503:
+                    return self._reply(503, {'Retry-After': str(receiver.retry_after)})
+                self._reply(status)
+
+            def log_message(self, format, *args):
+                pass
+
+        return RequestHandler
+
+    def serve_forever(self):
+        """Handles POSTs until shutdown() is called from another thread."""
+
+        self._serving = True
+        try:
+            self._server.serve_forever()
+        finally:
+            self._serving = False
+
+    def start(self):
+        """Handles POSTs in a background thread.
+
+        :return: The receiver itself
+        """
+
+        self._thread = threading.Thread(target=self.serve_forever, name='vralib-event-receiver')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        """Stops accepting POSTs, waits for the running handlers and closes the socket.
+
+        When serve_forever() runs in the foreground, call this from another thread: it waits for
+        serve_forever() to return.
+        """
+
+        if self._serving or self._thread is not None:
+            self._server.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.shutdown()
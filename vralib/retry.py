@@ -0,0 +1,140 @@
+"""
+
+    Retry policy and client-side rate limiting for the vRA transport.
+
+"""
+
+import random
+import threading
+import time
+
+
+# Statuses that vRA returns while it is overloaded or restarting services
+RETRY_STATUSES = (429, 502, 503, 504)
+# Statuses that mean "slow down", which make an adaptive rate limiter back off
+PUSHBACK_STATUSES = (429, 503)
+
+
+class RetryPolicy(object):
+    """
+    Decides whether a failed request is retried and how long to wait before doing so.
+
+    Only idempotent methods are retried by default. POST (and PUT) requests are retried only when
+    the caller marks them as safe, e.g. vra._request(url, 'POST', payload, retry_safe=True).
+
+    The delay is an exponential backoff with full jitter: a random time between 0 and
+    backoff * 2 ** attempt, capped at max_backoff. A Retry-After header sent by the server is
+    used as the minimum delay.
+    """
+
+    def __init__(self, retries=3, backoff=0.5, max_backoff=30, statuses=RETRY_STATUSES,
+                 methods=('GET', 'DELETE')):
+        """
+        :param retries: The maximum number of retries after the first attempt.
+        :param backoff: The base delay in seconds.
+        :param max_backoff: The maximum delay in seconds.
+        :param statuses: The HTTP statuses that are retried.
+        :param methods: The HTTP methods that are always safe to retry.
+        """
+
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+        self.methods = methods
+
+    def should_retry(self, method, attempt, status=None, safe=False):
+        """
+        :param method: The HTTP method of the request
+        :param attempt: The number of retries already made
+        :param status: The HTTP status of the response, or None if the request failed to connect
+        :param safe: True if the caller marked a non-idempotent request as safe to repeat
+
+        :return: True if the request should be retried
+        """
+
+        if attempt >= self.retries:
+            return False
+        if not (safe or method in self.methods):
+            return False
+        return status is None or status in self.statuses
+
+    def delay(self, attempt, retry_after=None):
+        """
+        :param attempt: The number of retries already made
+        :param retry_after: The value of a Retry-After header, if any
+
+        :return: The number of seconds to wait before the next attempt
+        """
+
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        try:
+            return max(delay, min(self.max_backoff, float(retry_after)))
+        except (TypeError, ValueError):
+            return delay
+
+
+class RateLimiter(object):
+    """
+    A token bucket that can be shared between threads and sessions to cap the request rate
+    sent to a vRA appliance.
+
+    The rate adapts to the server: it is cut by `decrease` every time the server pushes back
+    (429 or 503), and grows by `increase` requests per second after every successful request,
+    up to max_rate.
+
+    Basic usage:
+
+    limiter = vralib.RateLimiter(rate=20)
+    vra1 = vralib.Session.login(username, password, cloudurl, tenant, rate_limiter=limiter)
+    vra2 = vralib.Session.login(other_username, other_password, cloudurl, tenant, rate_limiter=limiter)
+    """
+
+    def __init__(self, rate=20, burst=None, min_rate=1, max_rate=None, decrease=0.5, increase=0.1):
+        """
+        :param rate: The initial number of requests per second.
+        :param burst: The size of the bucket. Defaults to rate.
+        :param min_rate: The rate never drops below this.
+        :param max_rate: The rate never grows above this. Defaults to rate.
+        :param decrease: The factor applied to the rate when the server pushes back.
+        :param increase: The requests per second added to the rate after each success.
+        """
+
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate or rate)
+        self.decrease = decrease
+        self.increase = increase
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Blocks until the caller may send a request."""
+
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def backoff(self):
+        """Called when the server pushes back. Cuts the rate and empties the bucket."""
+
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = min(self._tokens, 0)
+
+    def success(self):
+        """Called after a successful request. Slowly raises the rate again."""
+
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
@@ -0,0 +1,123 @@
+"""
+
+    Incremental parsing of paginated vRA responses.
+
+"""
+
+import codecs
+import json
+import re
+
+
+# Bytes read from the socket at a time while streaming a page
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+# Separators between the values of an object or array. Commas are skipped along with whitespace.
+_SEPARATORS = re.compile(r'[ \t\n\r,]*')
+# What may follow the part of a number that was decoded, if the number goes on in the next chunk
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+
+
+class PageParser(object):
+    """
+    Parses a page of a vRA collection, {"links": [...], "content": [...], "metadata": {...}}, from a
+    stream of byte chunks.
+
+    Iterating over the parser yields the items of `content` as soon as each one has been received, so
+    only the item being parsed and the current chunk are held in memory, whatever the size of the page.
+    The other top-level keys, e.g. `metadata`, which vRA sends after `content`, are stored in the `page`
+    dictionary as they are parsed.
+
+    Basic usage:
+
+    parser = PageParser(response.iter_content(STREAM_CHUNK_SIZE))
+    for item in parser:
+        print(item['id'])
+    print(parser.page['metadata']['totalPages'])
+
+    Items are decoded with the standard library json module, whose raw_decode() can parse one value
+    out of a larger buffer.
+    """
+
+    def __init__(self, chunks):
+        """
+        :param chunks: An iterable of bytes, e.g. requests.Response.iter_content()
+        """
+
+        self.page = {}
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._text = ''
+        self._pos = 0
+        self._eof = False
+
+    def _more(self):
+        """Appends the next chunk to the buffer, dropping what was already parsed.
+
+        :return: False at the end of the stream
+        """
+
+        if self._eof:
+            return False
+
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            text = self._utf8.decode(b'', final=True)
+        else:
+            text = self._utf8.decode(chunk)
+
+        self._text = self._text[self._pos:] + text
+        self._pos = 0
+        return chunk is not None or bool(text)
+
+    def _peek(self):
+        """Skips separators and returns the next character."""
+
+        while True:
+            self._pos = _SEPARATORS.match(self._text, self._pos).end()
+            if self._pos < len(self._text):
+                return self._text[self._pos]
+            if not self._more():
+                raise ValueError('Unexpected end of the JSON document')
+
+    def _expect(self, char):
+        found = self._peek()
+        if found != char:
+            raise ValueError('Expected %r but found %r in the JSON document' % (char, found))
+        self._pos += 1
+
+    def _value(self):
+        """Parses the next complete value, reading more chunks while it is cut off at the end of the buffer."""
+
+        self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._text, self._pos)
+            except ValueError:
+                if not self._more():
+                    raise
+                continue
+
+            # a number (or literal) cut off by the end of the buffer, e.g. '1.' or '12e', may continue
+            # in the next chunk
+            if self._text[self._pos] not in '{["' and _NUMBER_TAIL.match(self._text, end) and self._more():
+                continue
+
+            self._pos = end
+            return value
+
+    def __iter__(self):
+        self._expect('{')
+        while self._peek() != '}':
+            key = self._value()
+            self._expect(':')
+            if key == 'content' and self._peek() == '[':
+                self._pos += 1
+                while self._peek() != ']':
+                    yield self._value()
+                self._pos += 1
+            else:
+                self.page[key] = self._value()
+        self._pos += 1
@@ -0,0 +1,151 @@
+"""
+
+    A file-backed store of vRA bearer tokens shared between processes.
+
+"""
+
+import calendar
+import json
+import os
+import tempfile
+import threading
+import time
+
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: writes are only serialized between the threads of one process
+    fcntl = None
+
+
+DEFAULT_TOKEN_FILE = os.path.join(os.path.expanduser('~'), '.vralib', 'tokens.json')
+
+
+def parse_expires(expires):
+    """Converts the `expires` timestamp of a vRA token, e.g. 2019-05-01T12:00:00.000Z, to epoch seconds.
+
+    :return: The expiry time in seconds since the epoch, or None if it can't be parsed
+    """
+
+    if not expires:
+        return None
+
+    value = expires.rstrip('Z')
+    for fmt in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return calendar.timegm(datetime.strptime(value, fmt).timetuple())
+        except ValueError:
+            pass
+    return None
+
+
+class TokenStore(object):
+    """
+    Keeps bearer tokens on disk, keyed by cloudurl, tenant and username, so short-lived scripts
+    can reuse a token instead of logging in on every run.
+
+    The file and its directory are only readable by the current user (0600/0700) and are
+    replaced atomically on every write. Updates hold an exclusive lock on a `.lock` file next to
+    it, so processes sharing the file, e.g. concurrent cron jobs, don't lose each other's tokens.
+
+    Basic usage:
+
+    store = vralib.TokenStore()
+    vra = vralib.Session.login(username, password, cloudurl, tenant, token_store=store)
+    """
+
+    def __init__(self, path=DEFAULT_TOKEN_FILE, margin=60):
+        """
+        :param path: The JSON file the tokens are kept in.
+        :param margin: Tokens expiring within this many seconds are treated as expired.
+        """
+
+        self.path = path
+        self.margin = margin
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(cloudurl, tenant, username):
+        return '%s|%s|%s' % (cloudurl, tenant, username)
+
+    @contextmanager
+    def _locked(self):
+        """Serializes the read-modify-write of the file between threads and processes."""
+
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+
+            directory = os.path.dirname(self.path) or '.'
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0o700)
+            fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _save(self, tokens):
+        directory = os.path.dirname(self.path) or '.'
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tokens-')
+        try:
+            os.chmod(tmp, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(tokens, f)
+            os.replace(tmp, self.path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def get(self, cloudurl, tenant, username):
+        """
+        :return: A stored bearer token id that isn't about to expire, or None
+        """
+
+        with self._lock:
+            entry = self._load().get(self.key(cloudurl, tenant, username))
+
+        if not entry:
+            return None
+        if entry.get('expires_at') is not None and entry['expires_at'] - self.margin <= time.time():
+            return None
+        return entry['id']
+
+    def set(self, cloudurl, tenant, username, token_id, expires=None):
+        """Stores a token.
+
+        :param token_id: The `id` of the token returned by /identity/api/tokens
+        :param expires: The `expires` timestamp of the token, if known
+        """
+
+        with self._locked():
+            tokens = self._load()
+            tokens[self.key(cloudurl, tenant, username)] = {
+                'id': token_id,
+                'expires': expires,
+                'expires_at': parse_expires(expires),
+            }
+            self._save(tokens)
+
+    def delete(self, cloudurl, tenant, username):
+        """Forgets the token of a user, e.g. after the server rejected it."""
+
+        with self._locked():
+            tokens = self._load()
+            if tokens.pop(self.key(cloudurl, tenant, username), None) is not None:
+                self._save(tokens)
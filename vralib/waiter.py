@@ -0,0 +1,229 @@
+"""
+
+    Tracks many catalog requests until they complete, with batched polling.
+
+"""
+
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import Future, wait as wait_futures
+
+import requests
+
+from vralib.query import Query, odata_fallback
+from vralib.vraexceptions import NotFoundError
+
+
+# Request states after which a request doesn't change anymore
+TERMINAL_STATES = ('SUCCESSFUL', 'PARTIALLY_SUCCESSFUL', 'FAILED', 'PROVIDER_FAILED', 'REJECTED', 'CANCELLED')
+
+
+class RequestWaiter(object):
+    """
+    Waits for many catalog requests at once.
+
+    Every request being watched gets a concurrent.futures.Future that is resolved with the request
+    (as returned by Session.get_request) once it reaches a terminal state. A single background thread
+    checks all of the pending requests with one `$filter=id eq ... or id eq ...` query per batch
+    instead of one GET per request. It polls quickly while states keep changing and slows down up to
+    max_interval while nothing happens. Requests are dropped from the poll as soon as they complete.
+
+    Basic usage:
+
+    build = vra.request_item(catalog_item_id)
+    future = vra.waiter.watch(build['id'], callback=lambda f: print(f.result()['state']))
+    request = future.result(timeout=3600)
+
+    results = vra.waiter.wait([r.request_id for r in vra.request_items(specs)])
+    """
+
+    def __init__(self, session, interval=2, max_interval=60, backoff=1.5, batch_size=40):
+        """
+        :param session: A vralib.Session
+        :param interval: Seconds between polls while request states are changing
+        :param max_interval: The longest time between polls while nothing changes
+        :param backoff: The factor applied to the poll interval after a poll where nothing changed
+        :param batch_size: The number of request ids checked by one query
+        """
+
+        self.session = session
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self._pending = {}
+        self._states = {}
+        self._watchers = {}
+        self._current_interval = interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def watch(self, request_id, callback=None):
+        """Starts watching a request.
+
+        :param request_id: The id of a catalog request
+        :param callback: An optional callable, called with the future once the request completes
+
+        :return: A concurrent.futures.Future resolved with the completed request
+        """
+
+        with self._lock:
+            future = self._pending.get(request_id)
+            if future is None:
+                future = self._pending[request_id] = Future()
+                self._current_interval = self.interval
+            self._watchers[request_id] = self._watchers.get(request_id, 0) + 1
+            self._stopped = False
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='vralib-request-waiter')
+                self._thread.daemon = True
+                self._thread.start()
+
+        if callback is not None:
+            future.add_done_callback(callback)
+        self._wakeup.set()
+        return future
+
+    def wait(self, request_ids, timeout=None):
+        """Watches requests and blocks until all of them complete or the timeout expires.
+
+        :param request_ids: An iterable of catalog request ids
+        :param timeout: The maximum number of seconds to wait, or None to wait forever
+
+        :return: A dictionary of the completed requests by id. Requests still running at the timeout are missing,
+                 and are no longer polled unless watch() was called for them elsewhere.
+        """
+
+        futures = dict((request_id, self.watch(request_id)) for request_id in OrderedDict.fromkeys(request_ids))
+        wait_futures(list(futures.values()), timeout=timeout)
+        completed = dict((request_id, f.result()) for request_id, f in futures.items()
+                         if f.done() and not f.cancelled() and not f.exception())
+        for request_id, f in futures.items():
+            if not f.done():
+                self.unwatch(request_id)
+        return completed
+
+    def unwatch(self, request_id):
+        """Undoes one call of watch(). Once nobody watches a request anymore it is dropped from the poll
+        and its future is cancelled.
+
+        :param request_id: The id of a catalog request
+        """
+
+        with self._lock:
+            count = self._watchers.get(request_id, 0) - 1
+            if count > 0:
+                self._watchers[request_id] = count
+                return
+            self._watchers.pop(request_id, None)
+            self._states.pop(request_id, None)
+            future = self._pending.pop(request_id, None)
+
+        if future is not None:
+            future.cancel()
+
+    def stop(self):
+        """Stops the background thread. Pending futures stay unresolved until watch() is called again."""
+
+        with self._lock:
+            self._stopped = True
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._stopped or not self._pending:
+                    self._thread = None
+                    return
+                interval = self._current_interval
+
+            self._wakeup.clear()
+            try:
+                self.poll()
+            except Exception:
+                # e.g. the appliance is unreachable for a moment: keep the futures and try again later
+                with self._lock:
+                    self._current_interval = min(self.max_interval, self._current_interval * self.backoff)
+            self._wakeup.wait(interval)
+
+    def poll(self):
+        """Checks all of the pending requests once and resolves the completed ones.
+
+        :return: The number of requests that completed
+        """
+
+        with self._lock:
+            request_ids = list(self._pending)
+
+        completed = 0
+        changed = False
+
+        for request_id, request in self._fetch(request_ids).items():
+            if isinstance(request, Exception):
+                with self._lock:
+                    future = self._pending.pop(request_id, None)
+                    self._states.pop(request_id, None)
+                    self._watchers.pop(request_id, None)
+                if future is not None:
+                    future.set_exception(request)
+                continue
+
+            state = request.get('state')
+            with self._lock:
+                if self._states.get(request_id) != state:
+                    self._states[request_id] = state
+                    changed = True
+                future = self._pending.pop(request_id, None) if state in TERMINAL_STATES else None
+                if future is not None:
+                    self._states.pop(request_id, None)
+                    self._watchers.pop(request_id, None)
+
+            if future is not None:
+                future.set_result(request)
+                completed += 1
+
+        with self._lock:
+            if changed:
+                self._current_interval = self.interval
+            else:
+                self._current_interval = min(self.max_interval, self._current_interval * self.backoff)
+
+        return completed
+
+    def _fetch(self, request_ids):
+        """Retrieves requests in batches, falling back to one GET per request.
+
+        :return: A dictionary of requests by id. Requests that don't exist map to a NotFoundError.
+        """
+
+        found = {}
+        url = 'https://%s/catalog-service/api/consumer/requests' % self.session.cloudurl
+
+        if url not in self.session._odata_unsupported:
+            for n in range(0, len(request_ids), self.batch_size):
+                batch = request_ids[n:n + self.batch_size]
+                query = Query().any_of('id', batch)
+                try:
+                    # only the first page: if the server ignored the filter we don't want to crawl every request
+                    page = self.session._request('%s?page=1&limit=%d%s' % (url, len(batch), query))
+                except requests.exceptions.HTTPError as e:
+                    if not odata_fallback(self.session._odata_unsupported, url,
+                                          getattr(e.response, 'status_code', None)):
+                        raise
+                    break
+                batch = set(batch)
+                found.update((i['id'], i) for i in page['content'] if i.get('id') in batch)
+
+        for request_id in request_ids:
+            if request_id not in found:
+                try:
+                    found[request_id] = self.session.get_request(request_id)
+                except requests.exceptions.HTTPError as e:
+                    if getattr(e.response, 'status_code', None) != 404:
+                        raise
+                    found[request_id] = NotFoundError('Request %s is not found' % request_id)
+
+        return found